@@ -6,13 +6,31 @@ TrueLiveBet - AI анализатор матчей
 
 import asyncio
 import json
+import os
+import sys
 from typing import List, Dict, Optional
 from dataclasses import dataclass, asdict
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
 from loguru import logger
 from datetime import datetime
 
+# Общий шлюз LLM и лимитер квоты живут только в sports_analyzer/utils (llm_gateway.py, rate_limiter.py):
+# пул соединений, квота, повторы, резервный провайдер. Каталог добавляется в конец sys.path,
+# чтобы собственные модули automation (config.py и др.) имели приоритет
+SPORTS_ANALYZER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sports_analyzer')
+if SPORTS_ANALYZER_DIR not in sys.path:
+    sys.path.append(SPORTS_ANALYZER_DIR)
+from utils.llm_gateway import get_llm_gateway, llm_deadline
+from utils.structured_output import ResponseSchema, object_schema, CONFIDENCE
+
+# Схема ответа анализа (tool use): формат не описывается в промпте, ответ проверяется шлюзом
+ANALYSIS_SCHEMA = ResponseSchema("match_analysis", "Результат анализа live матча по правилам TrueLiveBet", object_schema({
+    "confidence": CONFIDENCE,
+    "recommendation": {"type": "string", "description": "Конкретная рекомендация, например: Ставить на победу команды 1"},
+    "reasoning": {"type": "string", "description": "Обоснование по счету и статистике"},
+    "risk_level": {"type": "string", "enum": ["низкий", "средний", "высокий"]},
+    "category": {"type": "string", "enum": ["💀", "🎯", "⭐", "👍"]}
+}))
+
 @dataclass
 class AnalysisResult:
     """Результат AI анализа"""
@@ -27,9 +45,34 @@ class AnalysisResult:
 class AIAnalyzer:
     """AI анализатор для матчей"""
     
-    def __init__(self, openai_api_key: str = None, anthropic_api_key: str = None):
-        self.openai_client = AsyncOpenAI(api_key=openai_api_key) if openai_api_key else None
-        self.anthropic_client = AsyncAnthropic(api_key=anthropic_api_key) if anthropic_api_key else None
+    def __init__(self, openai_api_key: str = None, anthropic_api_key: str = None,
+                 requests_per_minute: int = 50, tokens_per_minute: int = 40000,
+                 max_concurrency: int = 10, rate_limit_retries: int = 3,
+                 anthropic_base_url: str = None, openai_base_url: str = None,
+                 metrics_file: str = None, model_prices: Dict = None):
+        # Anthropic - основной провайдер, OpenAI - резервный (или единственный)
+        self.gateway = None
+        self.metrics_file = metrics_file
+        if anthropic_api_key or openai_api_key:
+            self.gateway = get_llm_gateway({
+                'api_key': anthropic_api_key,
+                'model': "claude-3-sonnet-20240229",
+                'base_url': anthropic_base_url,
+                'openai_api_key': openai_api_key,
+                'openai_model': "gpt-4",
+                'openai_base_url': openai_base_url,
+                'max_tokens': 1000,
+                'temperature': 0.1,
+                'max_retries': rate_limit_retries,
+                'retry_delay': 1,
+                # Общая квота провайдера для всех параллельных запросов
+                'requests_per_minute': requests_per_minute,
+                'tokens_per_minute': tokens_per_minute,
+                'max_concurrency': max_concurrency,
+                'response_cache_enabled': False,
+                # Без цен стоимость запросов в метриках не считается
+                'model_prices': model_prices
+            })
         
         # Система анализа TrueLiveBet
         self.analysis_system = """
@@ -75,11 +118,16 @@ class AIAnalyzer:
             # Формируем промпт для анализа
             prompt = self._create_analysis_prompt(match_data, additional_stats)
             
-            # Выбираем AI модель
-            if self.anthropic_client:
-                result = await self._analyze_with_anthropic(prompt)
-            elif self.openai_client:
-                result = await self._analyze_with_openai(prompt)
+            # Правила анализа - системный блок, данные матча - в промпте,
+            # ответ - вызов инструмента по схеме (None при ошибке запроса или несоответствии схеме)
+            if self.gateway:
+                data = await self.gateway.complete_json(
+                    prompt, self.analysis_system, sport=match_data.get('sport', 'general'),
+                    use_cache=False, schema=ANALYSIS_SCHEMA
+                )
+                if data is None:
+                    return await self._fallback_analysis(match_data, additional_stats)
+                result = self._to_analysis_result(match_data, data)
             else:
                 # Fallback анализ без AI
                 result = await self._fallback_analysis(match_data, additional_stats)
@@ -93,16 +141,15 @@ class AIAnalyzer:
     def _create_analysis_prompt(self, match_data: Dict, additional_stats: Dict = None) -> str:
         """Создание промпта для AI анализа"""
         
+        # Правила анализа (analysis_system) передаются отдельным системным блоком
         prompt = f"""
-        {self.analysis_system}
-
         АНАЛИЗ МАТЧА:
         Вид спорта: {match_data.get('sport', 'Неизвестно')}
         Лига: {match_data.get('league', 'Неизвестно')}
         Команда 1: {match_data.get('team1', 'Неизвестно')}
         Команда 2: {match_data.get('team2', 'Неизвестно')}
         Счет: {match_data.get('score', '0:0')}
-        Время: {match_data.get('time', '0\'')}
+        Время: {match_data.get('time', "0'")}
         Статус: {match_data.get('status', 'live')}
         Коэффициенты: {json.dumps(match_data.get('odds', {}), ensure_ascii=False)}
         """
@@ -110,88 +157,23 @@ class AIAnalyzer:
         if additional_stats:
             prompt += f"\n\nДОПОЛНИТЕЛЬНАЯ СТАТИСТИКА:\n{json.dumps(additional_stats, ensure_ascii=False, indent=2)}"
         
+        # Формат ответа задает схема инструмента (ANALYSIS_SCHEMA)
         prompt += """
 
         ЗАДАЧА: Проанализируй этот матч по нашим правилам и дай рекомендацию.
-
-        ОТВЕТ В ФОРМАТЕ JSON:
-        {
-            "confidence": 85.5,
-            "recommendation": "Ставить на победу команды 1",
-            "reasoning": "Команда 1 ведет 2:0, контроль мяча 65%, удары 8:2",
-            "risk_level": "средний",
-            "category": "🎯"
-        }
         """
         
         return prompt
     
-    async def _analyze_with_anthropic(self, prompt: str) -> AnalysisResult:
-        """Анализ с помощью Anthropic Claude"""
-        try:
-            response = await self.anthropic_client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1000,
-                temperature=0.1,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            content = response.content[0].text
-            return self._parse_ai_response(content)
-            
-        except Exception as e:
-            logger.error(f"Ошибка Anthropic API: {e}")
-            raise
-    
-    async def _analyze_with_openai(self, prompt: str) -> AnalysisResult:
-        """Анализ с помощью OpenAI GPT"""
-        try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "system", "content": self.analysis_system},
-                         {"role": "user", "content": prompt}],
-                max_tokens=1000,
-                temperature=0.1
-            )
-            
-            content = response.choices[0].message.content
-            return self._parse_ai_response(content)
-            
-        except Exception as e:
-            logger.error(f"Ошибка OpenAI API: {e}")
-            raise
-    
-    def _parse_ai_response(self, content: str) -> AnalysisResult:
-        """Парсинг ответа AI"""
-        try:
-            # Ищем JSON в ответе
-            start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = content[start_idx:end_idx]
-                data = json.loads(json_str)
-                
-                return AnalysisResult(
-                    match_id=f"{data.get('team1', '')}_{data.get('team2', '')}",
-                    confidence=float(data.get('confidence', 75.0)),
-                    recommendation=data.get('recommendation', 'Анализ не завершен'),
-                    reasoning=data.get('reasoning', 'Недостаточно данных'),
-                    risk_level=data.get('risk_level', 'высокий'),
-                    category=data.get('category', '👍'),
-                    timestamp=datetime.now().isoformat()
-                )
-        except Exception as e:
-            logger.warning(f"Ошибка парсинга AI ответа: {e}")
-        
-        # Fallback если парсинг не удался
+    def _to_analysis_result(self, match_data: Dict, data: Dict) -> AnalysisResult:
+        """Результат анализа из ответа, прошедшего проверку по ANALYSIS_SCHEMA"""
         return AnalysisResult(
-            match_id="unknown",
-            confidence=50.0,
-            recommendation="Требуется дополнительный анализ",
-            reasoning="AI анализ не завершен",
-            risk_level="высокий",
-            category="👍",
+            match_id=f"{match_data.get('team1', '')}_{match_data.get('team2', '')}",
+            confidence=float(data['confidence']),
+            recommendation=data['recommendation'],
+            reasoning=data['reasoning'],
+            risk_level=data['risk_level'],
+            category=data['category'],
             timestamp=datetime.now().isoformat()
         )
     
@@ -226,23 +208,53 @@ class AIAnalyzer:
             timestamp=datetime.now().isoformat()
         )
     
-    async def batch_analyze(self, matches: List[Dict], additional_stats: Dict = None) -> List[AnalysisResult]:
-        """Пакетный анализ нескольких матчей"""
-        results = []
+    async def batch_analyze(self, matches: List[Dict], additional_stats: Dict = None,
+                            deadline: Optional[float] = None) -> List[AnalysisResult]:
+        """
+        Пакетный анализ нескольких матчей (параллельно, в пределах квоты провайдера).
+        deadline - бюджет времени в секундах: повторы запросов, не успевающие к нему, не выполняются
+        """
+        with llm_deadline(deadline):
+            outcomes = await asyncio.gather(
+                *[self.analyze_match(match, additional_stats) for match in matches],
+                return_exceptions=True
+            )
         
-        for match in matches:
-            try:
-                result = await self.analyze_match(match, additional_stats)
-                results.append(result)
-                
-                # Небольшая задержка между запросами
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Ошибка анализа матча {match.get('team1', '')} vs {match.get('team2', '')}: {e}")
+        results = []
+        for match, outcome in zip(matches, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Ошибка анализа матча {match.get('team1', '')} vs {match.get('team2', '')}: {outcome}")
                 continue
+            results.append(outcome)
         
+        if self.gateway:
+            self._log_gateway_stats(len(results))
         return results
+    
+    def _log_gateway_stats(self, analyzed: int):
+        """Квота, повторы и кэш промптов по итогам пакета"""
+        # Лимитер создается только при заданном requests_per_minute
+        if self.gateway.rate_limiter:
+            stats = self.gateway.rate_limiter.get_stats()
+            logger.info(f"AI анализ: {analyzed} матчей, {stats['requests']} запросов, "
+                        f"ожидание квоты {stats['waited_seconds']:.1f} сек, 429: {stats['rate_limited']}")
+        else:
+            logger.info(f"AI анализ: {analyzed} матчей")
+        
+        for provider, metrics in self.gateway.get_stats().items():
+            logger.info(f"{provider}: {metrics['requests']} запросов, {metrics['retries']} повторов, "
+                        f"{metrics['hedges']} хеджирующих, {metrics['failovers']} переключений")
+        
+        cache_stats = self.gateway.prompt_cache_stats.stats.values()
+        logger.info(f"Кэш промптов: чтение {sum(s['cache_read_input_tokens'] for s in cache_stats)}, "
+                    f"запись {sum(s['cache_creation_input_tokens'] for s in cache_stats)}, "
+                    f"без кэша {sum(s['input_tokens'] for s in cache_stats)} токенов")
+        
+        if self.metrics_file:
+            try:
+                self.gateway.llm_metrics.dump(self.metrics_file)
+            except OSError as e:
+                logger.error(f"Не удалось сохранить метрики LLM: {e}")
 
 # Пример использования
 async def test_analyzer():
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+TrueLiveBet - Сетевой поток данных BetBoom (XHR и WebSocket)
+Live табло строится из JSON ответов API и кадров WebSocket: вместо разбора DOM
+эти данные декодируются напрямую в строки матчей (поля как у DOM извлечения).
+Проверяется на записанных фикстурах: HAR (в том числе _webSocketMessages) и JSONL кадров.
+
+Запуск на фикстуре:
+    python betboom_feed.py recorded.har
+    python betboom_feed.py frames.jsonl
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from loguru import logger
+
+# Варианты имен полей события в разных API (первое найденное значение)
+FIELD_ALIASES = {
+    'id': ('id', 'eventId', 'event_id', 'matchId', 'match_id', 'gameId'),
+    'sport': ('sport', 'sportName', 'sport_name', 'discipline'),
+    'league': ('league', 'tournament', 'tournamentName', 'competition', 'championship', 'category'),
+    'team1': ('team1', 'home', 'homeTeam', 'home_team', 'competitor1', 'opp1', 'player1'),
+    'team2': ('team2', 'away', 'awayTeam', 'away_team', 'competitor2', 'opp2', 'player2'),
+    'score': ('score', 'result', 'scoreboard', 'currentScore'),
+    'time': ('time', 'minute', 'matchTime', 'clock', 'timer', 'elapsed'),
+    'status': ('status', 'state', 'period', 'stage')
+}
+
+# Списки участников вместо пары team1/team2
+PARTICIPANT_KEYS = ('participants', 'competitors', 'teams', 'opponents')
+
+# Флаг приостановки приема ставок (значок замка на табло)
+LOCK_KEYS = ('is_locked', 'isLocked', 'locked', 'blocked', 'isBlocked', 'suspended', 'isSuspended')
+
+# Коэффициенты: словарь исход -> коэффициент, список исходов или рынков с исходами
+ODDS_KEYS = ('odds', 'coefficients', 'outcomes', 'markets', 'stakes')
+OUTCOME_NAME_KEYS = ('name', 'type', 'outcome', 'code', 'shortName')
+OUTCOME_PRICE_KEYS = ('odd', 'odds', 'price', 'value', 'coef', 'coefficient', 'factor')
+MAIN_MARKETS = ('1x2', 'исход', 'исход матча', 'match_result', 'result', 'winner', 'победитель')
+
+# Названия исходов -> ключи коэффициентов Match (П1 / Х / П2)
+OUTCOME_ALIASES = {
+    '1': '1', 'w1': '1', 'п1': '1', 'home': '1', '1x2_1': '1',
+    'x': 'X', 'х': 'X', 'draw': 'X', 'н': 'X', '1x2_x': 'X',
+    '2': '2', 'w2': '2', 'п2': '2', 'away': '2', '1x2_2': '2'
+}
+
+ENDED_STATUSES = {'ended', 'finished', 'closed', 'completed', 'removed', 'завершен', 'окончен'}
+
+# Статусы события или рынка: прием ставок приостановлен / снова открыт
+LOCKED_STATUSES = {'suspended', 'blocked', 'locked', 'приостановлен', 'заблокирован'}
+OPEN_STATUSES = {'active', 'open', 'live', 'inplay', 'in_play', 'started', 'идет'}
+
+# Адреса запросов, ответы которых стоит разбирать (остальной трафик страницы пропускается)
+DEFAULT_URL_PATTERN = r"live|event|line|odds|coef|market|feed"
+
+# Префиксы протоколов поверх WebSocket: socket.io (42[...]) и разделитель записей SignalR
+SOCKET_IO_PREFIX = re.compile(r"^\d+(?=[\[{])")
+SIGNALR_SEPARATOR = "\x1e"
+
+
+def _first(data: Dict[str, Any], keys: Tuple[str, ...]) -> Any:
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _text(value: Any) -> str:
+    """Текст поля: строка, число или объект с названием"""
+    if isinstance(value, dict):
+        value = _first(value, ('name', 'title', 'shortName', 'value'))
+    if value is None or isinstance(value, (dict, list)):
+        return ""
+    return str(value)
+
+
+def _score(value: Any) -> str:
+    """Счет из строки, пары [1, 0] или объекта {home, away}"""
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return f"{value[0]}:{value[1]}"
+    if isinstance(value, dict):
+        pair = (_first(value, ('home', 'team1', 'h', '1')), _first(value, ('away', 'team2', 'a', '2')))
+        if None not in pair:
+            return f"{pair[0]}:{pair[1]}"
+        return _text(value)
+    return _text(value)
+
+
+def _price(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _outcome_key(name: Any) -> Optional[str]:
+    return OUTCOME_ALIASES.get(str(name).strip().lower()) if name is not None else None
+
+
+def _main_market(markets: List[Any]) -> Optional[Dict[str, Any]]:
+    """Основной рынок (1X2) из списка рынков или первый рынок с исходами"""
+    markets = [item for item in markets if isinstance(item, dict) and _first(item, ODDS_KEYS) is not None]
+    if not markets:
+        return None
+    return next((market for market in markets
+                 if _text(_first(market, ('name', 'type', 'code'))).strip().lower() in MAIN_MARKETS), markets[0])
+
+
+def _lock_flag(data: Dict[str, Any]) -> Optional[bool]:
+    """Замок события или рынка: булев флаг, иначе статус приостановки (None - не указан)"""
+    locked = next((data[key] for key in LOCK_KEYS if isinstance(data.get(key), bool)), None)
+    if locked is not None:
+        return locked
+    status = _text(_first(data, FIELD_ALIASES['status'])).strip().lower()
+    if status in LOCKED_STATUSES:
+        return True
+    if status in OPEN_STATUSES:
+        return False
+    return None
+
+
+def decode_odds(value: Any) -> Dict[str, float]:
+    """Коэффициенты П1/Х/П2 из словаря, списка исходов или списка рынков"""
+    odds: Dict[str, float] = {}
+    if isinstance(value, dict):
+        for name, price in value.items():
+            key = _outcome_key(name)
+            if key and _price(price) is not None:
+                odds[key] = _price(price)
+            elif isinstance(price, (dict, list)) and name in ODDS_KEYS:
+                odds.update(decode_odds(price))
+        return odds
+
+    if not isinstance(value, list):
+        return odds
+
+    # Список рынков: берем основной рынок (1X2) или первый с исходами
+    main = _main_market(value)
+    if main is not None:
+        return decode_odds(_first(main, ODDS_KEYS))
+
+    for item in value:
+        if not isinstance(item, dict):
+            continue
+        key = _outcome_key(_first(item, OUTCOME_NAME_KEYS))
+        price = _price(_first(item, OUTCOME_PRICE_KEYS))
+        if key and price is not None:
+            odds[key] = price
+    return odds
+
+
+def decode_event(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Поля события из объекта API (только найденные поля - обновления бывают частичными).
+    None, если объект не похож на событие (нет id или нет ни команд, ни счета, ни коэффициентов,
+    ни статуса, ни флага замка).
+    """
+    event_id = _first(data, FIELD_ALIASES['id'])
+    if event_id is None or isinstance(event_id, (dict, list)):
+        return None
+
+    fields: Dict[str, Any] = {}
+    for name in ('sport', 'league', 'team1', 'team2', 'time', 'status'):
+        value = _text(_first(data, FIELD_ALIASES[name]))
+        if value:
+            fields[name] = value
+
+    participants = _first(data, PARTICIPANT_KEYS)
+    if isinstance(participants, list) and len(participants) >= 2:
+        fields.setdefault('team1', _text(participants[0]))
+        fields.setdefault('team2', _text(participants[1]))
+
+    score = _first(data, FIELD_ALIASES['score'])
+    if score is not None and _score(score):
+        fields['score'] = _score(score)
+
+    # Замок ставится флагом или статусом события либо приостановкой основного рынка
+    odds_value = _first(data, ODDS_KEYS)
+    market = _main_market(odds_value) if isinstance(odds_value, list) else None
+    flags = [flag for flag in (_lock_flag(data), _lock_flag(market) if market else None) if flag is not None]
+    if flags:
+        fields['is_locked'] = any(flags)
+
+    if odds_value is not None:
+        odds = decode_odds(odds_value)
+        if odds:
+            fields['odds'] = odds
+
+    if not ({'team1', 'team2', 'score', 'odds', 'status', 'is_locked'} & set(fields)):
+        return None
+    fields['id'] = str(event_id)
+    return fields
+
+
+def json_payloads(raw: Any) -> List[Any]:
+    """JSON документы из тела ответа или кадра WebSocket (socket.io, SignalR, обычный JSON)"""
+    if isinstance(raw, (dict, list)):
+        return [raw]
+    if isinstance(raw, (bytes, bytearray)):
+        try:
+            raw = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            # Бинарные протоколы (protobuf, msgpack) не поддерживаются
+            return []
+
+    payloads = []
+    for record in str(raw).split(SIGNALR_SEPARATOR):
+        record = SOCKET_IO_PREFIX.sub("", record.strip(), count=1)
+        if not record or record[0] not in '[{':
+            continue
+        try:
+            payloads.append(json.loads(record))
+        except json.JSONDecodeError:
+            continue
+    return payloads
+
+
+class FeedDecoder:
+    """
+    Состояние live событий по потоку: частичные обновления (только счет или коэффициенты)
+    сливаются по id известного события, завершенные события удаляются.
+    Новое событие заводится только по объекту с обеими командами. Объекты внутри записи
+    события (рынки, исходы, участники) отдельно не разбираются: их id не трогают другие события.
+
+    Свежесть оценивается по потоку целиком: пока он обновляется, событие без изменений
+    остается в строках. Событие без обновлений дольше event_ttl (ушло без статуса завершения)
+    удаляется.
+    """
+
+    def __init__(self, stale_after: float = 120.0, event_ttl: float = 900.0):
+        self.stale_after = stale_after
+        self.event_ttl = event_ttl
+        self.events: Dict[str, Dict[str, Any]] = {}
+        self.updated_at: Dict[str, float] = {}
+        self.stats = {'payloads': 0, 'events_updated': 0, 'events_removed': 0}
+
+    def feed(self, raw: Any) -> Set[str]:
+        """Разбирает ответ или кадр, возвращает id обновленных (и удаленных) событий"""
+        changed: Set[str] = set()
+        now = time.monotonic()
+        for payload in json_payloads(raw):
+            self.stats['payloads'] += 1
+            for fields in self._event_records(payload):
+                event_id = fields.pop('id')
+                if fields.get('status', '').strip().lower() in ENDED_STATUSES:
+                    if self.events.pop(event_id, None) is not None:
+                        self.updated_at.pop(event_id, None)
+                        self.stats['events_removed'] += 1
+                        changed.add(event_id)
+                    continue
+
+                event = self.events.setdefault(event_id, {'odds': {}})
+                odds = fields.pop('odds', None)
+                if odds:
+                    event['odds'].update(odds)
+                event.update(fields)
+                self.updated_at[event_id] = now
+                changed.add(event_id)
+        self.stats['events_updated'] += len(changed)
+        return changed
+
+    def _event_records(self, payload: Any) -> Iterable[Dict[str, Any]]:
+        """
+        Поля записей событий в порядке документа: объект с обеими командами или с id
+        известного события. Внутрь записи события обход не спускается.
+        """
+        stack = [payload]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, list):
+                stack.extend(reversed(current))
+                continue
+            if not isinstance(current, dict):
+                continue
+            fields = decode_event(current)
+            if fields is not None and (fields['id'] in self.events or ('team1' in fields and 'team2' in fields)):
+                yield fields
+                continue
+            stack.extend(reversed(list(current.values())))
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Полные (с видом спорта и командами) события в виде строк матчей; пусто, если поток устарел"""
+        age = self.last_update_age()
+        if age is None or age > self.stale_after:
+            return []
+
+        now = time.monotonic()
+        for event_id in [key for key, updated in self.updated_at.items() if now - updated > self.event_ttl]:
+            del self.events[event_id], self.updated_at[event_id]
+            self.stats['events_removed'] += 1
+
+        rows = []
+        for event_id, event in self.events.items():
+            if event.get('sport') and event.get('team1') and event.get('team2'):
+                rows.append(dict(event, id=event_id, odds=dict(event['odds'])))
+        return rows
+
+    def last_update_age(self) -> Optional[float]:
+        """Секунд с последнего обновления любого события (None - данных не было)"""
+        if not self.updated_at:
+            return None
+        return time.monotonic() - max(self.updated_at.values())
+
+
+class FeedCapture:
+    """Подписка на сетевые ответы и кадры WebSocket страницы Playwright, воспроизведение фикстур"""
+
+    def __init__(self, url_pattern: str = DEFAULT_URL_PATTERN, stale_after: float = 120.0,
+                 event_ttl: float = 900.0):
+        self.url_pattern = re.compile(url_pattern, re.IGNORECASE)
+        self.decoder = FeedDecoder(stale_after, event_ttl)
+        self._updated = asyncio.Event()
+
+    def attach(self, page):
+        """Подписка на страницу (до перехода на live, чтобы не пропустить первые ответы)"""
+        page.on("response", self._on_response)
+        page.on("websocket", self._on_websocket)
+
+    async def _on_response(self, response):
+        if not self.url_pattern.search(response.url):
+            return
+        if "json" not in (response.headers.get("content-type") or ""):
+            return
+        try:
+            body = await response.text()
+        except Exception as e:
+            # Тело недоступно (редирект, страница закрыта)
+            logger.debug(f"Ответ {response.url} не прочитан: {e}")
+            return
+        self.feed(body, response.url)
+
+    def _on_websocket(self, websocket):
+        logger.info(f"Подключен WebSocket потока: {websocket.url}")
+        websocket.on("framereceived", lambda payload: self.feed(payload, websocket.url))
+
+    def feed(self, raw: Any, source: str = "") -> Set[str]:
+        try:
+            changed = self.decoder.feed(raw)
+        except Exception as e:
+            logger.warning(f"Ошибка разбора данных потока {source}: {e}")
+            return set()
+        if changed:
+            self._updated.set()
+        return changed
+
+    async def wait_for_update(self, timeout: float) -> bool:
+        """Ожидание изменения событий потока (False - за timeout секунд изменений не было)"""
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._updated.clear()
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return self.decoder.rows()
+
+    def is_fresh(self) -> bool:
+        """Поток обновлялся недавно (страницу можно не перезагружать)"""
+        age = self.decoder.last_update_age()
+        return age is not None and age <= self.decoder.stale_after
+
+    def replay_har(self, path: str) -> int:
+        """Воспроизводит HAR: JSON ответы подходящих адресов и входящие кадры WebSocket"""
+        with open(path, encoding='utf-8') as f:
+            har = json.load(f)
+
+        count = 0
+        for entry in har.get('log', {}).get('entries', []):
+            url = entry.get('request', {}).get('url', '')
+            for message in entry.get('_webSocketMessages') or []:
+                if message.get('type') == 'receive':
+                    self.feed(message.get('data', ''), url)
+                    count += 1
+
+            content = entry.get('response', {}).get('content', {})
+            text = content.get('text')
+            if not text or "json" not in (content.get('mimeType') or "") or not self.url_pattern.search(url):
+                continue
+            if content.get('encoding') == 'base64':
+                text = base64.b64decode(text)
+            self.feed(text, url)
+            count += 1
+        return count
+
+    def replay_frames(self, path: str) -> int:
+        """Воспроизводит JSONL кадров: {"url": ..., "payload": ...} или сам кадр в строке"""
+        count = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = line
+                if isinstance(record, dict) and 'payload' in record:
+                    self.feed(record['payload'], record.get('url', path))
+                else:
+                    self.feed(record, path)
+                count += 1
+        return count
+
+
+def main():
+    """Разбор записанной фикстуры и вывод декодированных матчей"""
+    parser = argparse.ArgumentParser(description="Декодирование потока BetBoom из HAR или JSONL кадров")
+    parser.add_argument("fixture", help="HAR файл или JSONL кадров")
+    parser.add_argument("--url-pattern", default=DEFAULT_URL_PATTERN)
+    args = parser.parse_args()
+
+    capture = FeedCapture(args.url_pattern, stale_after=float('inf'), event_ttl=float('inf'))
+    if args.fixture.endswith('.har'):
+        messages = capture.replay_har(args.fixture)
+    else:
+        messages = capture.replay_frames(args.fixture)
+
+    rows = capture.rows()
+    logger.info(f"Сообщений: {messages}, событий: {len(rows)}, статистика: {capture.decoder.stats}")
+    for row in rows:
+        logger.info(f"{row['sport']}: {row['team1']} vs {row['team2']} - {row.get('score', '')} "
+                    f"({row.get('time', '')}) {row['odds']}")
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,14 @@ TrueLiveBet - Автоматический сбор данных с BetBoom
 
 import asyncio
 import logging
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from dataclasses import dataclass
-from playwright.async_api import async_playwright, Browser, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 from loguru import logger
+from betboom_feed import FeedCapture
+from match_changes import MatchChange, diff_matches
 
 @dataclass
 class Match:
@@ -24,22 +27,91 @@ class Match:
     odds: Dict[str, float]
     status: str
     timestamp: datetime
+    is_locked: bool = False  # значок замка - ставка на матч сейчас недоступна
+
+# Селекторы матчей, полей и коэффициентов (первый найденный вариант в списке через запятую)
+EXTRACT_SELECTORS = {
+    'items': '[data-testid="match-item"]',
+    'fallback_items': '.match-item, .event-item, .live-match',
+    'fields': {
+        'sport': '[data-testid="sport"], .sport, .sport-name',
+        'league': '[data-testid="league"], .league, .tournament',
+        'team1': '[data-testid="team1"], .team1, .home-team',
+        'team2': '[data-testid="team2"], .team2, .away-team',
+        'score': '[data-testid="score"], .score, .match-score',
+        'time': '[data-testid="time"], .time, .match-time',
+        'status': '[data-testid="status"], .status, .match-status'
+    },
+    'odds': {
+        '1': '[data-testid="odd-1"], .odd-1, .home-odd',
+        'X': '[data-testid="odd-x"], .odd-x, .draw-odd',
+        '2': '[data-testid="odd-2"], .odd-2, .away-odd'
+    },
+    'locked': '[data-testid="locked"], .locked, .icon-lock'
+}
+
+# Чтение полей одного узла матча в странице: тексты полей и коэффициентов
+_READ_ROW_JS = """
+const readRow = (node, selectors) => {
+    const text = (selector) => {
+        const element = node.querySelector(selector);
+        return element ? (element.textContent || '') : '';
+    };
+    const row = {odds: {}};
+    for (const [name, selector] of Object.entries(selectors.fields)) row[name] = text(selector);
+    for (const [name, selector] of Object.entries(selectors.odds)) row.odds[name] = text(selector);
+    row.is_locked = node.querySelector(selectors.locked) !== null;
+    return row;
+};
+"""
+
+# Все матчи страницы за один вызов (вместо запроса на каждое поле каждого матча)
+EXTRACT_PAGE_JS = f"""(selectors) => {{
+{_READ_ROW_JS}
+    let nodes = document.querySelectorAll(selectors.items);
+    if (!nodes.length) nodes = document.querySelectorAll(selectors.fallback_items);
+    return Array.from(nodes, (node) => readRow(node, selectors));
+}}"""
+
+EXTRACT_ROW_JS = f"""(node, selectors) => {{
+{_READ_ROW_JS}
+    return readRow(node, selectors);
+}}"""
 
 class BetBoomScraper:
     """Класс для сбора данных с BetBoom"""
     
-    def __init__(self):
+    def __init__(self, headless: bool = False, timeout: int = 10000, persistent: bool = False,
+                 max_session_cycles: int = 100, health_timeout: float = 5.0,
+                 capture_feed: bool = False, feed_stale_after: float = 120.0):
+        """
+        persistent - браузер, контекст и страница живут между циклами (collect_live_matches
+        обновляет уже открытую страницу), сессия перезапускается при сбое и каждые max_session_cycles циклов
+        capture_feed - матчи берутся из XHR ответов и кадров WebSocket страницы (DOM - запасной вариант),
+        пока поток обновлялся не позже feed_stale_after секунд назад, страница не перезагружается
+        """
         self.base_url = "https://betboom.ru"
         self.live_url = f"{self.base_url}/live"
+        self.headless = headless  # False для отладки, True для продакшена
+        self.timeout = timeout
+        self.persistent = persistent
+        self.max_session_cycles = max_session_cycles
+        self.health_timeout = health_timeout
+        self.playwright = None
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
+        self.crashed = False
+        self.session_cycles = 0
+        self.feed: Optional[FeedCapture] = FeedCapture(stale_after=feed_stale_after) if capture_feed else None
+        self.session_stats = {'launches': 0, 'reloads': 0, 'relaunches': 0, 'feed_cycles': 0}
         
     async def start_browser(self):
         """Запуск браузера"""
         try:
             self.playwright = await async_playwright().start()
             self.browser = await self.playwright.chromium.launch(
-                headless=False,  # False для отладки, True для продакшена
+                headless=self.headless,
                 args=[
                     '--no-sandbox',
                     '--disable-dev-shm-usage',
@@ -47,10 +119,8 @@ class BetBoomScraper:
                     '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
                 ]
             )
-            self.page = await self.browser.new_page()
-            
-            # Устанавливаем заголовки для обхода защиты
-            await self.page.set_extra_http_headers({
+            # Заголовки для обхода защиты - на весь контекст (сохраняются при перезагрузках страницы)
+            self.context = await self.browser.new_context(extra_http_headers={
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
                 'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
                 'Accept-Encoding': 'gzip, deflate, br',
@@ -58,6 +128,17 @@ class BetBoomScraper:
                 'Connection': 'keep-alive',
                 'Upgrade-Insecure-Requests': '1',
             })
+            self.page = await self.context.new_page()
+            
+            # Падение процесса браузера или вкладки обнаруживается при следующей проверке сессии
+            self.crashed = False
+            self.browser.on("disconnected", self._on_disconnected)
+            self.page.on("crash", self._on_crash)
+            # Подписка на сетевой поток до перехода на live, чтобы не пропустить первые ответы
+            if self.feed:
+                self.feed.attach(self.page)
+            self.session_cycles = 0
+            self.session_stats['launches'] += 1
             
             logger.info("Браузер запущен успешно")
             
@@ -65,6 +146,85 @@ class BetBoomScraper:
             logger.error(f"Ошибка запуска браузера: {e}")
             raise
     
+    def _on_disconnected(self, browser: Browser):
+        # Закрытие через close() сначала отвязывает браузер - это не сбой
+        if browser is self.browser:
+            self._mark_crashed("браузер отключился")
+    
+    def _on_crash(self, page: Page):
+        if page is self.page:
+            self._mark_crashed("вкладка упала")
+    
+    def _mark_crashed(self, reason: str):
+        if not self.crashed:
+            logger.warning(f"Сессия браузера потеряна: {reason}")
+        self.crashed = True
+    
+    async def is_healthy(self) -> bool:
+        """Браузер подключен, вкладка жива и отвечает на выполнение скрипта"""
+        if self.crashed or not self.browser or not self.page:
+            return False
+        if not self.browser.is_connected() or self.page.is_closed():
+            return False
+        try:
+            return await asyncio.wait_for(self.page.evaluate("() => document.readyState"),
+                                          self.health_timeout) is not None
+        except Exception as e:
+            logger.warning(f"Вкладка не отвечает: {e}")
+            return False
+    
+    async def ensure_live_page(self):
+        """
+        Готовая к чтению live страница: запуск сессии при первом вызове, перезапуск
+        после сбоя или по возрасту сессии, иначе - перезагрузка уже открытой страницы
+        (не нужна, если сетевой поток продолжает обновлять данные)
+        """
+        if self.browser is not None:
+            if not await self.is_healthy():
+                logger.warning("Сессия браузера неработоспособна, перезапуск")
+                self.session_stats['relaunches'] += 1
+                await self.close()
+            elif self.session_cycles >= self.max_session_cycles:
+                logger.info(f"Плановый перезапуск браузера после {self.session_cycles} циклов")
+                await self.close()
+        
+        if self.browser is None:
+            await self.start_browser()
+            await self.navigate_to_live()
+        elif not self.page.url.startswith(self.live_url):
+            await self.navigate_to_live()
+        elif self.feed and self.feed.is_fresh():
+            self.session_stats['feed_cycles'] += 1
+        else:
+            await self.reload_live()
+        self.session_cycles += 1
+    
+    async def reload_live(self):
+        """Перезагрузка открытой live страницы (браузер и кэш ресурсов уже прогреты)"""
+        try:
+            await self.page.reload(wait_until='domcontentloaded', timeout=self.timeout * 3)
+            await self._wait_for_live_events()
+            self.session_stats['reloads'] += 1
+        except Exception as e:
+            logger.warning(f"Ошибка перезагрузки live страницы: {e}, повторный переход")
+            await self.navigate_to_live()
+    
+    async def collect_live_matches(self) -> List[Match]:
+        """
+        Live матчи за один цикл: в постоянном режиме - с прогретой сессии,
+        иначе браузер запускается и закрывается на каждый вызов
+        """
+        if self.persistent:
+            await self.ensure_live_page()
+            return await self.get_live_matches()
+        
+        await self.start_browser()
+        try:
+            await self.navigate_to_live()
+            return await self.get_live_matches()
+        finally:
+            await self.close()
+    
     async def navigate_to_live(self):
         """Переход на страницу лайв-ставок"""
         try:
@@ -72,10 +232,18 @@ class BetBoomScraper:
             logger.info(f"Перешли на {self.live_url}")
             
             # Ждем загрузки контента
-            await self.page.wait_for_selector('[data-testid="live-events"]', timeout=10000)
-            
+            await self._wait_for_live_events()
+        
         except Exception as e:
             logger.error(f"Ошибка перехода на live страницу: {e}")
+    
+    async def _wait_for_live_events(self):
+        """Ожидание блока live событий (основной или альтернативный селектор)"""
+        try:
+            await self.page.wait_for_selector('[data-testid="live-events"]', timeout=self.timeout)
+            
+        except Exception as e:
+            logger.error(f"Не найден блок live событий: {e}")
             # Пробуем альтернативный селектор
             try:
                 await self.page.wait_for_selector('.live-events', timeout=5000)
@@ -83,28 +251,58 @@ class BetBoomScraper:
             except:
                 logger.warning("Не удалось найти селектор live событий")
     
-    async def get_live_matches(self) -> List[Match]:
-        """Получение списка лайв-матчей"""
-        matches = []
+    async def stream_changes(self, poll_interval: float = 1.0,
+                             health_interval: float = 30.0) -> AsyncIterator[MatchChange]:
+        """
+        Поток изменений live матчей с постоянно открытой страницы: новый матч, счет,
+        коэффициенты, замок/снятие замка, исчезновение матча. Снимок перечитывается
+        сразу после обновления сетевого потока (без него - раз в poll_interval секунд),
+        раз в health_interval секунд проверяется сессия браузера.
+        """
+        await self.ensure_live_page()
+        known: Dict[str, Match] = {}
+        last_health_check = time.monotonic()
         
-        try:
-            # Ищем все live матчи
-            match_elements = await self.page.query_selector_all('[data-testid="match-item"]')
+        while True:
+            if self.feed:
+                await self.feed.wait_for_update(poll_interval)
+            else:
+                await asyncio.sleep(poll_interval)
             
-            if not match_elements:
-                # Альтернативный поиск
-                match_elements = await self.page.query_selector_all('.match-item, .event-item, .live-match')
+            if time.monotonic() - last_health_check >= health_interval:
+                last_health_check = time.monotonic()
+                if not await self.is_healthy():
+                    await self.ensure_live_page()
             
-            logger.info(f"Найдено {len(match_elements)} матчей")
+            matches = await self.get_live_matches(log_level="DEBUG")
+            if not matches and known:
+                # Пустой снимок - скорее сбой чтения, чем окончание всех матчей сразу
+                continue
+            known, changes = diff_matches(known, matches)
+            for change in changes:
+                yield change
+    
+    async def get_live_matches(self, log_level: str = "INFO") -> List[Match]:
+        """Получение списка лайв-матчей (из сетевого потока или все поля всех матчей - одним вызовом в странице)"""
+        if self.feed:
+            rows = self.feed.rows()
+            if rows:
+                matches = [match for match in map(self._build_match, rows) if match]
+                logger.log(log_level, f"Найдено {len(matches)} матчей в сетевом потоке")
+                return matches
+            logger.log(log_level, "Сетевой поток пуст, матчи читаются из DOM")
+        
+        matches = []
+        
+        try:
+            started = time.perf_counter()
+            rows = await self.page.evaluate(EXTRACT_PAGE_JS, EXTRACT_SELECTORS)
+            logger.log(log_level, f"Найдено {len(rows)} матчей (извлечение {(time.perf_counter() - started) * 1000:.0f} мс)")
             
-            for element in match_elements:
-                try:
-                    match_data = await self.extract_match_data(element)
-                    if match_data:
-                        matches.append(match_data)
-                except Exception as e:
-                    logger.warning(f"Ошибка извлечения данных матча: {e}")
-                    continue
+            for row in rows:
+                match_data = self._build_match(row)
+                if match_data:
+                    matches.append(match_data)
                     
         except Exception as e:
             logger.error(f"Ошибка получения live матчей: {e}")
@@ -112,88 +310,58 @@ class BetBoomScraper:
         return matches
     
     async def extract_match_data(self, element) -> Optional[Match]:
-        """Извлечение данных о матче"""
+        """Извлечение данных о матче из элемента (один вызов в странице)"""
         try:
-            # Извлекаем основную информацию
-            sport = await self.get_text(element, '[data-testid="sport"], .sport, .sport-name')
-            league = await self.get_text(element, '[data-testid="league"], .league, .tournament')
-            team1 = await self.get_text(element, '[data-testid="team1"], .team1, .home-team')
-            team2 = await self.get_text(element, '[data-testid="team2"], .team2, .away-team')
-            score = await self.get_text(element, '[data-testid="score"], .score, .match-score')
-            time = await self.get_text(element, '[data-testid="time"], .time, .match-time')
-            status = await self.get_text(element, '[data-testid="status"], .status, .match-status')
-            
-            # Извлекаем коэффициенты
-            odds = await self.extract_odds(element)
-            
-            if all([sport, team1, team2]):  # Проверяем обязательные поля
-                return Match(
-                    sport=sport,
-                    league=league or "Неизвестная лига",
-                    team1=team1,
-                    team2=team2,
-                    score=score or "0:0",
-                    time=time or "0'",
-                    odds=odds,
-                    status=status or "live",
-                    timestamp=datetime.now()
-                )
-                
+            return self._build_match(await element.evaluate(EXTRACT_ROW_JS, EXTRACT_SELECTORS))
         except Exception as e:
             logger.warning(f"Ошибка извлечения данных: {e}")
-        
         return None
     
-    async def get_text(self, element, selector: str) -> str:
-        """Получение текста по селектору"""
-        try:
-            text_element = await element.query_selector(selector)
-            if text_element:
-                return await text_element.text_content() or ""
-        except:
-            pass
-        return ""
-    
-    async def extract_odds(self, element) -> Dict[str, float]:
-        """Извлечение коэффициентов"""
+    def _build_match(self, row: Dict) -> Optional[Match]:
+        """Match из текстов полей, собранных в странице (None без обязательных полей)"""
+        if not all([row.get('sport'), row.get('team1'), row.get('team2')]):
+            return None
+        return Match(
+            sport=row['sport'],
+            league=row.get('league') or "Неизвестная лига",
+            team1=row['team1'],
+            team2=row['team2'],
+            score=row.get('score') or "0:0",
+            time=row.get('time') or "0'",
+            odds=self._parse_odds(row.get('odds') or {}),
+            status=row.get('status') or "live",
+            timestamp=datetime.now(),
+            is_locked=bool(row.get('is_locked'))
+        )
+    
+    @staticmethod
+    def _parse_odds(raw_odds: Dict[str, str]) -> Dict[str, float]:
+        """Коэффициенты из текста DOM или чисел потока (нечисловые значения пропускаются)"""
         odds = {}
-        try:
-            # Ищем коэффициенты для разных исходов
-            odd_selectors = [
-                '[data-testid="odd-1"], .odd-1, .home-odd',
-                '[data-testid="odd-x"], .odd-x, .draw-odd',
-                '[data-testid="odd-2"], .odd-2, .away-odd'
-            ]
-            
-            odd_names = ['1', 'X', '2']
-            
-            for selector, name in zip(odd_selectors, odd_names):
-                try:
-                    odd_element = await element.query_selector(selector)
-                    if odd_element:
-                        odd_text = await odd_element.text_content()
-                        if odd_text:
-                            odds[name] = float(odd_text.strip())
-                except:
-                    continue
-                    
-        except Exception as e:
-            logger.warning(f"Ошибка извлечения коэффициентов: {e}")
-        
+        for name, text in raw_odds.items():
+            try:
+                odds[name] = float(text.strip() if isinstance(text, str) else text)
+            except (TypeError, ValueError):
+                continue
         return odds
     
     async def close(self):
-        """Закрытие браузера"""
-        try:
-            if self.page:
-                await self.page.close()
-            if self.browser:
-                await self.browser.close()
-            if hasattr(self, 'playwright'):
-                await self.playwright.stop()
-            logger.info("Браузер закрыт")
-        except Exception as e:
-            logger.error(f"Ошибка закрытия браузера: {e}")
+        """Закрытие браузера (ошибки закрытия упавшей сессии не мешают перезапуску)"""
+        page, context, browser, playwright = self.page, self.context, self.browser, self.playwright
+        self.page = self.context = self.browser = self.playwright = None
+        
+        for resource in (page, context, browser):
+            if resource:
+                try:
+                    await resource.close()
+                except Exception as e:
+                    logger.warning(f"Ошибка закрытия браузера: {e}")
+        if playwright:
+            try:
+                await playwright.stop()
+            except Exception as e:
+                logger.error(f"Ошибка остановки Playwright: {e}")
+        logger.info("Браузер закрыт")
 
 async def main():
     """Основная функция"""
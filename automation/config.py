@@ -31,11 +31,43 @@ LOG_RETENTION = "7 days"
 # Настройки браузера
 BROWSER_HEADLESS = False  # False для отладки, True для продакшена
 BROWSER_TIMEOUT = 10000  # 10 секунд
+BROWSER_PERSISTENT = True  # Браузер и страница живут между циклами (иначе запуск на каждый цикл)
+BROWSER_MAX_SESSION_CYCLES = 100  # Плановый перезапуск сессии (утечки памяти страницы)
+BROWSER_HEALTH_TIMEOUT = 5  # секунды на проверку, что вкладка отвечает
+BROWSER_CAPTURE_FEED = True  # Матчи из XHR/WebSocket данных страницы (DOM - если поток пуст)
+BROWSER_FEED_STALE_AFTER = 120  # секунды без обновлений, после которых поток считается устаревшим (DOM)
+
+# Потоковый режим: анализ по изменениям матчей (новый матч, счет, коэффициенты, замок)
+# вместо полного снимка раз в CYCLE_INTERVAL
+STREAM_MODE = False
+STREAM_POLL_INTERVAL = 1.0  # секунды между чтениями табло без сетевого потока
+STREAM_HEALTH_INTERVAL = 30  # секунды между проверками сессии браузера
+STREAM_BATCH_WINDOW = 10  # секунды накопления изменений перед пакетным анализом
+STREAM_MIN_REANALYSIS = 120  # повторный анализ одного матча не чаще, секунды
 
 # Настройки AI
 AI_MAX_TOKENS = 1000
 AI_TEMPERATURE = 0.1
 
+# Квота AI провайдера (запросы выполняются параллельно в ее пределах)
+AI_REQUESTS_PER_MINUTE = 50
+AI_TOKENS_PER_MINUTE = 40000
+AI_MAX_CONCURRENCY = 10
+AI_RATE_LIMIT_RETRIES = 3
+
+# Адреса API (None - провайдеры по умолчанию; локальная заглушка: sports_analyzer/mock_llm_server.py)
+AI_ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL')
+AI_OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+
+# Метрики LLM в формате Prometheus после каждого пакета (None - не сохранять)
+AI_METRICS_FILE = os.getenv('AI_METRICS_FILE', 'metrics/llm_metrics.prom')
+
+# Цены моделей, $ за 1M токенов (вход, выход) - для llm_cost_usd_total в метриках
+AI_MODEL_PRICES = {
+    "claude-3-sonnet-20240229": (3.0, 15.0),
+    "gpt-4": (30.0, 60.0)
+}
+
 def get_config() -> Dict:
     """Получение конфигурации в виде словаря"""
     return {
@@ -50,8 +82,26 @@ def get_config() -> Dict:
         'log_retention': LOG_RETENTION,
         'browser_headless': BROWSER_HEADLESS,
         'browser_timeout': BROWSER_TIMEOUT,
+        'browser_persistent': BROWSER_PERSISTENT,
+        'browser_max_session_cycles': BROWSER_MAX_SESSION_CYCLES,
+        'browser_health_timeout': BROWSER_HEALTH_TIMEOUT,
+        'browser_capture_feed': BROWSER_CAPTURE_FEED,
+        'browser_feed_stale_after': BROWSER_FEED_STALE_AFTER,
+        'stream_mode': STREAM_MODE,
+        'stream_poll_interval': STREAM_POLL_INTERVAL,
+        'stream_health_interval': STREAM_HEALTH_INTERVAL,
+        'stream_batch_window': STREAM_BATCH_WINDOW,
+        'stream_min_reanalysis': STREAM_MIN_REANALYSIS,
         'ai_max_tokens': AI_MAX_TOKENS,
-        'ai_temperature': AI_TEMPERATURE
+        'ai_temperature': AI_TEMPERATURE,
+        'ai_requests_per_minute': AI_REQUESTS_PER_MINUTE,
+        'ai_tokens_per_minute': AI_TOKENS_PER_MINUTE,
+        'ai_max_concurrency': AI_MAX_CONCURRENCY,
+        'ai_rate_limit_retries': AI_RATE_LIMIT_RETRIES,
+        'ai_anthropic_base_url': AI_ANTHROPIC_BASE_URL,
+        'ai_openai_base_url': AI_OPENAI_BASE_URL,
+        'ai_metrics_file': AI_METRICS_FILE,
+        'ai_model_prices': AI_MODEL_PRICES
     }
 
 def validate_config() -> bool:
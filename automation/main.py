@@ -10,7 +10,8 @@ import time
 from datetime import datetime
 from typing import List, Dict
 from loguru import logger
-from betboom_scraper import BetBoomScraper
+from betboom_scraper import BetBoomScraper, Match
+from match_changes import CHANGE_KINDS, LOCKED, REMOVED, MatchChange
 from ai_analyzer import AIAnalyzer
 from telegram_bot import TrueLiveBetBot
 from channel_publisher import ChannelPublisher
@@ -35,6 +36,11 @@ class TrueLiveBetAutomation:
             'analyses_sent': 0,
             'errors': 0
         }
+        
+        # Потоковый режим: изменения матчей по видам и матчи, ожидающие анализа
+        self.change_stats = {kind: 0 for kind in CHANGE_KINDS}
+        self.pending_matches: Dict[str, Dict] = {}
+        self.analyzed_at: Dict[str, float] = {}
     
     def _setup_logging(self):
         """Настройка логирования"""
@@ -57,13 +63,29 @@ class TrueLiveBetAutomation:
             logger.info("Инициализация TrueLiveBet автоматизации...")
             
             # Инициализируем скрапер
-            self.scraper = BetBoomScraper()
+            self.scraper = BetBoomScraper(
+                headless=self.config.get('browser_headless', False),
+                timeout=self.config.get('browser_timeout', 10000),
+                persistent=self.config.get('browser_persistent', True),
+                max_session_cycles=self.config.get('browser_max_session_cycles', 100),
+                health_timeout=self.config.get('browser_health_timeout', 5),
+                capture_feed=self.config.get('browser_capture_feed', False),
+                feed_stale_after=self.config.get('browser_feed_stale_after', 120)
+            )
             logger.info("Скрапер BetBoom инициализирован")
             
             # Инициализируем AI анализатор
             self.analyzer = AIAnalyzer(
                 openai_api_key=self.config.get('openai_api_key'),
-                anthropic_api_key=self.config.get('anthropic_api_key')
+                anthropic_api_key=self.config.get('anthropic_api_key'),
+                requests_per_minute=self.config.get('ai_requests_per_minute', 50),
+                tokens_per_minute=self.config.get('ai_tokens_per_minute', 40000),
+                max_concurrency=self.config.get('ai_max_concurrency', 10),
+                rate_limit_retries=self.config.get('ai_rate_limit_retries', 3),
+                anthropic_base_url=self.config.get('ai_anthropic_base_url'),
+                openai_base_url=self.config.get('ai_openai_base_url'),
+                metrics_file=self.config.get('ai_metrics_file'),
+                model_prices=self.config.get('ai_model_prices')
             )
             logger.info("AI анализатор инициализирован")
             
@@ -94,6 +116,11 @@ class TrueLiveBetAutomation:
                 bot_task = asyncio.create_task(self.bot.start_bot())
                 logger.info("Telegram бот запущен в фоне")
             
+            # Потоковый режим: анализ по изменениям live страницы
+            if self.config.get('stream_mode', False):
+                await self._run_stream()
+                return
+            
             # Основной цикл автоматизации
             while self.is_running:
                 try:
@@ -126,37 +153,98 @@ class TrueLiveBetAutomation:
                 return
             
             logger.info(f"Собрано {len(matches)} матчей")
-            
-            # 2. Анализ матчей с помощью AI
-            analyses = await self._analyze_matches(matches)
-            if not analyses:
-                logger.warning("Не удалось проанализировать матчи")
-                return
-            
-            logger.info(f"Проанализировано {len(analyses)} матчей")
-            
-            # 3. Фильтрация по нашим критериям
-            filtered_analyses = self._filter_analyses(analyses)
-            logger.info(f"Отфильтровано {len(filtered_analyses)} анализов")
-            
-            # 4. Отправка результатов в Telegram
-            if self.bot and filtered_analyses:
-                await self._send_analyses(filtered_analyses)
-            
-            # 5. Публикация в канал
-            if hasattr(self, 'channel_publisher') and filtered_analyses:
-                await self._publish_to_channel(filtered_analyses)
-            
-            # Обновляем статистику
-            self.stats['matches_analyzed'] += len(matches)
-            self.stats['analyses_sent'] += len(filtered_analyses)
-            
-            logger.info(f"Цикл автоматизации завершен. Статистика: {self.stats}")
+            await self._process_matches(matches)
             
         except Exception as e:
             logger.error(f"Ошибка в цикле автоматизации: {e}")
             raise
     
+    async def _process_matches(self, matches: List[Dict]):
+        """Анализ, фильтрация и отправка результатов по собранным матчам (ошибки логируют вызывающие)"""
+        # 2. Анализ матчей с помощью AI
+        analyses = await self._analyze_matches(matches)
+        if not analyses:
+            logger.warning("Не удалось проанализировать матчи")
+            return
+        
+        logger.info(f"Проанализировано {len(analyses)} матчей")
+        
+        # 3. Фильтрация по нашим критериям
+        filtered_analyses = self._filter_analyses(analyses)
+        logger.info(f"Отфильтровано {len(filtered_analyses)} анализов")
+        
+        # 4. Отправка результатов в Telegram
+        if self.bot and filtered_analyses:
+            await self._send_analyses(filtered_analyses)
+        
+        # 5. Публикация в канал
+        if hasattr(self, 'channel_publisher') and filtered_analyses:
+            await self._publish_to_channel(filtered_analyses)
+        
+        # Обновляем статистику
+        self.stats['matches_analyzed'] += len(matches)
+        self.stats['analyses_sent'] += len(filtered_analyses)
+        
+        logger.info(f"Цикл автоматизации завершен. Статистика: {self.stats}")
+    
+    async def _run_stream(self):
+        """
+        Потоковый режим: страница BetBoom остается открытой, изменения матчей копятся
+        и каждые stream_batch_window секунд уходят на анализ одним пакетом
+        """
+        while self.is_running:
+            reader = asyncio.create_task(self._read_changes())
+            try:
+                while self.is_running and not reader.done():
+                    await asyncio.sleep(self.config.get('stream_batch_window', 10))
+                    await self._analyze_pending()
+                # Поток завершился только при ошибке - она поднимается здесь
+                if reader.done():
+                    reader.result()
+            except Exception as e:
+                logger.error(f"Ошибка в потоке изменений: {e}")
+                self.stats['errors'] += 1
+                await asyncio.sleep(60)  # Ждем минуту при ошибке
+            finally:
+                reader.cancel()
+    
+    async def _read_changes(self):
+        """Чтение потока изменений: матчи с доступной ставкой ставятся в очередь на анализ"""
+        changes = self.scraper.stream_changes(
+            poll_interval=self.config.get('stream_poll_interval', 1.0),
+            health_interval=self.config.get('stream_health_interval', 30)
+        )
+        async for change in changes:
+            self._on_change(change)
+    
+    def _on_change(self, change: MatchChange):
+        """Учет изменения: закрытые и исчезнувшие матчи снимаются с анализа"""
+        self.change_stats[change.kind] += 1
+        logger.debug(f"Изменение матча: {change.describe()}")
+        
+        # Ставка недоступна (замок) - анализ бесполезен, как и в BaseAnalyzer._is_bet_available
+        if change.kind in (LOCKED, REMOVED) or change.match.is_locked:
+            self.pending_matches.pop(change.key, None)
+            return
+        self.pending_matches[change.key] = self._match_to_dict(change.match)
+    
+    async def _analyze_pending(self):
+        """Анализ накопленных изменений (матч анализируется не чаще stream_min_reanalysis секунд)"""
+        now = time.monotonic()
+        min_interval = self.config.get('stream_min_reanalysis', 120)
+        ready = [key for key in self.pending_matches
+                 if now - self.analyzed_at.get(key, float('-inf')) >= min_interval]
+        if not ready:
+            return
+        
+        matches = [self.pending_matches.pop(key) for key in ready]
+        for key in ready:
+            self.analyzed_at[key] = now
+        
+        logger.info(f"Анализ {len(matches)} измененных матчей (ожидают: {len(self.pending_matches)}, "
+                    f"изменения: {self.change_stats})")
+        await self._process_matches(matches)
+    
     async def _collect_matches(self) -> List[Dict]:
         """Сбор матчей с BetBoom"""
         try:
@@ -164,40 +252,34 @@ class TrueLiveBetAutomation:
                 logger.error("Скрапер не инициализирован")
                 return []
             
-            # Запускаем браузер
-            await self.scraper.start_browser()
-            
-            # Переходим на live страницу
-            await self.scraper.navigate_to_live()
-            
-            # Получаем live матчи
-            matches = await self.scraper.get_live_matches()
-            
-            # Закрываем браузер
-            await self.scraper.close()
+            # Получаем live матчи: в постоянном режиме браузер остается открытым
+            # до stop_automation, и цикл начинается с перезагрузки прогретой страницы
+            matches = await self.scraper.collect_live_matches()
+            logger.info(f"Сессия браузера: {self.scraper.session_stats}")
             
             # Конвертируем в словари для анализа
-            match_dicts = []
-            for match in matches:
-                match_dict = {
-                    'sport': match.sport,
-                    'league': match.league,
-                    'team1': match.team1,
-                    'team2': match.team2,
-                    'score': match.score,
-                    'time': match.time,
-                    'odds': match.odds,
-                    'status': match.status,
-                    'timestamp': match.timestamp.isoformat()
-                }
-                match_dicts.append(match_dict)
-            
-            return match_dicts
+            return [self._match_to_dict(match) for match in matches]
             
         except Exception as e:
             logger.error(f"Ошибка сбора матчей: {e}")
             return []
     
+    @staticmethod
+    def _match_to_dict(match: Match) -> Dict:
+        """Словарь матча для анализа"""
+        return {
+            'sport': match.sport,
+            'league': match.league,
+            'team1': match.team1,
+            'team2': match.team2,
+            'score': match.score,
+            'time': match.time,
+            'odds': match.odds,
+            'status': match.status,
+            'is_locked': match.is_locked,
+            'timestamp': match.timestamp.isoformat()
+        }
+    
     async def _analyze_matches(self, matches: List[Dict]) -> List:
         """Анализ матчей с помощью AI"""
         try:
@@ -206,7 +288,7 @@ class TrueLiveBetAutomation:
                 return []
             
             # Пакетный анализ всех матчей
-            analyses = await self.analyzer.batch_analyze(matches)
+            analyses = await self.analyzer.batch_analyze(matches, deadline=self.config.get('cycle_interval'))
             
             return analyses
             
@@ -329,6 +411,11 @@ class TrueLiveBetAutomation:
             'status': 'running' if self.is_running else 'stopped',
             'uptime': str(uptime),
             'stats': self.stats.copy(),
+            'browser_session': dict(self.scraper.session_stats) if self.scraper else {},
+            'stream': {
+                'changes': dict(self.change_stats),
+                'pending_matches': len(self.pending_matches)
+            },
             'components': {
                 'scraper': self.scraper is not None,
                 'analyzer': self.analyzer is not None,
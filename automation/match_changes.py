@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+TrueLiveBet - Изменения live матчей между снимками табло
+Вместо полного списка матчей на каждый цикл - события: новый матч, изменение счета,
+изменение коэффициентов, замок/снятие замка (is_locked), исчезновение матча.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+NEW_MATCH = "new_match"
+SCORE = "score"
+ODDS = "odds"
+LOCKED = "locked"
+UNLOCKED = "unlocked"
+REMOVED = "removed"
+
+CHANGE_KINDS = (NEW_MATCH, SCORE, ODDS, LOCKED, UNLOCKED, REMOVED)
+
+
+@dataclass
+class MatchChange:
+    """Одно изменение матча: новое состояние и предыдущее (для нового матча - None)"""
+    kind: str
+    key: str
+    match: Any
+    previous: Optional[Any] = None
+    detected_at: datetime = field(default_factory=datetime.now)
+
+    def describe(self) -> str:
+        """Краткое описание для логов"""
+        title = f"{self.match.team1} vs {self.match.team2}"
+        if self.kind == SCORE:
+            return f"{title}: счет {self.previous.score} -> {self.match.score}"
+        if self.kind == ODDS:
+            return f"{title}: коэффициенты {self.previous.odds} -> {self.match.odds}"
+        return f"{title}: {self.kind}"
+
+
+def match_key(match: Any) -> str:
+    """Ключ матча между снимками (вид спорта и команды)"""
+    return f"{match.sport}|{match.team1}|{match.team2}".lower()
+
+
+def diff_matches(previous: Dict[str, Any], current: Iterable[Any]) -> Tuple[Dict[str, Any], List[MatchChange]]:
+    """
+    Сравнивает снимок с предыдущим: (новый снимок по ключам, список изменений).
+    Изменение счета и коэффициентов одного матча - два отдельных события.
+    """
+    snapshot: Dict[str, Any] = {}
+    changes: List[MatchChange] = []
+
+    for match in current:
+        key = match_key(match)
+        snapshot[key] = match
+        before = previous.get(key)
+        if before is None:
+            changes.append(MatchChange(NEW_MATCH, key, match))
+            continue
+        if match.score != before.score:
+            changes.append(MatchChange(SCORE, key, match, before))
+        if match.odds != before.odds:
+            changes.append(MatchChange(ODDS, key, match, before))
+        if match.is_locked != before.is_locked:
+            changes.append(MatchChange(LOCKED if match.is_locked else UNLOCKED, key, match, before))
+
+    for key, before in previous.items():
+        if key not in snapshot:
+            changes.append(MatchChange(REMOVED, key, before, before))
+
+    return snapshot, changes
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+TrueLiveBet - Проверка декодера потока BetBoom и изменений табло
+Без браузера и сети: кадры и снимки табло задаются в тесте или берутся
+из записанных фикстур (fixtures/).
+Запуск: python test_feed.py (или pytest test_feed.py)
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from betboom_feed import FeedCapture, FeedDecoder, decode_event, decode_odds, json_payloads
+from match_changes import NEW_MATCH, SCORE, ODDS, LOCKED, UNLOCKED, REMOVED, diff_matches
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@dataclass
+class Row:
+    """Строка табло с полями Match, которые сравнивает diff_matches"""
+    sport: str
+    team1: str
+    team2: str
+    score: str = "0:0"
+    odds: Dict[str, float] = field(default_factory=dict)
+    is_locked: bool = False
+
+
+EVENT = {
+    "id": 101,
+    "sport": {"name": "Футбол"},
+    "tournament": {"name": "РПЛ"},
+    "participants": [{"name": "Спартак"}, {"name": "ЦСКА"}],
+    "score": "1:0",
+    "markets": [
+        {"id": 9001, "name": "Тотал", "outcomes": [{"name": "Б", "price": 1.9}]},
+        {"id": 9002, "name": "1X2", "outcomes": [
+            {"name": "1", "price": 1.7}, {"name": "X", "price": 3.6}, {"name": "2", "price": 4.8}
+        ]}
+    ]
+}
+
+
+def test_decode_event():
+    """Поля события из вложенных объектов, основной рынок 1X2"""
+    fields = decode_event(EVENT)
+    assert fields["id"] == "101"
+    assert (fields["sport"], fields["team1"], fields["team2"]) == ("Футбол", "Спартак", "ЦСКА")
+    assert fields["odds"] == {"1": 1.7, "X": 3.6, "2": 4.8}
+    assert decode_odds({"П1": "2.10", "Х": 3.3}) == {"1": 2.1, "X": 3.3}
+    assert decode_event({"id": 5, "name": "баннер"}) is None
+
+
+def test_decode_lock_status():
+    """Замок по флагу, статусу события и приостановке основного рынка"""
+    assert decode_event({"id": 1, "status": "suspended"})["is_locked"] is True
+    assert decode_event({"id": 1, "state": "blocked"})["is_locked"] is True
+    assert decode_event({"id": 1, "status": "live"})["is_locked"] is False
+    assert "is_locked" not in decode_event({"id": 1, "status": "2 тайм"})
+
+    market = {"name": "1X2", "status": "suspended", "outcomes": [{"name": "1", "price": 1.7}]}
+    assert decode_event({"id": 1, "markets": [market]})["is_locked"] is True
+    # Приостановка второстепенного рынка не закрывает событие
+    total = {"name": "Тотал", "suspended": True, "outcomes": [{"name": "Б", "price": 1.9}]}
+    assert decode_event({"id": 1, "markets": [total, dict(market, status="open")]})["is_locked"] is False
+
+
+def test_json_payloads():
+    """socket.io префикс, разделитель SignalR и бинарные кадры"""
+    assert json_payloads('42["update",{"id":1}]') == [["update", {"id": 1}]]
+    assert json_payloads('{"a":1}\x1e{"b":2}\x1e') == [{"a": 1}, {"b": 2}]
+    assert json_payloads(b"\xff\x00") == []
+    assert json_payloads("pong") == []
+
+
+def test_feed_partial_updates():
+    """Частичное обновление сливается по id, id рынков не заводят событий"""
+    decoder = FeedDecoder()
+    assert decoder.feed({"data": {"events": [EVENT]}}) == {"101"}
+    assert "9002" not in decoder.events
+
+    decoder.feed('42["update",{"eventId":101,"score":"2:0","isLocked":true}]')
+    rows = decoder.rows()
+    assert len(rows) == 1
+    assert rows[0]["score"] == "2:0" and rows[0]["is_locked"] is True
+    assert rows[0]["odds"] == {"1": 1.7, "X": 3.6, "2": 4.8}
+
+    # Обновление без команд для неизвестного id не создает событие
+    decoder.feed({"id": 555, "score": "3:3"})
+    assert "555" not in decoder.events
+
+
+def test_feed_removal_and_freshness():
+    """Завершенное событие удаляется; устаревший поток и старые события не попадают в строки"""
+    decoder = FeedDecoder(stale_after=60, event_ttl=300)
+    decoder.feed([EVENT, {"id": 202, "sport": "Теннис", "home": "Рублев", "away": "Медведев"}])
+    assert len(decoder.rows()) == 2
+
+    assert decoder.feed({"id": 202, "status": "ended"}) == {"202"}
+    assert [row["id"] for row in decoder.rows()] == ["101"]
+
+    # Событие без обновлений дольше event_ttl удаляется, пока поток жив
+    decoder.feed({"id": 303, "sport": "Футбол", "home": "Зенит", "away": "Локомотив"})
+    decoder.updated_at["101"] = time.monotonic() - 301
+    assert [row["id"] for row in decoder.rows()] == ["303"]
+
+    # Поток целиком устарел - строк нет
+    decoder.updated_at["303"] = time.monotonic() - 61
+    assert decoder.rows() == []
+
+
+def test_replay_har():
+    """HAR: ответ API в base64, чужой адрес пропускается, кадры WebSocket обновляют события"""
+    capture = FeedCapture(stale_after=float("inf"), event_ttl=float("inf"))
+    assert capture.replay_har(os.path.join(FIXTURES, "betboom_live.har")) == 6
+
+    rows = {row["id"]: row for row in capture.rows()}
+    assert sorted(rows) == ["101", "202"]
+
+    football = rows["101"]
+    assert (football["sport"], football["league"], football["team1"], football["team2"]) == \
+        ("Футбол", "РПЛ", "Спартак", "ЦСКА")
+    assert football["score"] == "1:0" and football["is_locked"] is True
+    assert football["odds"] == {"1": 1.5, "X": 4.0, "2": 6.5}
+
+    tennis = rows["202"]
+    assert (tennis["team1"], tennis["team2"], tennis["score"]) == ("Рублев", "Медведев", "1:0")
+    assert tennis["is_locked"] is True and tennis["odds"] == {"1": 1.5, "2": 2.6}
+
+
+def test_replay_frames():
+    """JSONL кадров: запись с url и payload, кадр строкой, пустые строки пропускаются"""
+    capture = FeedCapture(stale_after=float("inf"), event_ttl=float("inf"))
+    assert capture.replay_frames(os.path.join(FIXTURES, "betboom_frames.jsonl")) == 3
+
+    rows = capture.rows()
+    assert len(rows) == 1
+    assert (rows[0]["id"], rows[0]["score"], rows[0]["is_locked"]) == ("101", "2:0", False)
+    assert rows[0]["odds"] == {"1": 1.2, "X": 4.0, "2": 6.5}
+
+
+def test_diff_matches():
+    """Новый матч, счет, коэффициенты, замок и исчезновение - отдельные события"""
+    first = [Row("football", "Спартак", "ЦСКА", odds={"1": 1.7}), Row("tennis", "Рублев", "Медведев")]
+    snapshot, changes = diff_matches({}, first)
+    assert [change.kind for change in changes] == [NEW_MATCH, NEW_MATCH]
+
+    second = [Row("football", "Спартак", "ЦСКА", score="1:0", odds={"1": 1.5}, is_locked=True)]
+    snapshot, changes = diff_matches(snapshot, second)
+    assert sorted(change.kind for change in changes) == sorted([SCORE, ODDS, LOCKED, REMOVED])
+    removed = next(change for change in changes if change.kind == REMOVED)
+    assert removed.match.team1 == "Рублев"
+
+    third = [Row("football", "Спартак", "ЦСКА", score="1:0", odds={"1": 1.5})]
+    _, changes = diff_matches(snapshot, third)
+    assert [change.kind for change in changes] == [UNLOCKED]
+    assert diff_matches(snapshot, second)[1] == []
+
+
+if __name__ == "__main__":
+    print("🧪 Проверка потока BetBoom и изменений табло")
+    for test in (test_decode_event, test_decode_lock_status, test_json_payloads, test_feed_partial_updates,
+                 test_feed_removal_and_freshness, test_replay_har, test_replay_frames, test_diff_matches):
+        test()
+        print(f"✅ {test.__doc__}")
+    print("🎉 Все проверки пройдены")
@@ -5,12 +5,20 @@
 
 import asyncio
 import logging
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
 
 from utils.claude_analyzer import ClaudeAnalyzer
-from config.claude_config import CLAUDE_CONFIG
+from utils.llm_gateway import collect_usage
+from utils.llm_metrics import get_llm_metrics
+from utils.match_pair_cache import MatchPairCache
+from utils.match_state import MatchStateTracker
+from utils.model_cascade import get_cascade_stats, needs_escalation, TRIAGE, CONFIRM
+from config.claude_config import CLAUDE_CONFIG, MODEL_PRICES
+from config.settings import ANALYSIS_CONFIG, SPORT_CRITERIA, STATE_DELTA_CONFIG, CASCADE_CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +33,22 @@ class BaseAnalyzer(ABC):
         
         # Инициализация Claude анализатора
         self.claude_analyzer = ClaudeAnalyzer(CLAUDE_CONFIG.get("api_key"))
+        
+        # Кэш сопоставлений матчей между циклами (переживает перезапуск процесса)
+        cache_dir = ANALYSIS_CONFIG.get("pair_cache_dir")
+        cache_path = os.path.join(cache_dir, f"match_pairs_{sport_name}.json") if cache_dir else None
+        self.pair_cache = MatchPairCache(cache_path, fuzzy_matcher,
+                                         ANALYSIS_CONFIG.get("pair_cache_negative_ttl", 300))
+        
+        # Последние проанализированные состояния матчей
+        self.state_tracker = MatchStateTracker(STATE_DELTA_CONFIG)
+        
+        # Каскад: первичная оценка эвристиками или легкой моделью, основная модель -
+        # только для матчей в неопределенной зоне
+        self.cascade_stats = get_cascade_stats(MODEL_PRICES)
+        self.triage_analyzer = None
+        if CASCADE_CONFIG.get("enabled", False) and CASCADE_CONFIG.get("triage") == "model":
+            self.triage_analyzer = ClaudeAnalyzer(CLAUDE_CONFIG.get("api_key"), CASCADE_CONFIG.get("triage_model"))
     
     @abstractmethod
     async def get_betboom_matches(self) -> List[Dict[str, Any]]:
@@ -61,6 +85,17 @@ class BaseAnalyzer(ABC):
         else:
             return {"confidence": 0, "reasoning": "Неподдерживаемый вид спорта"}
     
+    def heuristic_analysis(self, betboom_match: Dict[str, Any],
+                           scores24_match: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Резервный анализ без Claude (переопределяется в наследниках)"""
+        return None
+    
+    def model_fallback(self, betboom_match: Dict[str, Any],
+                       scores24_match: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Эвристический вердикт вместо неудачного ответа модели (помечен model_failed)"""
+        result = self.heuristic_analysis(betboom_match, scores24_match)
+        return dict(result, model_failed=True) if result else result
+    
     async def analyze(self) -> List[Dict[str, Any]]:
         """Основной метод анализа"""
         self.logger.info(f"Начало анализа {self.sport_name}")
@@ -87,41 +122,57 @@ class BaseAnalyzer(ABC):
             filtered_matches = self.filter_matches_by_criteria(betboom_matches)
             self.logger.info(f"Отфильтровано {len(filtered_matches)} матчей из {len(betboom_matches)}")
             
-            recommendations = []
+            # Сопоставление с матчами Scores24 одним вызовом на вид спорта
+            matched_pairs = self._pair_matches_cached(filtered_matches, scores24_matches)
+            self.pair_cache.expire(betboom_matches, scores24_matches)
+            self.pair_cache.save()
             
-            # Анализ каждого отфильтрованного матча
-            for betboom_match in filtered_matches:
-                try:
-                    # Поиск соответствующего матча на Scores24
-                    matched_data = self._find_matching_scores24_data(
-                        betboom_match, scores24_matches
-                    )
-                    
-                    if not matched_data:
-                        self.logger.debug(f"Не найдено соответствие для матча: {betboom_match}")
-                        continue
-                    
-                    # Анализ статистики через Claude AI
-                    analysis_result = await self.analyze_match_statistics(
-                        betboom_match, matched_data['match']
-                    )
-                    
-                    # Проверка уверенности в прогнозе
-                    if analysis_result.get('confidence', 0) >= 80:
-                        # Проверка доступности ставки
-                        if self._is_bet_available(betboom_match):
-                            recommendation = self._format_recommendation(
-                                betboom_match, matched_data, analysis_result
-                            )
-                            recommendations.append(recommendation)
-                        else:
-                            self.logger.debug(f"Ставка недоступна для матча: {betboom_match}")
-                    else:
-                        self.logger.debug(f"Низкая уверенность ({analysis_result.get('confidence', 0)}%) для матча: {betboom_match}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Ошибка анализа матча {betboom_match}: {e}")
-                    continue
+            if CLAUDE_CONFIG.get("batch_mode", False):
+                # Несколько матчей в одном запросе к Claude
+                results = await self._analyze_pairs_batched(filtered_matches, matched_pairs)
+            else:
+                # Параллельный анализ отфильтрованных матчей с ограничением по числу запросов
+                semaphore = asyncio.Semaphore(self._get_concurrency_limit())
+                results = await asyncio.gather(*[
+                    self._analyze_pair(betboom_match, matched_data, semaphore)
+                    for betboom_match, matched_data in zip(filtered_matches, matched_pairs)
+                ])
+            
+            # Результаты собираются в исходном порядке матчей
+            recommendations = [r for r in results if r is not None]
+            self.state_tracker.expire(self._state_key(m) for m in filtered_matches)
+            
+            stats = self.pair_cache.stats
+            self.logger.info(
+                f"Кэш сопоставлений ({self.sport_name}): {stats['hits']} попаданий, "
+                f"{stats['negative_hits']} без пары, {stats['misses']} промахов, "
+                f"{stats['conflicts']} конфликтов, {stats['expired']} удалено ({self.pair_cache.hit_rate():.0%})"
+            )
+            
+            stats = self.state_tracker.stats
+            self.logger.info(
+                f"Состояния матчей ({self.sport_name}): {stats['reused']} вердиктов переиспользовано, "
+                f"{stats['reanalyzed']} матчей на повторный анализ"
+            )
+            
+            response_cache = self.claude_analyzer.response_cache
+            if response_cache:
+                stats = response_cache.stats[self.sport_name]
+                self.logger.info(
+                    f"Кэш ответов Claude ({self.sport_name}): {stats['hits']} попаданий, "
+                    f"{stats['misses']} промахов ({response_cache.hit_rate(self.sport_name):.0%})"
+                )
+            
+            prompt_cache_stats = self.claude_analyzer.prompt_cache_stats
+            stats = prompt_cache_stats.stats[self.sport_name]
+            if stats['calls']:
+                self.logger.info(
+                    f"Кэш промптов Claude ({self.sport_name}): чтение {stats['cache_read_input_tokens']}, "
+                    f"запись {stats['cache_creation_input_tokens']}, без кэша {stats['input_tokens']} токенов "
+                    f"({prompt_cache_stats.cached_share(self.sport_name):.0%} из кэша)"
+                )
+            
+            self.cascade_stats.log_summary(self.sport_name)
             
             self.logger.info(f"Анализ {self.sport_name} завершен: {len(recommendations)} рекомендаций")
             return recommendations
@@ -130,6 +181,227 @@ class BaseAnalyzer(ABC):
             self.logger.error(f"Критическая ошибка анализа {self.sport_name}: {e}")
             return []
     
+    def _get_concurrency_limit(self) -> int:
+        """Максимум одновременных запросов анализа для вида спорта"""
+        return max(1, SPORT_CRITERIA.get(self.sport_name, {}).get("max_concurrent_analyses", 5))
+    
+    async def _analyze_pair(self, betboom_match: Dict[str, Any],
+                            matched_data: Optional[Dict[str, Any]],
+                            semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """Анализирует один сопоставленный матч, ошибки не влияют на остальные матчи"""
+        try:
+            if not matched_data:
+                self.logger.debug(f"Не найдено соответствие для матча: {betboom_match}")
+                return None
+            
+            analysis_result = await self._get_analysis(betboom_match, matched_data, semaphore)
+            return self._build_recommendation(betboom_match, matched_data, analysis_result)
+                
+        except Exception as e:
+            self.logger.error(f"Ошибка анализа матча {betboom_match}: {e}")
+        
+        return None
+    
+    async def _analyze_pairs_batched(self, betboom_matches: List[Dict[str, Any]],
+                                     matched_pairs: List[Optional[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """Пакетный анализ: все измененные матчи вида спорта отправляются пакетами"""
+        analyses: List[Optional[Dict[str, Any]]] = [None] * len(betboom_matches)
+        pending = []
+        
+        for i, (betboom_match, matched_data) in enumerate(zip(betboom_matches, matched_pairs)):
+            if not matched_data:
+                self.logger.debug(f"Не найдено соответствие для матча: {betboom_match}")
+                continue
+            analyses[i] = self._reuse_if_unchanged(betboom_match)
+            if analyses[i] is None:
+                pending.append(i)
+        
+        # Первичная оценка каскада: в пакет уходят только неопределенные матчи
+        triage = await asyncio.gather(*[
+            self._triage(betboom_matches[i], matched_pairs[i]['match']) for i in pending
+        ])
+        escalated = [i for i, (_, escalate) in zip(pending, triage) if escalate]
+        for i, (triage_result, escalate) in zip(pending, triage):
+            if not escalate:
+                self._remember(betboom_matches[i], triage_result)
+                analyses[i] = triage_result
+        
+        if escalated:
+            started = time.perf_counter()
+            try:
+                with collect_usage() as usage:
+                    batch_results = await self.claude_analyzer.analyze_batch(
+                        self.sport_name,
+                        [(betboom_matches[i], matched_pairs[i]['match']) for i in escalated],
+                        max_concurrency=self._get_concurrency_limit()
+                    )
+            except Exception as e:
+                self.logger.error(f"Ошибка пакетного анализа {self.sport_name}: {e}")
+                batch_results = [None] * len(escalated)
+            self.cascade_stats.record(self.sport_name, CONFIRM, time.perf_counter() - started,
+                                      calls=len(escalated), usage_records=usage)
+            
+            for i, analysis_result in zip(escalated, batch_results):
+                betboom_match, scores24_match = betboom_matches[i], matched_pairs[i]['match']
+                
+                # Если Claude анализ неудачен, используем fallback логику
+                if not analysis_result or analysis_result.get('confidence', 0) == 0:
+                    analysis_result = self.model_fallback(betboom_match, scores24_match) or analysis_result
+                if not analysis_result:
+                    continue
+                
+                self._remember(betboom_match, analysis_result)
+                analyses[i] = analysis_result
+        
+        results = []
+        for betboom_match, matched_data, analysis_result in zip(betboom_matches, matched_pairs, analyses):
+            try:
+                results.append(
+                    self._build_recommendation(betboom_match, matched_data, analysis_result)
+                    if analysis_result else None
+                )
+            except Exception as e:
+                self.logger.error(f"Ошибка анализа матча {betboom_match}: {e}")
+                results.append(None)
+        return results
+    
+    def _build_recommendation(self, betboom_match: Dict[str, Any],
+                              matched_data: Dict[str, Any],
+                              analysis_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Рекомендация по результату анализа, если уверенность достаточна и ставка доступна"""
+        # Проверка уверенности в прогнозе
+        if analysis_result.get('confidence', 0) >= 80:
+            # Проверка доступности ставки
+            if self._is_bet_available(betboom_match):
+                return self._format_recommendation(
+                    betboom_match, matched_data, analysis_result
+                )
+            self.logger.debug(f"Ставка недоступна для матча: {betboom_match}")
+        else:
+            self.logger.debug(f"Низкая уверенность ({analysis_result.get('confidence', 0)}%) для матча: {betboom_match}")
+        
+        return None
+    
+    def _state_key(self, betboom_match: Dict[str, Any]) -> str:
+        """Ключ состояния матча (гандбол анализируется отдельно на победу и тотал)"""
+        return f"{self.pair_cache.key_for(betboom_match)}|{betboom_match.get('analysis_type', '')}"
+    
+    async def _get_analysis(self, betboom_match: Dict[str, Any],
+                            matched_data: Dict[str, Any],
+                            semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """Анализ матча с пропуском запроса, если состояние существенно не изменилось"""
+        reused = self._reuse_if_unchanged(betboom_match)
+        if reused is not None:
+            return reused
+        
+        async with semaphore:
+            analysis_result, escalate = await self._triage(betboom_match, matched_data['match'])
+            if escalate:
+                # Анализ статистики через Claude AI
+                started = time.perf_counter()
+                with collect_usage() as usage:
+                    analysis_result = await self.analyze_match_statistics(
+                        betboom_match, matched_data['match']
+                    )
+                self.cascade_stats.record(self.sport_name, CONFIRM, time.perf_counter() - started,
+                                          usage_records=usage)
+        
+        self._remember(betboom_match, analysis_result)
+        return analysis_result
+    
+    def _remember(self, betboom_match: Dict[str, Any], analysis_result: Optional[Dict[str, Any]]):
+        """
+        Запоминает вердикт для повторного использования. Ошибка модели и эвристика вместо нее
+        не запоминаются: иначе один временный сбой (429, таймаут) закрепил бы резервный вердикт
+        до изменения матча или max_age_minutes.
+        """
+        if not analysis_result or analysis_result.get('model_failed') or analysis_result.get('confidence', 0) == 0:
+            return
+        self.state_tracker.remember(self._state_key(betboom_match), betboom_match, analysis_result)
+    
+    async def _triage(self, betboom_match: Dict[str, Any],
+                      scores24_match: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Первичная оценка каскада: (результат, нужна ли основная модель).
+        Без каскада основная модель нужна всегда.
+        """
+        if not CASCADE_CONFIG.get("enabled", False):
+            return None, True
+        
+        triage_result = None
+        started = time.perf_counter()
+        with collect_usage() as usage:
+            try:
+                if self.triage_analyzer:
+                    triage_result = await self.triage_analyzer.analyze_match(
+                        self.sport_name, betboom_match, scores24_match
+                    )
+                else:
+                    triage_result = self.heuristic_analysis(betboom_match, scores24_match)
+            except Exception as e:
+                self.logger.debug(f"Первичная оценка не удалась, матч передается основной модели: {e}")
+        if triage_result:
+            # Эвристики могут выйти за шкалу (бонусы сверх 100%)
+            triage_result = dict(triage_result, confidence=min(100, max(0, triage_result.get('confidence', 0) or 0)))
+        self.cascade_stats.record(self.sport_name, TRIAGE, time.perf_counter() - started, usage_records=usage)
+        
+        escalate = needs_escalation(triage_result, CASCADE_CONFIG.get("uncertain_band", (65, 92)))
+        self.cascade_stats.record_decision(self.sport_name, escalate)
+        if escalate:
+            return None, True
+        
+        self.logger.debug(f"Вердикт первичной оценки ({triage_result.get('confidence')}%) без эскалации")
+        return dict(triage_result, tier=TRIAGE), False
+    
+    def _reuse_if_unchanged(self, betboom_match: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Предыдущий вердикт, если состояние матча существенно не изменилось"""
+        if not STATE_DELTA_CONFIG.get("enabled", True):
+            return None
+        
+        key = self._state_key(betboom_match)
+        delta = self.state_tracker.get_delta(key, betboom_match)
+        get_llm_metrics().record_state(self.sport_name, delta is None)
+        if delta is None:
+            self.logger.debug(f"Матч не изменился, используем предыдущий вердикт: {key}")
+            return self.state_tracker.reuse(key)
+        
+        self.logger.debug(f"Повторный анализ ({delta}): {key}")
+        return None
+    
+    def _pair_matches_cached(self, betboom_matches: List[Dict[str, Any]],
+                             scores24_matches: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Сопоставление с учетом кэша: fuzzy matching только для новых матчей"""
+        matched_pairs, pending = self.pair_cache.lookup(betboom_matches, scores24_matches)
+        
+        if pending:
+            # Уже занятые матчи Scores24 не участвуют в новом назначении
+            claimed = {id(pair['match']) for pair in matched_pairs if pair}
+            free_scores24 = [m for m in scores24_matches if id(m) not in claimed]
+            
+            new_pairs = self._pair_matches([betboom_matches[i] for i in pending], free_scores24)
+            for i, pair in zip(pending, new_pairs):
+                matched_pairs[i] = pair
+                self.pair_cache.put(betboom_matches[i], pair)
+        
+        self.logger.debug(
+            f"Кэш сопоставлений: {len(betboom_matches) - len(pending)} из кэша, "
+            f"{len(pending)} сопоставлено заново"
+        )
+        return matched_pairs
+    
+    def _pair_matches(self, betboom_matches: List[Dict[str, Any]],
+                      scores24_matches: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Сопоставляет все матчи BetBoom с матчами Scores24 (один к одному)"""
+        method = ANALYSIS_CONFIG.get("pairing_method", "hungarian")
+        
+        if method == "first_match":
+            return [
+                self._find_matching_scores24_data(betboom_match, scores24_matches)
+                for betboom_match in betboom_matches
+            ]
+        
+        return self.fuzzy_matcher.pair_matches(betboom_matches, scores24_matches, method=method)
+    
     def _find_matching_scores24_data(self, betboom_match: Dict[str, Any], 
                                    scores24_matches: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """Находит соответствующий матч на Scores24"""
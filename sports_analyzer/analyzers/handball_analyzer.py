@@ -135,13 +135,17 @@ class HandballAnalyzer(BaseAnalyzer):
         
         # Если Claude анализ неудачен, используем fallback логику
         if claude_result.get('confidence', 0) == 0:
-            if analysis_type == 'victory':
-                return self._fallback_victory_analysis(betboom_match, scores24_match)
-            else:
-                return self._fallback_total_analysis(betboom_match, scores24_match)
+            return self.model_fallback(betboom_match, scores24_match)
         
         return claude_result
     
+    def heuristic_analysis(self, betboom_match: Dict[str, Any], 
+                           scores24_match: Dict[str, Any]) -> Dict[str, Any]:
+        """Резервный анализ без Claude для выбранного типа ставки"""
+        if betboom_match.get('analysis_type', 'victory') == 'total':
+            return self._fallback_total_analysis(betboom_match, scores24_match)
+        return self._fallback_victory_analysis(betboom_match, scores24_match)
+    
     def _fallback_victory_analysis(self, betboom_match: Dict[str, Any], 
                                   scores24_match: Dict[str, Any]) -> Dict[str, Any]:
         """Резервный анализ вероятности победы при большом разрыве"""
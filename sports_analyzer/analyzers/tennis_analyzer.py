@@ -127,10 +127,15 @@ class TennisAnalyzer(BaseAnalyzer):
         
         # Если Claude анализ неудачен, используем fallback логику
         if claude_result.get('confidence', 0) == 0:
-            return self._fallback_analysis(betboom_match, scores24_match)
+            return self.model_fallback(betboom_match, scores24_match)
         
         return claude_result
     
+    def heuristic_analysis(self, betboom_match: Dict[str, Any], 
+                           scores24_match: Dict[str, Any]) -> Dict[str, Any]:
+        """Резервный анализ без Claude"""
+        return self._fallback_analysis(betboom_match, scores24_match)
+    
     def _fallback_analysis(self, betboom_match: Dict[str, Any], 
                           scores24_match: Dict[str, Any]) -> Dict[str, Any]:
         """Резервный анализ если Claude недоступен"""
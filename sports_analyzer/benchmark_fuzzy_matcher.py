@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сопоставления матчей FuzzyMatcher
+Сравнивает полный перебор и поиск через индекс кандидатов на 50, 500 и 5000 событиях,
+а также pair_matches по полной матрице, по кандидатам индекса и с backend ngram
+"""
+
+import random
+import sys
+import os
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.fuzzy_matcher import FuzzyMatcher
+
+
+SYLLABLES = ["ар", "се", "на", "ло", "ди", "ка", "мо", "ре", "ту", "ви", "ба", "зе", "ли", "по", "кс"]
+LOOKUPS = 50
+
+
+def make_name(rng: random.Random) -> str:
+    """Генерирует случайное название команды из 2-3 слов"""
+    words = []
+    for _ in range(rng.randint(2, 3)):
+        words.append(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize())
+    return ' '.join(words)
+
+
+def distort(name: str, rng: random.Random) -> str:
+    """Имитирует различия в написании между BetBoom и Scores24"""
+    if rng.random() < 0.5:
+        return name.upper()
+    pos = rng.randrange(len(name))
+    return name[:pos] + name[pos + 1:]
+
+
+def make_board(size: int, rng: random.Random):
+    """Создает список матчей Scores24 и выборку искаженных запросов BetBoom"""
+    scores24_matches = [{"team1": make_name(rng), "team2": make_name(rng)} for _ in range(size)]
+    queries = []
+    for match in rng.sample(scores24_matches, min(LOOKUPS, size)):
+        queries.append((distort(match["team1"], rng), distort(match["team2"], rng), match))
+    return scores24_matches, queries
+
+
+def run(matcher: FuzzyMatcher, scores24_matches, queries):
+    """Возвращает среднюю задержку поиска (мс) и долю верных сопоставлений"""
+    hits = 0
+    started = time.perf_counter()
+    for team1, team2, expected in queries:
+        result = matcher.match_teams(team1, team2, scores24_matches)
+        if result and result['match'] is expected:
+            hits += 1
+    elapsed = time.perf_counter() - started
+    return elapsed / len(queries) * 1000, hits / len(queries)
+
+
+def main():
+    print("🔍 Бенчмарк FuzzyMatcher.match_teams")
+    print(f"{'событий':>8} | {'перебор, мс':>12} | {'индекс, мс':>11} | {'точность':>15}")
+
+    for size in (50, 500, 5000):
+        rng = random.Random(size)
+        scores24_matches, queries = make_board(size, rng)
+
+        full_scan = FuzzyMatcher(use_index=False)
+        indexed = FuzzyMatcher()
+
+        # Индекс строится один раз на список и переиспользуется
+        build_started = time.perf_counter()
+        indexed.build_index(scores24_matches, ('team1', 'team2'))
+        build_ms = (time.perf_counter() - build_started) * 1000
+
+        scan_ms, scan_acc = run(full_scan, scores24_matches, queries)
+        index_ms, index_acc = run(indexed, scores24_matches, queries)
+
+        print(f"{size:>8} | {scan_ms:>12.2f} | {index_ms:>11.2f} | {scan_acc:>6.0%} / {index_acc:>6.0%}"
+              f"  (построение индекса {build_ms:.1f} мс)")
+
+        stats = indexed.get_cache_stats()
+        print(f"{'':>8}   кэш нормализации: {stats['hits']} попаданий / {stats['misses']} промахов "
+              f"({stats['hit_rate']:.0%})")
+
+
+def compare_backends():
+    """Пакетное сопоставление pair_matches: полная матрица, индекс кандидатов и backend ngram"""
+    print()
+    print("🔍 Бенчмарк FuzzyMatcher.pair_matches")
+    print(f"{'событий':>8} | {'полная, мс':>11} | {'индекс, мс':>11} | {'ngram, мс':>10} | "
+          f"{'точность':>24} | {'совпадение':>10}")
+
+    variants = {
+        "dense": dict(backend="reference", use_index=False),
+        "indexed": dict(backend="reference"),
+        "ngram": dict(backend="ngram")
+    }
+
+    for size in (50, 500):
+        rng = random.Random(size)
+        scores24_matches, queries = make_board(size, rng)
+        betboom_matches = [{"team1": team1, "team2": team2} for team1, team2, _ in queries]
+        expected = [match for _, _, match in queries]
+
+        results = {}
+        timings = {}
+        for name, options in variants.items():
+            matcher = FuzzyMatcher(**options)
+            started = time.perf_counter()
+            results[name] = matcher.pair_matches(betboom_matches, scores24_matches, method="greedy")
+            timings[name] = (time.perf_counter() - started) * 1000
+
+        def accuracy(pairs):
+            return sum(1 for pair, exp in zip(pairs, expected) if pair and pair['match'] is exp) / len(expected)
+
+        agreement = sum(
+            1 for ref, fast in zip(results["dense"], results["indexed"])
+            if (ref and ref['match']) is (fast and fast['match'])
+        ) / len(expected)
+
+        print(f"{size:>8} | {timings['dense']:>11.1f} | {timings['indexed']:>11.1f} | {timings['ngram']:>10.1f} | "
+              f"{accuracy(results['dense']):>6.0%} / {accuracy(results['indexed']):>6.0%} / "
+              f"{accuracy(results['ngram']):>6.0%} | {agreement:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
+    compare_backends()
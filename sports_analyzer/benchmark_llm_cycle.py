@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности анализа через LLM на локальной заглушке API
+Поднимает mock_llm_server в процессе, направляет на него клиентов через base_url
+и прогоняет синтетические матчи: поштучно (параллельно) и пакетами.
+Выводит матчи/сек, латентность запросов, повторы и учет токенов заглушки.
+
+Пример:
+    python benchmark_llm_cycle.py --matches 200 --latency lognormal:0.8,0.4 --error-rate 0.05 --rpm 300
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import os
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockLLMServer
+from config.claude_config import CLAUDE_CONFIG, RESPONSE_PROCESSING
+from config.settings import SPORT_CRITERIA
+
+
+def make_matches(count: int, rng: random.Random):
+    """Синтетические пары (BetBoom, Scores24) футбольных матчей"""
+    pairs = []
+    for i in range(count):
+        goals1, goals2 = rng.randint(1, 3), rng.randint(0, 1)
+        betboom = {
+            "team1": f"Команда {i}А", "team2": f"Команда {i}Б",
+            "score": f"{goals1}:{goals2}", "minute": rng.randint(10, 85), "league": "Тестовая лига",
+            "odds": {"1": round(rng.uniform(1.2, 3.0), 2), "X": 3.4, "2": round(rng.uniform(2.0, 6.0), 2)}
+        }
+        scores24 = {
+            "league_position1": rng.randint(1, 20), "league_position2": rng.randint(1, 20),
+            "form1": "".join(rng.choice("WDL") for _ in range(5)),
+            "form2": "".join(rng.choice("WDL") for _ in range(5)),
+            "recent_goals1": rng.randint(3, 12), "recent_goals2": rng.randint(3, 12),
+            "league_level": "средний"
+        }
+        pairs.append((betboom, scores24))
+    return pairs
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_single(analyzer, pairs, concurrency: int):
+    """Поштучный анализ с ограничением параллельных запросов (как BaseAnalyzer.analyze)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(betboom, scores24):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await analyzer.analyze_match("football", betboom, scores24)
+            latencies.append(time.perf_counter() - started)
+            return result
+
+    results = await asyncio.gather(*[one(*pair) for pair in pairs])
+    return results, latencies
+
+
+async def run_batched(analyzer, pairs, concurrency: int):
+    """Пакетный анализ (несколько матчей в одном запросе)"""
+    results = await analyzer.analyze_batch("football", pairs, max_concurrency=concurrency)
+    return results, []
+
+
+async def benchmark(args):
+    server = MockLLMServer(latency=args.latency, token_latency=args.token_latency,
+                           error_rate=args.error_rate, rate_limit_rpm=args.rpm, seed=args.seed)
+    base_url = await server.start()
+
+    # Клиенты идут на заглушку; кэш ответов выключен, чтобы второй прогон не читал первый
+    CLAUDE_CONFIG.update({
+        "api_key": "local-benchmark",
+        "base_url": f"{base_url}/v1/messages",
+        "openai_api_key": None,
+        "response_cache_enabled": False,
+        "stream_early_stop": args.stream,
+        "requests_per_minute": args.client_rpm or None,
+        "max_concurrency": args.concurrency
+    })
+    RESPONSE_PROCESSING["retry_delay"] = args.retry_delay
+
+    # Импорт после настройки: шлюз создается с адресом заглушки
+    from utils.claude_analyzer import ClaudeAnalyzer
+    from utils.http_client import close_http_client
+
+    pairs = make_matches(args.matches, random.Random(args.seed))
+    concurrency = args.concurrency or SPORT_CRITERIA["football"]["max_concurrent_analyses"]
+
+    print(f"🧪 Бенчмарк LLM на заглушке {base_url}: {len(pairs)} матчей, параллельно {concurrency}, "
+          f"задержка {args.latency}, ошибки {args.error_rate:.0%}, лимит {args.rpm or '∞'} RPM")
+    print(f"{'режим':>10} | {'время, с':>9} | {'матчей/с':>9} | {'p50, с':>7} | {'p95, с':>7} | "
+          f"{'успешно':>8} | {'запросов':>8} | {'повторов':>8} | {'429':>5}")
+
+    for mode, runner in (("поштучно", run_single), ("пакетами", run_batched)):
+        analyzer = ClaudeAnalyzer("local-benchmark")
+        gateway = analyzer.gateway
+        gateway.metrics.clear()
+        gateway._latencies.clear()
+        before = dict(server.stats)
+
+        started = time.perf_counter()
+        results, latencies = await runner(analyzer, pairs, concurrency)
+        elapsed = time.perf_counter() - started
+
+        latencies = latencies or list(gateway._latencies[gateway.providers[0].name])
+        succeeded = sum(1 for result in results if result and result.get("confidence", 0) > 0)
+        metrics = gateway.get_stats().get(gateway.providers[0].name, {})
+        print(f"{mode:>10} | {elapsed:>9.2f} | {len(pairs) / elapsed:>9.1f} | {percentile(latencies, 0.5):>7.2f} | "
+              f"{percentile(latencies, 0.95):>7.2f} | {succeeded:>8} | {metrics.get('requests', 0):>8.0f} | "
+              f"{metrics.get('retries', 0):>8.0f} | {server.stats['rate_limited'] - before['rate_limited']:>5}")
+
+        tokens = {key: server.stats[key] - before[key] for key in
+                  ('input_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens', 'output_tokens')}
+        print(f"{'':>10}   токены: вход {tokens['input_tokens']}, чтение кэша {tokens['cache_read_input_tokens']}, "
+              f"запись кэша {tokens['cache_creation_input_tokens']}, выход {tokens['output_tokens']}; "
+              f"соединений всего {server.stats['connections']}")
+
+    await close_http_client()
+    await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк анализа через LLM на локальной заглушке")
+    parser.add_argument("--matches", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=0, help="0 - как max_concurrent_analyses футбола")
+    parser.add_argument("--latency", default="lognormal:0.6,0.4")
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="лимит заглушки (429 сверх лимита)")
+    parser.add_argument("--client-rpm", type=int, default=0, help="квота клиента (0 - без планировщика)")
+    parser.add_argument("--retry-delay", type=float, default=0.2)
+    parser.add_argument("--stream", action="store_true", help="потоковые ответы с досрочной остановкой")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,78 @@
 """
 
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # Настройки Claude API
 CLAUDE_CONFIG = {
     "api_key": os.getenv("CLAUDE_API_KEY", "DEMO_MODE"),  # Тестовый режим
     "model": "claude-3-5-sonnet-20241022",
+    "base_url": os.getenv("CLAUDE_BASE_URL"),  # None - Anthropic API (локальная заглушка: mock_llm_server.py)
     "max_tokens": 1000,
     "temperature": 0.1,  # Низкая температура для точного анализа
-    "timeout": 30
+    "timeout": 30,
+    "connect_timeout": 5,
+    
+    # Общий пул HTTP соединений для всех анализаторов процесса
+    "http_pool_size": 20,
+    "http_keepalive_connections": 10,
+    "http_keepalive_expiry": 60,  # секунды
+    "http2": True,  # Используется, если установлен пакет h2
+    
+    # Кэш ответов по хэшу (модель, системный промпт, промпт)
+    "response_cache_enabled": True,
+    "response_cache_path": "cache/claude_responses.sqlite",
+    "response_cache_ttl": 3600,  # секунды
+    
+    # Резервный провайдер и квота для шлюза LLM (utils/llm_gateway.py)
+    "openai_api_key": os.getenv("OPENAI_API_KEY"),  # None - без резервного провайдера
+    "openai_model": "gpt-4o-mini",
+    "openai_base_url": os.getenv("OPENAI_BASE_URL"),
+    "provider_order": ["anthropic", "openai"],
+    "requests_per_minute": 50,
+    "tokens_per_minute": 40000,
+    "max_concurrency": 10,
+    
+    # Пакетный режим: несколько матчей одного вида спорта в одном запросе
+    "batch_mode": False,
+    "batch_input_token_budget": 6000,  # оценка входных токенов на запрос
+    "batch_output_tokens_per_match": 250,
+    "batch_max_output_tokens": 4000,
+    
+    # Потоковые ответы: генерация прерывается, как только confidence и recommendation
+    # известны и уверенность ниже min_confidence вида спорта (CONFIDENCE_THRESHOLDS)
+    "stream_early_stop": True,
+    
+    # Структурированный ответ через tool use: схема ответа передается инструментом
+    # вместо описания формата в промпте, ответ проверяется по схеме
+    "structured_output": True
+}
+
+# Офлайн пакеты Message Batches: контекстный анализ, валидация и сводки
+# (не критичны по времени, дешевле и не расходуют квоту live анализа)
+OFFLINE_BATCH_CONFIG = {
+    "enabled": False,
+    "base_url": os.getenv("CLAUDE_BATCHES_URL"),  # None - base_url из CLAUDE_CONFIG + "/batches" (если задан) или Anthropic API
+    "poll_interval": 60,  # секунды между опросами состояния пакета
+    "max_wait": 6 * 3600,  # секунды
+    "max_pending": 200,  # рекомендаций на вид спорта, ожидающих пакета (старые отбрасываются)
+    "max_tokens": 1000,
+    "results_dir": os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "recommendations", "offline"),
+    # Время сводок берется из analysis_schedule этого файла
+    "schedule_file": os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                  "frequency_settings.json"),
+    "summary_slots": ["morning_report", "evening_report"]
+}
+
+# Цены моделей, $ за 1M токенов (вход, выход) - для учета стоимости по этапам анализа.
+# Чтение кэша промптов - 10% цены входа, запись - 125%
+MODEL_PRICES = {
+    "claude-3-5-sonnet-20241022": (3.0, 15.0),
+    "claude-3-5-haiku-20241022": (0.8, 4.0),
+    "claude-3-sonnet-20240229": (3.0, 15.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4o-mini": (0.15, 0.6)
 }
 
 # Системные промпты для разных видов спорта
@@ -89,8 +152,31 @@ QUICK_ANALYSIS_PROMPTS = {
 # Настройки для обработки ответов Claude
 RESPONSE_PROCESSING = {
     "max_retries": 3,
-    "retry_delay": 1,  # секунды
+    "retry_delay": 1,  # секунды, база экспоненциальной паузы
+    "max_retry_delay": 30,  # потолок паузы между повторами
+    "retry_jitter": True,  # полный джиттер паузы
+    "hedge_requests": False,  # дублировать запрос после p95 латентности
+    "hedge_quantile": 0.95,
+    "hedge_min_samples": 20,  # замеров латентности до включения хеджирования
     "fallback_confidence": 50,
     "json_validation": True,
     "required_fields": ["confidence", "recommendation", "reasoning"]
-}
\ No newline at end of file
+}
+
+
+def early_stop_threshold(sport: str) -> Optional[float]:
+    """Порог досрочной остановки потокового ответа (None - ответ читается полностью)"""
+    if not CLAUDE_CONFIG.get("stream_early_stop") or sport not in CONFIDENCE_THRESHOLDS:
+        return None
+    return CONFIDENCE_THRESHOLDS[sport]["min_confidence"]
+
+
+def get_gateway_settings(**overrides) -> Dict[str, Any]:
+    """Настройки шлюза LLM: CLAUDE_CONFIG, параметры повторов и переопределения вызывающего"""
+    settings = dict(CLAUDE_CONFIG)
+    for key in ("max_retries", "retry_delay", "max_retry_delay", "retry_jitter",
+                "hedge_requests", "hedge_quantile", "hedge_min_samples"):
+        settings[key] = RESPONSE_PROCESSING[key]
+    settings["model_prices"] = MODEL_PRICES
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
@@ -7,8 +7,35 @@ from typing import Dict, Any
 # Основные настройки
 ANALYSIS_CONFIG = {
     "cycle_minutes": 50,
+    "llm_budget_minutes": 10,  # Бюджет времени запросов к LLM в цикле (live матчи быстро устаревают)
     "confidence_threshold": 80,  # Минимальная вероятность победы фаворита
     "fuzzy_match_threshold": 70,  # Минимальный процент совпадения для fuzzy matching
+    "aliases_file": None,  # JSON с дополнительными алиасами команд/игроков
+    "pairing_method": "hungarian",  # hungarian | greedy | first_match (лучшее совпадение отдельно для каждого матча)
+    "similarity_backend": "reference",  # reference (SequenceMatcher) | ngram (векторизованный NumPy)
+    "pair_cache_dir": "cache",  # Каталог кэша сопоставлений BetBoom ↔ Scores24 (None - отключить)
+    "pair_cache_negative_ttl": 300,  # Секунд до повторного поиска пары для матча без пары в Scores24
+    "metrics_file": "metrics/llm_metrics.prom",  # Метрики LLM в формате Prometheus после каждого цикла (None - не сохранять)
+}
+
+# Каскад моделей: дешевая первичная оценка всех кандидатов, основная модель -
+# только для матчей с уверенностью в неопределенной зоне около порога 80%.
+# Выключен по умолчанию: эвристики не откалиброваны, а вердикт выше зоны публикуется без модели
+CASCADE_CONFIG = {
+    "enabled": False,
+    "triage": "heuristic",  # heuristic (локальные эвристики анализаторов) | model (triage_model)
+    "triage_model": "claude-3-5-haiku-20241022",
+    "uncertain_band": (65, 92),  # Ниже - пропуск, выше - вердикт первичной оценки без подтверждения
+}
+
+# Повторный анализ только при существенном изменении состояния матча
+STATE_DELTA_CONFIG = {
+    "enabled": True,
+    "material_fields": ["score", "sets_score", "current_set", "half", "analysis_type"],
+    "odds_threshold": 0.05,  # Относительное движение коэффициента (5%)
+    "minute_bucket": 10,  # Смена 10-минутного интервала матча
+    "confidence_decay_per_minute": 0.5,  # Снижение уверенности повторно используемого вердикта
+    "max_age_minutes": 30  # Не дольше этого времени без повторного анализа
 }
 
 # URL сайтов для анализа
@@ -32,6 +59,7 @@ SPORT_CRITERIA = {
     "football": {
         "score_condition": "non_draw",  # Не ничейный счет
         "min_confidence": 80,
+        "max_concurrent_analyses": 6,  # Одновременных запросов к Claude
         "analysis_factors": ["team_form", "league_position", "league_level"]
     },
     "tennis": {
@@ -40,11 +68,13 @@ SPORT_CRITERIA = {
             "first_set_lead_4plus"  # Ведет в первом сете с разрывом ≥4
         ],
         "min_confidence": 80,
+        "max_concurrent_analyses": 6,  # Одновременных запросов к Claude
         "analysis_factors": ["player_form", "ranking", "head_to_head"]
     },
     "table_tennis": {
         "score_conditions": ["sets_1_0", "sets_2_0"],  # 1:0 или 2:0 по сетам
         "min_confidence": 80,
+        "max_concurrent_analyses": 8,  # Одновременных запросов к Claude
         "analysis_factors": ["player_form", "ranking"]
     },
     "handball": {
@@ -55,6 +85,7 @@ SPORT_CRITERIA = {
             "half": 2  # Только во втором тайме
         },
         "min_confidence": 80,
+        "max_concurrent_analyses": 4,  # Одновременных запросов к Claude
         "analysis_factors": ["team_form", "league_position", "avg_goals"]
     }
 }
@@ -5,9 +5,10 @@
 """
 
 import asyncio
+import json
 import logging
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import schedule
 import time
 
@@ -18,7 +19,12 @@ from analyzers.handball_analyzer import HandballAnalyzer
 from utils.fuzzy_matcher import FuzzyMatcher
 from utils.report_generator import ReportGenerator
 from utils.advanced_claude_analyzer import AdvancedClaudeAnalyzer
+from utils.http_client import close_http_client
+from utils.llm_gateway import LLMError, llm_deadline
+from utils.llm_metrics import get_llm_metrics
+from utils.message_batches import OfflineBatchQueue
 from config.settings import ANALYSIS_CONFIG
+from config.claude_config import OFFLINE_BATCH_CONFIG, get_gateway_settings
 
 # Настройка логирования
 logging.basicConfig(
@@ -36,7 +42,10 @@ class SportsAnalyzer:
     """Основной класс анализатора спортивных событий"""
     
     def __init__(self):
-        self.fuzzy_matcher = FuzzyMatcher()
+        self.fuzzy_matcher = FuzzyMatcher(
+            aliases_file=ANALYSIS_CONFIG.get("aliases_file"),
+            backend=ANALYSIS_CONFIG.get("similarity_backend", "reference")
+        )
         self.report_generator = ReportGenerator()
         self.claude_analyzer = AdvancedClaudeAnalyzer()
         
@@ -48,6 +57,11 @@ class SportsAnalyzer:
             'handball': HandballAnalyzer(self.fuzzy_matcher)
         }
         
+        # Рекомендации с последней сводки - для офлайн валидации и отчетов
+        self.pending_results: Dict[str, List[Dict[str, Any]]] = {}
+        # Отправленный, но еще не обработанный офлайн пакет (результаты забираются collect_offline_batch)
+        self.offline_queue: Optional[OfflineBatchQueue] = None
+        
         logger.info("SportsAnalyzer инициализирован с Claude AI интеграцией")
     
     async def run_analysis_cycle(self) -> Dict[str, List[Dict[str, Any]]]:
@@ -76,6 +90,14 @@ class SportsAnalyzer:
                     logger.error(f"Ошибка анализа {sport_name}: {e}")
                     results[sport_name] = []
             
+            if OFFLINE_BATCH_CONFIG.get("enabled", False):
+                max_pending = OFFLINE_BATCH_CONFIG.get("max_pending", 200)
+                for sport_name, sport_results in results.items():
+                    pending = self.pending_results.setdefault(sport_name, [])
+                    pending.extend(sport_results)
+                    # Пакеты не отправляются (тестовый режим, ошибки API) - храним только последние
+                    del pending[:-max_pending]
+            
             # Генерация и отправка отчета
             if any(results.values()):
                 report = self.report_generator.generate_telegram_report(results)
@@ -87,13 +109,118 @@ class SportsAnalyzer:
         except Exception as e:
             logger.error(f"Ошибка в цикле анализа: {e}")
         
+        cache_stats = self.fuzzy_matcher.get_cache_stats()
+        logger.info(
+            f"Кэш нормализации: {cache_stats['hits']} попаданий, {cache_stats['misses']} промахов "
+            f"({cache_stats['hit_rate']:.0%}), размер {cache_stats['size']}"
+        )
+        
         logger.info("Цикл анализа завершен")
         return results
     
+    async def _run_cycle_and_close(self):
+        """
+        Цикл анализа в пределах бюджета времени LLM (повторы, не успевающие
+        к концу бюджета, не выполняются) с закрытием общего HTTP пула
+        и выгрузкой метрик LLM
+        """
+        try:
+            with llm_deadline(ANALYSIS_CONFIG.get("llm_budget_minutes", ANALYSIS_CONFIG["cycle_minutes"]) * 60):
+                await self.run_analysis_cycle()
+        finally:
+            await close_http_client()
+            self._dump_llm_metrics()
+    
+    def _dump_llm_metrics(self):
+        """Сводка метрик LLM в лог и файл для textfile collector Prometheus"""
+        metrics = get_llm_metrics()
+        metrics.log_summary()
+        metrics_file = ANALYSIS_CONFIG.get("metrics_file")
+        if not metrics_file:
+            return
+        try:
+            metrics.dump(metrics_file)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить метрики LLM: {e}")
+    
+    async def submit_offline_batch(self, slot: str) -> Optional[str]:
+        """
+        Офлайн пакет по накопленным рекомендациям: контекстный анализ по видам спорта,
+        валидация каждой рекомендации и сводка. Пакет только отправляется - результаты
+        забирает collect_offline_batch (в recommendations/offline). Возвращает id пакета.
+        """
+        if self.claude_analyzer._is_mock_mode():
+            logger.info("Офлайн пакеты недоступны в тестовом режиме Claude")
+            return None
+        
+        queue = OfflineBatchQueue(get_gateway_settings(api_key=self.claude_analyzer.api_key), OFFLINE_BATCH_CONFIG)
+        for sport_name, recommendations in self.pending_results.items():
+            if not recommendations:
+                continue
+            self.claude_analyzer.queue_match_context_analysis(queue, sport_name, recommendations)
+            for recommendation in recommendations:
+                self.claude_analyzer.queue_validation(queue, sport_name, recommendation)
+        self.claude_analyzer.queue_daily_summary(queue, slot, self.pending_results)
+        
+        try:
+            batch_id = await queue.submit()
+        finally:
+            await close_http_client()
+        
+        # Рекомендации ушли в пакет; при ошибке отправки остаются до следующей сводки (не больше max_pending)
+        if batch_id is not None:
+            self.pending_results = {}
+            self.offline_queue = queue
+        return batch_id
+    
+    async def poll_offline_batch(self) -> Optional[Dict[str, Any]]:
+        """Проверяет отправленный пакет: отчет, если обработка завершена, иначе None"""
+        try:
+            report = await self.offline_queue.poll()
+        except (LLMError, KeyError) as e:
+            # Пакет не будет получен - его рекомендации уже устарели, следующая сводка соберет новые
+            logger.error(f"Ошибка офлайн пакета {self.offline_queue.batch_id}: {e}")
+            self.offline_queue = None
+            return None
+        finally:
+            await close_http_client()
+        
+        if report is not None:
+            self.offline_queue = None
+        return report
+    
+    def run_scheduled_batch(self, slot: str):
+        """Отправляет офлайн пакет по расписанию сводок (не дожидаясь его обработки)"""
+        if self.offline_queue is not None:
+            logger.warning(f"Офлайн пакет {self.offline_queue.batch_id} еще обрабатывается, сводка {slot} пропущена")
+            return
+        logger.info(f"Запуск офлайн пакета: {slot}")
+        asyncio.run(self.submit_offline_batch(slot))
+    
+    def collect_offline_batch(self):
+        """Забирает результаты отправленного офлайн пакета, если он обработан"""
+        if self.offline_queue is not None:
+            asyncio.run(self.poll_offline_batch())
+    
+    def _schedule_offline_batches(self):
+        """Расписание сводок из analysis_schedule (frequency_settings.json)"""
+        try:
+            with open(OFFLINE_BATCH_CONFIG["schedule_file"], encoding='utf-8') as f:
+                analysis_schedule = json.load(f).get("analysis_schedule", {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось загрузить расписание сводок: {e}")
+            return
+        
+        for slot in OFFLINE_BATCH_CONFIG.get("summary_slots", []):
+            if slot in analysis_schedule:
+                schedule.every().day.at(analysis_schedule[slot]).do(self.run_scheduled_batch, slot)
+                logger.info(f"Офлайн пакет {slot} запланирован на {analysis_schedule[slot]}")
+        schedule.every(OFFLINE_BATCH_CONFIG.get("poll_interval", 60)).seconds.do(self.collect_offline_batch)
+    
     def run_scheduled_analysis(self):
         """Запускает анализ по расписанию"""
         logger.info("Запуск запланированного анализа")
-        asyncio.run(self.run_analysis_cycle())
+        asyncio.run(self._run_cycle_and_close())
     
     def start_scheduler(self):
         """Запускает планировщик с циклом 50 минут"""
@@ -101,6 +228,8 @@ class SportsAnalyzer:
         
         # Планирование выполнения каждые 50 минут
         schedule.every(50).minutes.do(self.run_scheduled_analysis)
+        if OFFLINE_BATCH_CONFIG.get("enabled", False):
+            self._schedule_offline_batches()
         
         # Первый запуск сразу
         self.run_scheduled_analysis()
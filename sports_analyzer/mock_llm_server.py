@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка LLM API для нагрузочного и латентного тестирования
+Реализует Anthropic Messages (в том числе потоковый режим и Message Batches)
+и OpenAI Chat Completions по HTTP: настраиваемое распределение задержек,
+инъекция ошибок и 429, учет токенов с кэшем промптов, ответы вызовом инструмента (tool use).
+
+Запуск:
+    python mock_llm_server.py --port 8089 --latency lognormal:0.8,0.4 --error-rate 0.02 --rpm 50
+Клиенты подключаются через base_url, например:
+    CLAUDE_API_KEY=local CLAUDE_BASE_URL=http://127.0.0.1:8089/v1/messages python main.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+MATCH_BLOCK = re.compile(r"=== МАТЧ (\S+) ===")
+
+
+def parse_latency(spec: str):
+    """
+    Распределение задержки ответа в секундах:
+    fixed:0.5 | uniform:0.2,1.5 | lognormal:медиана,сигма | exponential:среднее
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',') if value]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+# Минимальный кэшируемый префикс (как у Anthropic: 2048 для Haiku, 1024 для остальных;
+# автоматический кэш OpenAI - тоже от 1024): более короткий префикс считается обычным входом
+MIN_CACHEABLE_TOKENS = {"haiku": 2048}
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+
+
+def min_cacheable_tokens(model: str) -> int:
+    for family, tokens in MIN_CACHEABLE_TOKENS.items():
+        if family in (model or ""):
+            return tokens
+    return DEFAULT_MIN_CACHEABLE_TOKENS
+
+
+def count_tokens(text: str) -> int:
+    """Оценка числа токенов (та же, что у клиентов: ~3 символа на токен)"""
+    return len(text) // 3 + 1 if text else 0
+
+
+class MockLLMServer:
+    """HTTP/1.1 сервер с keep-alive, имитирующий Messages API и Chat Completions"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: str = "lognormal:0.6,0.4",
+                 token_latency: float = 0.0, error_rate: float = 0.0, rate_limit_rpm: int = 0,
+                 batch_delay: float = 1.0, seed: int = 42):
+        self.host = host
+        self.port = port
+        self.latency = parse_latency(latency)
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.rate_limit_rpm = rate_limit_rpm
+        self.batch_delay = batch_delay
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._request_times: deque = deque()
+        self._cached_prefixes: set = set()
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, Any] = {
+            'requests': 0, 'succeeded': 0, 'errors': 0, 'rate_limited': 0,
+            'streams': 0, 'streams_cancelled': 0, 'batches': 0, 'connections': 0,
+            'input_tokens': 0, 'output_tokens': 0,
+            'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0,
+            'latency_total': 0.0
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        """Запускает сервер, возвращает базовый адрес"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                await self._dispatch(method, target.split('?')[0], body, writer)
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                    headers: Optional[Dict[str, str]] = None, content_type: str = "application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        lines = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                 f"Content-Type: {content_type}", f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        if method == "GET" and path == "/stats":
+            return await self._send(writer, 200, self.stats)
+
+        if path.startswith("/v1/messages/batches"):
+            return await self._handle_batches(method, path, body, writer)
+
+        if method == "POST" and path in ("/v1/messages", "/v1/chat/completions"):
+            self.stats['requests'] += 1
+            request = json.loads(body or b'{}')
+
+            rejection = self._inject_failure()
+            if rejection:
+                status, payload, headers = rejection
+                return await self._send(writer, status, payload, headers)
+
+            started = time.perf_counter()
+            await asyncio.sleep(self.latency(self.rng))
+            openai = path == "/v1/chat/completions"
+            if request.get("stream"):
+                await self._stream(writer, request, openai)
+            else:
+                text, usage = self._complete(request, openai)
+                payload = self._openai_payload(request, text, usage) if openai else self._anthropic_payload(request, text, usage)
+                await asyncio.sleep(self.token_latency * usage['output_tokens'])
+                await self._send(writer, 200, payload, self._ratelimit_headers())
+            self.stats['succeeded'] += 1
+            self.stats['latency_total'] += time.perf_counter() - started
+            return
+
+        await self._send(writer, 404, {"type": "error", "error": {"type": "not_found_error", "message": path}})
+
+    # --- Инъекция ошибок и лимиты ---
+
+    def _inject_failure(self) -> Optional[Tuple[int, Dict[str, Any], Dict[str, str]]]:
+        """429 при превышении rate_limit_rpm, случайные 529/500 с вероятностью error_rate"""
+        now = time.monotonic()
+        while self._request_times and now - self._request_times[0] > 60:
+            self._request_times.popleft()
+
+        if self.rate_limit_rpm and len(self._request_times) >= self.rate_limit_rpm:
+            self.stats['rate_limited'] += 1
+            retry_after = max(1, math.ceil(60 - (now - self._request_times[0])))
+            return 429, {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}}, {
+                "retry-after": str(retry_after),
+                **self._ratelimit_headers()
+            }
+        self._request_times.append(now)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats['errors'] += 1
+            if self.rng.random() < 0.5:
+                return 529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}, {}
+            return 500, {"type": "error", "error": {"type": "api_error", "message": "Internal error"}}, {}
+        return None
+
+    def _ratelimit_headers(self) -> Dict[str, str]:
+        if not self.rate_limit_rpm:
+            return {}
+        remaining = max(0, self.rate_limit_rpm - len(self._request_times))
+        reset = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 60))
+        return {
+            "anthropic-ratelimit-requests-limit": str(self.rate_limit_rpm),
+            "anthropic-ratelimit-requests-remaining": str(remaining),
+            "anthropic-ratelimit-requests-reset": reset
+        }
+
+    # --- Ответы ---
+
+    def _complete(self, request: Dict[str, Any], openai: bool = False) -> Tuple[str, Dict[str, int]]:
+        """Детерминированный ответ по содержимому запроса и учет токенов"""
+        system, prompt, cached_system = self._split_request(request, openai)
+        tool = self._requested_tool(request, openai)
+        text = self._make_reply(system, prompt, tool[1] if tool else None)
+        # Описания инструментов входят в промпт (и в префикс кэша вместе с системным)
+        if request.get("tools"):
+            system = json.dumps(request["tools"], ensure_ascii=False) + system
+        max_tokens = request.get("max_tokens") or 1000
+        text = text[:max_tokens * 3]
+
+        usage = {'input_tokens': count_tokens(prompt), 'output_tokens': count_tokens(text),
+                 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        system_tokens = count_tokens(system)
+        prefix = hashlib.sha256(system.encode('utf-8')).hexdigest()
+        if system_tokens < min_cacheable_tokens(request.get("model", "")):
+            cached_system = False
+        if cached_system and prefix in self._cached_prefixes:
+            usage['cache_read_input_tokens'] = system_tokens
+        elif cached_system:
+            self._cached_prefixes.add(prefix)
+            usage['cache_creation_input_tokens'] = system_tokens
+        else:
+            usage['input_tokens'] += system_tokens
+
+        for key, value in usage.items():
+            self.stats[key] += value
+        return text, usage
+
+    @staticmethod
+    def _split_request(request: Dict[str, Any], openai: bool) -> Tuple[str, str, bool]:
+        """Системный промпт, текст сообщений и наличие cache_control (OpenAI кэширует префикс сам)"""
+        def content_text(content):
+            if isinstance(content, str):
+                return content
+            return "".join(block.get("text", "") for block in content or [])
+
+        messages = request.get("messages", [])
+        if openai:
+            system = "".join(m["content"] for m in messages if m.get("role") == "system")
+            prompt = "".join(content_text(m.get("content")) for m in messages if m.get("role") != "system")
+            return system, prompt, bool(system)
+
+        system = request.get("system") or ""
+        cached = isinstance(system, list) and any(block.get("cache_control") for block in system)
+        return content_text(system), "".join(content_text(m.get("content")) for m in messages), cached
+
+    @staticmethod
+    def _requested_tool(request: Dict[str, Any], openai: bool = False) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Имя и схема инструмента, вызов которого требует tool_choice (None - ответ текстом)"""
+        choice = request.get("tool_choice")
+        if not isinstance(choice, dict) or not request.get("tools"):
+            return None
+        if openai:
+            name = (choice.get("function") or {}).get("name")
+            schemas = {tool["function"]["name"]: tool["function"].get("parameters") or {} for tool in request["tools"]}
+        else:
+            name = choice.get("name")
+            schemas = {tool["name"]: tool.get("input_schema") or {} for tool in request["tools"]}
+        return (name, schemas[name]) if name in schemas else None
+
+    def _make_reply(self, system: str, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """JSON вердикт (или массив вердиктов для пакетного промпта), текст для сводок"""
+        if schema is not None:
+            return json.dumps(self._tool_input(prompt, schema), ensure_ascii=False)
+
+        match_ids = MATCH_BLOCK.findall(prompt)
+        if match_ids:
+            blocks = MATCH_BLOCK.split(prompt)[1:]
+            items = []
+            for match_id, data in zip(blocks[::2], blocks[1::2]):
+                items.append(dict(match_id=match_id, **self._verdict(data)))
+            return json.dumps(items, ensure_ascii=False)
+
+        if "corrected_confidence" in prompt:
+            verdict = self._verdict(prompt)
+            return json.dumps({
+                "is_valid": verdict["confidence"] >= 80,
+                "corrected_confidence": verdict["confidence"],
+                "validation_notes": "Проверено локальной заглушкой",
+                "final_recommendation": verdict["recommendation"]
+            }, ensure_ascii=False)
+
+        if '"confidence"' in system + prompt:
+            return json.dumps(self._verdict(prompt), ensure_ascii=False)
+
+        return "Сводка локальной заглушки: матчей с явными фаворитами немного, рекомендуется осторожность."
+
+    def _tool_input(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Аргументы вызова инструмента: вердикт по данным, недостающие поля - по типам схемы"""
+        properties = schema.get("properties") or {}
+        verdict = self._verdict(prompt)
+        if "corrected_confidence" in properties:
+            verdict.update(is_valid=verdict["confidence"] >= 80, corrected_confidence=verdict["confidence"],
+                           validation_notes="Проверено локальной заглушкой",
+                           final_recommendation=verdict["recommendation"])
+        return {name: verdict[name] if name in verdict else self._sample(child, verdict)
+                for name, child in properties.items()}
+
+    def _sample(self, schema: Dict[str, Any], verdict: Dict[str, Any]) -> Any:
+        """Значение по схеме поля, которого нет в вердикте"""
+        if "enum" in schema:
+            return schema["enum"][0]
+        kind = schema.get("type")
+        if kind == "object":
+            return {name: self._sample(child, verdict) for name, child in (schema.get("properties") or {}).items()}
+        if kind == "array":
+            return [self._sample(schema.get("items") or {"type": "string"}, verdict)]
+        if kind in ("number", "integer"):
+            return verdict["confidence"]
+        if kind == "boolean":
+            return verdict["confidence"] >= 70
+        return "Значение локальной заглушки"
+
+    def _verdict(self, data: str) -> Dict[str, Any]:
+        """Вердикт по данным матча: детерминирован для одинаковых данных и seed"""
+        rng = random.Random(f"{self.seed}:{hashlib.sha256(data.encode('utf-8')).hexdigest()}")
+        confidence = rng.randint(55, 95)
+        return {
+            "confidence": confidence,
+            "is_favorite_leading": confidence >= 70,
+            "reasoning": "Оценка локальной заглушки по данным матча",
+            "recommendation": "bet" if confidence >= 80 else "skip",
+            "analysis_details": "Подробный анализ заглушки. " * rng.randint(5, 20)
+        }
+
+    def _anthropic_payload(self, request: Dict[str, Any], text: str, usage: Dict[str, int]) -> Dict[str, Any]:
+        tool = self._requested_tool(request)
+        if tool:
+            content = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": tool[0],
+                        "input": json.loads(text)}]
+        else:
+            content = [{"type": "text", "text": text}]
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model"),
+            "content": content,
+            "stop_reason": "tool_use" if tool else "end_turn",
+            "usage": usage
+        }
+
+    @classmethod
+    def _openai_payload(cls, request: Dict[str, Any], text: str, usage: Dict[str, int]) -> Dict[str, Any]:
+        cached = usage['cache_read_input_tokens']
+        tool = cls._requested_tool(request, openai=True)
+        if tool:
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                "function": {"name": tool[0], "arguments": text}
+            }]}
+        else:
+            message = {"role": "assistant", "content": text}
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool else "stop"}],
+            "usage": {
+                "prompt_tokens": usage['input_tokens'] + cached + usage['cache_creation_input_tokens'],
+                "completion_tokens": usage['output_tokens'],
+                "prompt_tokens_details": {"cached_tokens": cached}
+            }
+        }
+
+    async def _stream(self, writer: asyncio.StreamWriter, request: Dict[str, Any], openai: bool):
+        """Потоковый ответ (SSE, chunked). Закрытие соединения клиентом прерывает генерацию."""
+        self.stats['streams'] += 1
+        text, usage = self._complete(request, openai)
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                      "Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n").encode('latin-1'))
+
+        async def event(data: Dict[str, Any], name: Optional[str] = None):
+            chunk = (f"event: {name}\n" if name else "") + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            raw = chunk.encode('utf-8')
+            writer.write(f"{len(raw):x}\r\n".encode('latin-1') + raw + b"\r\n")
+            await writer.drain()
+
+        pieces = [text[i:i + 12] for i in range(0, len(text), 12)]
+        tool = self._requested_tool(request, openai)
+        sent_tokens = 0
+        try:
+            if not openai:
+                start_usage = dict(usage, output_tokens=1)
+                await event({"type": "message_start", "message": {"usage": start_usage}}, "message_start")
+                block = {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": tool[0], "input": {}} \
+                    if tool else {"type": "text", "text": ""}
+                await event({"type": "content_block_start", "index": 0, "content_block": block}, "content_block_start")
+            for piece in pieces:
+                await asyncio.sleep(self.token_latency * count_tokens(piece))
+                sent_tokens += count_tokens(piece)
+                if openai and tool:
+                    await event({"choices": [{"index": 0, "delta": {
+                        "tool_calls": [{"index": 0, "function": {"arguments": piece}}]}}]})
+                elif openai:
+                    await event({"choices": [{"index": 0, "delta": {"content": piece}}]})
+                elif tool:
+                    await event({"type": "content_block_delta", "index": 0,
+                                 "delta": {"type": "input_json_delta", "partial_json": piece}}, "content_block_delta")
+                else:
+                    await event({"type": "content_block_delta", "index": 0,
+                                 "delta": {"type": "text_delta", "text": piece}}, "content_block_delta")
+            if openai:
+                final = self._openai_payload(request, text, usage)["usage"]
+                await event({"choices": [], "usage": final})
+            else:
+                await event({"type": "message_delta", "usage": {"output_tokens": usage['output_tokens']}}, "message_delta")
+                await event({"type": "message_stop"}, "message_stop")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            # Клиент прервал поток: неотправленные токены не учитываются
+            self.stats['streams_cancelled'] += 1
+            self.stats['output_tokens'] -= max(0, usage['output_tokens'] - sent_tokens)
+            raise
+
+    # --- Message Batches ---
+
+    async def _handle_batches(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        parts = path.rstrip('/').split('/')[4:]  # после /v1/messages/batches
+
+        if method == "POST" and not parts:
+            requests = json.loads(body or b'{}').get("requests", [])
+            batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+            self._batches[batch_id] = {"requests": requests, "created": time.monotonic(), "results": None}
+            self.stats['batches'] += 1
+            return await self._send(writer, 200, self._batch_status(batch_id))
+
+        if method == "GET" and parts and parts[0] in self._batches:
+            batch_id = parts[0]
+            if len(parts) == 1:
+                return await self._send(writer, 200, self._batch_status(batch_id))
+            if parts[1] == "results" and self._batch_ended(batch_id):
+                lines = "\n".join(json.dumps(line, ensure_ascii=False) for line in self._batch_results(batch_id))
+                return await self._send(writer, 200, lines.encode('utf-8'), content_type="application/x-jsonl")
+
+        await self._send(writer, 404, {"type": "error", "error": {"type": "not_found_error", "message": path}})
+
+    def _batch_ended(self, batch_id: str) -> bool:
+        return time.monotonic() - self._batches[batch_id]["created"] >= self.batch_delay
+
+    def _batch_status(self, batch_id: str) -> Dict[str, Any]:
+        batch = self._batches[batch_id]
+        ended = self._batch_ended(batch_id)
+        count = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else count, "succeeded": count if ended else 0,
+                               "errored": 0, "canceled": 0, "expired": 0},
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None
+        }
+
+    def _batch_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        batch = self._batches[batch_id]
+        if batch["results"] is None:
+            batch["results"] = []
+            for item in batch["requests"]:
+                text, usage = self._complete(item.get("params", {}))
+                batch["results"].append({
+                    "custom_id": item.get("custom_id"),
+                    "result": {"type": "succeeded", "message": self._anthropic_payload(item.get("params", {}), text, usage)}
+                })
+        return batch["results"]
+
+
+async def serve(args):
+    server = MockLLMServer(args.host, args.port, args.latency, args.token_latency,
+                           args.error_rate, args.rpm, args.batch_delay, args.seed)
+    base_url = await server.start()
+    print(f"🧪 Заглушка LLM API: {base_url}/v1/messages (статистика: {base_url}/stats)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        print(json.dumps(server.stats, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Anthropic/OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="lognormal:0.6,0.4",
+                        help="fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA | exponential:MEAN")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="секунд на выходной токен")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 529/500")
+    parser.add_argument("--rpm", type=int, default=0, help="лимит запросов в минуту (429 сверх лимита)")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="время обработки Message Batches, сек")
+    parser.add_argument("--seed", type=int, default=42)
+
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
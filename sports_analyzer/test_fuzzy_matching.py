@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Проверка сопоставления матчей BetBoom и Scores24: алиасы, индекс кандидатов, назначение пар
+Запуск: python test_fuzzy_matching.py (или pytest test_fuzzy_matching.py)
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.fuzzy_matcher import FuzzyMatcher, CandidateIndex, linear_sum_assignment
+from utils.match_pair_cache import MatchPairCache
+
+
+SCORES24_MATCHES = [
+    {"team1": "Зенит", "team2": "Спартак"},
+    {"team1": "Manchester City", "team2": "Liverpool"},
+    {"team1": "ЦСКА", "team2": "Локомотив"}
+]
+
+
+def test_aliases():
+    """Алиас совпадает только целиком и только со своим каноническим именем"""
+    matcher = FuzzyMatcher()
+    
+    assert matcher.get_similarity("man utd", "Манчестер Юнайтед") == 1.0
+    assert matcher.get_similarity("Manchester United", "Манчестер Сити") == 0.0
+    assert matcher.alias_canonical("Manchester City") == matcher.alias_canonical("Манчестер Сити")
+    assert matcher.alias_canonical("Manchester") is None
+
+
+def test_alias_conflicts():
+    """Алиас двух разных канонических имен отбрасывается, сами имена остаются"""
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump({"teams": {"манчестер сити": ["ман"], "манчестер юнайтед": ["ман"]}}, f, ensure_ascii=False)
+    try:
+        matcher = FuzzyMatcher(aliases_file=f.name)
+    finally:
+        os.unlink(f.name)
+    
+    assert matcher.alias_canonical("ман") is None
+    assert matcher.alias_canonical("Манчестер Сити") == "манчестер сити"
+    assert matcher.alias_canonical("man utd") == matcher.alias_canonical("Манчестер Юнайтед")
+
+
+def test_candidate_index():
+    """Индекс находит матч по алиасу и по сокращенному названию"""
+    matcher = FuzzyMatcher()
+    index = CandidateIndex(matcher, SCORES24_MATCHES, ("team1", "team2"))
+    
+    assert index.size == 3
+    assert index.candidates(["Ман Сити", "Ливерпуль"], 1) == [1]
+    assert index.candidates(["Спартак М", "Зенит СПб"], 1) == [0]
+    assert index.candidates([""], 5) == []
+    
+    # Список, измененный на месте, индексируется заново
+    matches = [dict(match) for match in SCORES24_MATCHES]
+    first = matcher.build_index(matches, ("team1", "team2"))
+    assert matcher.build_index(matches, ("team1", "team2")) is first
+    matches[1] = {"team1": "Ростов", "team2": "Сочи"}
+    rebuilt = matcher.build_index(matches, ("team1", "team2"))
+    assert rebuilt is not first
+    assert rebuilt.candidates(["Ростов", "Сочи"], 1) == [1]
+
+
+def test_solve_assignment():
+    """Венгерский алгоритм максимизирует сумму, жадный берет лучшую пару первой"""
+    matcher = FuzzyMatcher()
+    scores = np.array([[0.9, 0.8], [0.85, 0.0]])
+    
+    assert matcher._solve_assignment(scores, "greedy") == [(0, 0)]
+    if linear_sum_assignment is not None:
+        pairs = [(int(i), int(j)) for i, j in matcher._solve_assignment(scores, "hungarian")]
+        assert pairs == [(0, 1), (1, 0)]
+    
+    # Нулевые оценки не образуют пар
+    assert matcher._solve_assignment(np.zeros((2, 2)), "greedy") == []
+
+
+def test_pair_matches():
+    """Пары матчей с учетом обратного порядка команд"""
+    matcher = FuzzyMatcher()
+    betboom = [
+        {"team1": "Спартак", "team2": "Зенит"},
+        {"team1": "ЦСКА", "team2": "Локомотив М"},
+        {"team1": "Ростов", "team2": "Сочи"}
+    ]
+    
+    results = matcher.pair_matches(betboom, SCORES24_MATCHES)
+    
+    assert results[0]["match"] is SCORES24_MATCHES[0]
+    assert (results[0]["team1_mapped"], results[0]["team2_mapped"]) == ("Спартак", "Зенит")
+    assert results[1]["match"] is SCORES24_MATCHES[2]
+    assert results[2] is None
+
+
+def test_pair_matches_indexed():
+    """На большом табло оцениваются только кандидаты индекса, результат тот же"""
+    betboom = [{"team1": "Спартак", "team2": "Зенит"}, {"team1": "ЦСКА", "team2": "Локомотив М"}]
+    dense = FuzzyMatcher(use_index=False).pair_matches(betboom, SCORES24_MATCHES)
+    indexed = FuzzyMatcher(index_top_k=1).pair_matches(betboom, SCORES24_MATCHES)
+    
+    assert [r["match"] for r in indexed] == [r["match"] for r in dense]
+    assert [r["match"] for r in indexed] == [SCORES24_MATCHES[0], SCORES24_MATCHES[2]]
+
+
+def test_match_pair_cache():
+    """Кэш пар: матч без пары помнится до negative_ttl, один матч Scores24 - одна пара"""
+    cache = MatchPairCache(None, FuzzyMatcher(), negative_ttl=60)
+    betboom = [{"team1": "Зенит СПб", "team2": "Спартак"}, {"team1": "Зенит", "team2": "Спартак М"},
+               {"team1": "Ростов", "team2": "Сочи"}]
+    
+    cache.put(betboom[0], {"match": SCORES24_MATCHES[0], "confidence": 0.8})
+    cache.put(betboom[1], {"match": SCORES24_MATCHES[0], "confidence": 0.9})
+    cache.put(betboom[2], None)
+    
+    pairs, pending = cache.lookup(betboom, SCORES24_MATCHES)
+    assert pending == [0]
+    assert pairs[1]["match"] is SCORES24_MATCHES[0] and pairs[0] is None and pairs[2] is None
+    assert (cache.stats["hits"], cache.stats["negative_hits"], cache.stats["conflicts"]) == (2, 1, 1)
+    
+    # Запись без пары устаревает, матч сопоставляется заново
+    cache.entries[cache.key_for(betboom[2])]["checked_at"] -= 61
+    assert cache.lookup(betboom[2:], SCORES24_MATCHES)[1] == [0]
+    cache.expire(betboom, SCORES24_MATCHES)
+    assert cache.key_for(betboom[2]) not in cache.entries
+
+
+if __name__ == "__main__":
+    print("🔍 Проверка сопоставления матчей")
+    for test in (test_aliases, test_alias_conflicts, test_candidate_index,
+                 test_solve_assignment, test_pair_matches, test_pair_matches_indexed, test_match_pair_cache):
+        test()
+        print(f"✅ {test.__doc__}")
+    print("🎉 Все проверки пройдены")
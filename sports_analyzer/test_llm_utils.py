@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Проверка вспомогательных модулей шлюза LLM без сети: схемы ответов, потоковый JSON,
+квота (token bucket, retry-after), ключи кэша ответов, метрики Prometheus
+и изменения состояния матча между циклами
+Запуск: python test_llm_utils.py (или pytest test_llm_utils.py)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.batch_prompts import BatchAnalysisMixin
+from utils.llm_metrics import LLMMetrics
+from utils.match_state import MatchStateTracker
+from utils.prompt_cache import cacheable_system
+from utils.rate_limiter import TokenBucket, RateLimitScheduler, parse_retry_after, _parse_duration
+from utils.response_cache import ResponseCache
+from utils.stream_json import JSONFieldScanner, parse_partial_json, confidence_cutoff
+from utils.structured_output import ResponseSchema, compile_schema, object_schema, CONFIDENCE
+
+
+def test_compile_schema():
+    """Типы, enum, диапазон, обязательные поля и элементы массива"""
+    validate = compile_schema(object_schema({
+        "confidence": CONFIDENCE,
+        "decision": {"type": "string", "enum": ["bet", "skip"]},
+        "factors": {"type": "array", "items": {"type": "string"}}
+    }))
+    
+    assert validate({"confidence": 85, "decision": "bet", "factors": ["форма"]}) == []
+    
+    errors = validate({"confidence": 120, "decision": "maybe", "factors": [1]})
+    assert len(errors) == 3
+    assert any("$.confidence" in error for error in errors)
+    
+    # bool не считается числом, отсутствующее поле - ошибка
+    assert validate({"confidence": True, "decision": "skip", "factors": []})
+    assert validate({"decision": "skip", "factors": []}) == ["$.confidence: обязательное поле отсутствует"]
+
+
+def test_json_field_scanner():
+    """Поля верхнего уровня доступны по мере получения, вложенные значения пропускаются"""
+    scanner = JSONFieldScanner()
+    
+    assert scanner.feed('Ответ: {"confidence": 6') == {}
+    assert scanner.feed('2, "details": {"a": 1}, "recommendation": "П') == {"confidence": 62}
+    assert scanner.feed('1 \\"фора\\"", "ok": true}') == {
+        "confidence": 62, "recommendation": 'П1 "фора"', "ok": True
+    }
+    
+    assert parse_partial_json('{"confidence": 70, "reasoning": "обрыв') == {"confidence": 70}
+    
+    should_stop = confidence_cutoff(75)
+    assert should_stop({"confidence": 60, "recommendation": "skip"})
+    assert not should_stop({"confidence": 60})
+    assert not should_stop({"confidence": 80, "recommendation": "bet"})
+
+
+def test_token_bucket():
+    """Ожидание пополнения, возврат неизрасходованного и остаток от провайдера"""
+    bucket = TokenBucket(capacity=60, refill_per_second=1)
+    
+    assert bucket.time_until(60) == 0.0
+    bucket.consume(60)
+    assert 9.9 < bucket.time_until(10) <= 10.0
+    
+    bucket.adjust(30)
+    assert bucket.time_until(30) == 0.0
+    
+    bucket.limit_to(5)
+    assert bucket.available <= 5.01
+    
+    # Запрос больше емкости ограничивается емкостью, а не ждет бесконечно
+    assert bucket.time_until(1000) < 60
+
+
+def test_retry_after():
+    """retry-after в секундах и HTTP дате, длительности сброса OpenAI"""
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("скоро") is None
+    
+    http_date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+    assert 28 <= parse_retry_after(http_date) <= 30
+    
+    assert _parse_duration("6m0s") == 360
+    assert _parse_duration("20ms") == 0.02
+    assert _parse_duration("") is None
+
+
+def test_scheduler_headers():
+    """429 без retry-after - пауза по умолчанию, остаток квоты из заголовков"""
+    scheduler = RateLimitScheduler(requests_per_minute=60, tokens_per_minute=1000, default_retry_after=3)
+    
+    scheduler.apply_headers({"anthropic-ratelimit-tokens-remaining": "100"})
+    assert scheduler.tokens.available <= 101
+    
+    before = time.monotonic()
+    scheduler.apply_headers({}, rate_limited=True)
+    assert scheduler.get_stats()["rate_limited"] == 1
+    assert scheduler._blocked_until >= before + 3
+
+
+def test_cache_key():
+    """Ключ кэша различает модель, max_tokens и схему ответа"""
+    base = ResponseCache.make_key("sonnet", "system", "prompt", max_tokens=1000, schema=None)
+    
+    assert base == ResponseCache.make_key("sonnet", "system", "prompt", schema=None, max_tokens=1000)
+    assert base != ResponseCache.make_key("haiku", "system", "prompt", max_tokens=1000, schema=None)
+    assert base != ResponseCache.make_key("sonnet", "system", "prompt", max_tokens=200, schema=None)
+    assert base != ResponseCache.make_key("sonnet", "system", "prompt", max_tokens=1000, schema=["analysis", {}])
+
+
+def test_prompt_cache_minimum():
+    """cache_control только у префикса не короче минимума модели"""
+    assert cacheable_system("") == []
+    assert "cache_control" not in cacheable_system("короткий промпт", "claude-3-5-sonnet")[0]
+    assert "cache_control" in cacheable_system("x" * 3100, "claude-3-5-sonnet")[0]
+    assert "cache_control" not in cacheable_system("x" * 3100, "claude-3-5-haiku")[0]
+    assert "cache_control" in cacheable_system("x" * 3100, "claude-3-5-haiku", prefix_tokens=1100)[0]
+
+
+def test_prometheus():
+    """Экспозиция Prometheus: счетчики без потери точности, гистограмма латентности"""
+    metrics = LLMMetrics()
+    metrics.observe_request("football", "anthropic", "sonnet", 0.4,
+                            {"input_tokens": 1234567, "output_tokens": 10})
+    metrics.record_cache("football", hit=False)
+    
+    text = metrics.to_prometheus()
+    lines = text.splitlines()
+    
+    assert any(line.startswith("llm_tokens_total{") and 'type="input_tokens"' in line and line.endswith(" 1234567")
+               for line in lines)
+    assert 'llm_response_cache_total{result="miss",sport="football"} 1' in lines
+    assert any(line.startswith("llm_request_duration_seconds_bucket{") and 'le="+Inf"' in line for line in lines)
+    assert "# TYPE llm_request_duration_seconds histogram" in lines
+    assert text.endswith("\n")
+
+
+def test_state_delta():
+    """Повторный анализ при смене счета, движении или исчезновении коэффициента"""
+    tracker = MatchStateTracker({"material_fields": ["score"], "odds_threshold": 0.05})
+    match = {"score": "1:0", "minute": 55, "odds": {"1": 1.5, "X": 4.0, "2": 6.5}}
+    
+    assert tracker.get_delta("m", match) == "новый матч"
+    tracker.remember("m", match, {"confidence": 85})
+    
+    assert tracker.get_delta("m", dict(match, odds={"1": 1.52, "X": 4.0, "2": 6.5})) is None
+    assert tracker.get_delta("m", dict(match, score="2:0")) == "изменилось поле score"
+    assert tracker.get_delta("m", dict(match, odds={"1": 1.4, "X": 4.0, "2": 6.5})) == "движение коэффициента 1"
+    assert tracker.get_delta("m", dict(match, odds={"1": 1.5, "2": 6.5})) == "изменился набор исходов"
+    assert tracker.stats["reanalyzed"] == 4
+
+
+class FakeBatchAnalyzer(BatchAnalysisMixin):
+    """Пакетный анализатор без сети: пакетный ответ задается заранее"""
+    
+    PROMPT_PARTS = {"football": {"intro": "Анализ", "task": "Оцени матч", "format": '{"confidence": 0}'}}
+    model = "test"
+    response_cache = None
+    
+    def __init__(self, batch_content: str):
+        self.batch_content = batch_content
+        self.single_calls = []
+    
+    def get_analysis_kind(self, sport, betboom_data):
+        return sport
+    
+    def _format_match_data(self, kind, betboom_data, scores24_data):
+        return betboom_data["team1"]
+    
+    async def _analyze_single(self, kind, betboom_data, scores24_data):
+        self.single_calls.append(betboom_data["team1"])
+        return {"confidence": 50, "single": True}
+    
+    async def _request_batch(self, kind, instructions, prompt, max_tokens):
+        return self.batch_content
+    
+    def _batch_item_schema(self, kind):
+        return ResponseSchema("analysis", "Анализ", object_schema({"confidence": CONFIDENCE}))
+    
+    def _is_mock_mode(self):
+        return False
+
+
+def test_batch_schema_validation():
+    """Элементы пакета вне схемы анализируются отдельным запросом"""
+    analyzer = FakeBatchAnalyzer(json.dumps([
+        {"match_id": "m0", "confidence": 80},
+        {"match_id": "m1", "confidence": "высокая"}
+    ]))
+    pairs = [({"team1": "Спартак"}, {}), ({"team1": "Зенит"}, {})]
+    
+    results = asyncio.run(analyzer.analyze_batch("football", pairs))
+    
+    assert results[0] == {"confidence": 80}
+    assert results[1] == {"confidence": 50, "single": True}
+    assert analyzer.single_calls == ["Зенит"]
+
+
+if __name__ == "__main__":
+    print("🧪 Проверка модулей шлюза LLM")
+    for test in (test_compile_schema, test_json_field_scanner, test_token_bucket, test_retry_after,
+                 test_scheduler_headers, test_cache_key, test_prompt_cache_minimum, test_prometheus,
+                 test_state_delta, test_batch_schema_validation):
+        test()
+        print(f"✅ {test.__doc__}")
+    print("🎉 Все проверки пройдены")
@@ -7,57 +7,108 @@ import asyncio
 import json
 import logging
 from typing import Dict, Any, List, Optional
-import requests
 from datetime import datetime
 
-from config.claude_config import CLAUDE_CONFIG, SYSTEM_PROMPTS, CONFIDENCE_THRESHOLDS
+from config.claude_config import (
+    CLAUDE_CONFIG, SYSTEM_PROMPTS, CONFIDENCE_THRESHOLDS, early_stop_threshold, get_gateway_settings
+)
+from utils.llm_gateway import get_llm_gateway
+from utils.response_cache import get_response_cache
+from utils.batch_prompts import BatchAnalysisMixin
+from utils.prompt_cache import get_prompt_cache_stats
+from utils.stream_json import confidence_cutoff
+from utils.message_batches import OfflineBatchQueue
+from utils.structured_output import ResponseSchema, object_schema, CONFIDENCE, REASONING, BET_DECISION
 
 logger = logging.getLogger(__name__)
 
-
-class AdvancedClaudeAnalyzer:
+TEXT = {"type": "string"}
+STRINGS = {"type": "array", "items": TEXT}
+
+# Схемы структурированных ответов (tool use); confidence и recommendation идут первыми,
+# по ним работает досрочная остановка потокового ответа
+RESPONSE_SCHEMAS = {
+    "football": ResponseSchema("football_analysis", "Результат анализа live футбольного матча", object_schema({
+        "confidence": CONFIDENCE,
+        "recommendation": BET_DECISION,
+        "is_favorite_leading": {"type": "boolean"},
+        "favorite_team": TEXT,
+        "reasoning": REASONING,
+        "detailed_analysis": object_schema({
+            "form_analysis": TEXT,
+            "position_analysis": TEXT,
+            "time_factor": TEXT,
+            "key_factors": STRINGS
+        })
+    })),
+    "tennis": ResponseSchema("tennis_analysis", "Результат анализа live теннисного матча", object_schema({
+        "confidence": CONFIDENCE,
+        "recommendation": BET_DECISION,
+        "is_favorite_leading": {"type": "boolean"},
+        "favorite_player": TEXT,
+        "reasoning": REASONING,
+        "detailed_analysis": object_schema({
+            "ranking_advantage": TEXT,
+            "form_analysis": TEXT,
+            "psychological_factor": TEXT,
+            "match_dynamics": TEXT
+        })
+    })),
+    "handball_total": ResponseSchema("handball_total_analysis", "Рекомендация по тоталу в live матче гандбола", object_schema({
+        "confidence": CONFIDENCE,
+        "recommendation": {"type": "string", "description": "ТБ_число или ТМ_число"},
+        "pace": {"type": "string", "enum": ["БЫСТРЫЙ", "МЕДЛЕННЫЙ", "НЕЙТРАЛЬНЫЙ"]},
+        "reasoning": REASONING,
+        "bet_type": {"type": "string", "enum": ["total"]},
+        "predicted_total": {"type": "number"},
+        "analysis_details": TEXT
+    })),
+    "handball_victory": ResponseSchema("handball_victory_analysis", "Результат анализа победы в live матче гандбола", object_schema({
+        "confidence": CONFIDENCE,
+        "recommendation": BET_DECISION,
+        "is_favorite_leading": {"type": "boolean"},
+        "favorite_team": TEXT,
+        "reasoning": REASONING,
+        "comeback_probability": {"type": "number", "minimum": 0, "maximum": 100},
+        "analysis_details": TEXT
+    }))
+}
+
+CONTEXT_SCHEMA = ResponseSchema("matches_context", "Общая картина live матчей вида спорта", object_schema({
+    "leagues": STRINGS,
+    "favorites": STRINGS,
+    "predictable_matches": STRINGS,
+    "summary": {"type": "string", "description": "Краткий анализ ситуации, до 200 слов"}
+}))
+
+VALIDATION_SCHEMA = ResponseSchema("recommendation_validation", "Результат проверки рекомендации по ставке", object_schema({
+    "is_valid": {"type": "boolean"},
+    "corrected_confidence": CONFIDENCE,
+    "validation_notes": TEXT,
+    "final_recommendation": BET_DECISION
+}))
+
+
+class AdvancedClaudeAnalyzer(BatchAnalysisMixin):
     """Продвинутый анализатор с использованием Claude AI"""
     
     def __init__(self, api_key: str = None):
         self.api_key = api_key or CLAUDE_CONFIG.get("api_key", "YOUR_CLAUDE_API_KEY")
-        self.base_url = "https://api.anthropic.com/v1/messages"
         self.model = CLAUDE_CONFIG.get("model", "claude-3-5-sonnet-20241022")
         
-        self.headers = {
-            "Content-Type": "application/json",
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01"
-        }
+        # Запросы, повторы, кэш ответов и резервный провайдер - через общий шлюз LLM
+        self.gateway = None if self._is_mock_mode() else get_llm_gateway(
+            get_gateway_settings(api_key=self.api_key, model=self.model)
+        )
+        self.response_cache = get_response_cache(CLAUDE_CONFIG)
+        self.prompt_cache_stats = get_prompt_cache_stats()
     
-    async def analyze_football_match(self, betboom_data: Dict[str, Any], 
-                                   scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Глубокий анализ футбольного матча"""
-        
-        system_prompt = SYSTEM_PROMPTS["football"]
-        
-        user_prompt = f"""
-АНАЛИЗ LIVE ФУТБОЛЬНОГО МАТЧА
-
-🏟️ ОСНОВНЫЕ ДАННЫЕ:
-Матч: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
-Счет: {betboom_data.get('score')} ({betboom_data.get('minute')}')
-Лига: {betboom_data.get('league')}
-Коэффициенты: 1={betboom_data.get('odds', {}).get('1')} X={betboom_data.get('odds', {}).get('X')} 2={betboom_data.get('odds', {}).get('2')}
-
-📊 СТАТИСТИКА КОМАНД:
-{betboom_data.get('team1')}:
-- Позиция в таблице: {scores24_data.get('league_position1')}
-- Форма (последние 5): {scores24_data.get('form1')}
-- Голы за 5 матчей: {scores24_data.get('recent_goals1')}
-
-{betboom_data.get('team2')}:
-- Позиция в таблице: {scores24_data.get('league_position2')}  
-- Форма (последние 5): {scores24_data.get('form2')}
-- Голы за 5 матчей: {scores24_data.get('recent_goals2')}
-
-Уровень лиги: {scores24_data.get('league_level')}
-
-🎯 ЗАДАЧИ АНАЛИЗА:
+    # Части промптов: заголовок, задачи и формат ответа общие для всех матчей
+    # вида спорта, данные матча подставляются отдельно (см. _format_match_data)
+    PROMPT_PARTS = {
+        "football": {
+            "intro": "АНАЛИЗ LIVE ФУТБОЛЬНОГО МАТЧА",
+            "task": """🎯 ЗАДАЧИ АНАЛИЗА:
 1. Определи истинного фаворита матча на основе всех данных
 2. Оцени, ведет ли сейчас фаворит в счете
 3. Спрогнозируй вероятность победы ведущей команды
@@ -68,56 +119,24 @@ class AdvancedClaudeAnalyzer:
 - Рекомендуй ставку только при уверенности >80%
 - Учитывай что поздние голы (60+ минута) критичнее
 - Анализируй не только текущий счет, но и общую картину
-- Будь консервативен - лучше пропустить сомнительный матч
-
-Ответь в JSON формате:
-{{
+- Будь консервативен - лучше пропустить сомнительный матч""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "favorite_team": "название_команды_фаворита",
     "reasoning": "обоснование_до_80_символов",
     "recommendation": "bet"/"skip",
-    "detailed_analysis": {{
+    "detailed_analysis": {
         "form_analysis": "анализ_формы_команд",
         "position_analysis": "анализ_позиций_в_таблице", 
         "time_factor": "влияние_времени_матча",
         "key_factors": ["ключевой_фактор_1", "ключевой_фактор_2"]
-    }}
-}}
-"""
-        
-        return await self._make_claude_request(system_prompt, user_prompt)
-    
-    async def analyze_tennis_match(self, betboom_data: Dict[str, Any], 
-                                 scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Глубокий анализ теннисного матча"""
-        
-        system_prompt = SYSTEM_PROMPTS["tennis"]
-        
-        user_prompt = f"""
-АНАЛИЗ LIVE ТЕННИСНОГО МАТЧА
-
-🎾 ОСНОВНЫЕ ДАННЫЕ:
-Матч: {betboom_data.get('player1')} vs {betboom_data.get('player2')}
-Счет по сетам: {betboom_data.get('sets_score')}
-Счет в геймах: {betboom_data.get('games_score')}
-Турнир: {betboom_data.get('tournament')}
-Коэффициенты: 1={betboom_data.get('odds', {}).get('1')} 2={betboom_data.get('odds', {}).get('2')}
-
-📊 СТАТИСТИКА ИГРОКОВ:
-{betboom_data.get('player1')}:
-- Рейтинг: {scores24_data.get('ranking1')}
-- Форма: {scores24_data.get('form1')}
-- Предпочтение покрытия: {scores24_data.get('surface_preference1')}
-
-{betboom_data.get('player2')}:
-- Рейтинг: {scores24_data.get('ranking2')}
-- Форма: {scores24_data.get('form2')}
-- Предпочтение покрытия: {scores24_data.get('surface_preference2')}
-
-Очные встречи: {scores24_data.get('head_to_head')} (побед первого-второго)
-
-🎯 ЗАДАЧИ АНАЛИЗА:
+    }
+}"""
+        },
+        "tennis": {
+            "intro": "АНАЛИЗ LIVE ТЕННИСНОГО МАТЧА",
+            "task": """🎯 ЗАДАЧИ АНАЛИЗА:
 1. Определи кто является фаворитом по рейтингу и форме
 2. Оцени психологическое преимущество (выигрыш сета/большой разрыв)
 3. Учти влияние очных встреч и покрытия
@@ -127,55 +146,24 @@ class AdvancedClaudeAnalyzer:
 - Выигрыш первого сета дает 60-70% шанс на победу
 - Разрыв в 4+ гейма в сете критичен
 - Рейтинг топ-10 vs топ-50 = существенная разница
-- Форма важнее рейтинга для текущего матча
-
-Ответь в JSON формате:
-{{
+- Форма важнее рейтинга для текущего матча""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "favorite_player": "имя_игрока_фаворита",
     "reasoning": "обоснование_до_80_символов",
     "recommendation": "bet"/"skip",
-    "detailed_analysis": {{
+    "detailed_analysis": {
         "ranking_advantage": "анализ_рейтингового_преимущества",
         "form_analysis": "анализ_текущей_формы",
         "psychological_factor": "психологические_факторы",
         "match_dynamics": "динамика_матча"
-    }}
-}}
-"""
-        
-        return await self._make_claude_request(system_prompt, user_prompt)
-    
-    async def analyze_handball_with_context(self, betboom_data: Dict[str, Any], 
-                                          scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Контекстный анализ гандбольного матча"""
-        
-        analysis_type = betboom_data.get('analysis_type', 'victory')
-        system_prompt = SYSTEM_PROMPTS["handball"]
-        
-        if analysis_type == 'total':
-            # Специальный промпт для анализа тоталов
-            user_prompt = f"""
-АНАЛИЗ ТОТАЛА В LIVE ГАНДБОЛЬНОМ МАТЧЕ
-
-🤾 ДАННЫЕ МАТЧА:
-{betboom_data.get('team1')} vs {betboom_data.get('team2')}
-Счет: {betboom_data.get('score')} ({betboom_data.get('minute')}' - 2й тайм)
-Всего голов: {betboom_data.get('total_goals')}
-Сыграно минут: {betboom_data.get('minutes_played')}
-
-📈 РАСЧЕТ ПО ФОРМУЛЕ:
-Прогнозный тотал = ({betboom_data.get('total_goals')} / {betboom_data.get('minutes_played')}) × 60 = {betboom_data.get('predicted_total')}
-ТМ (тотал меньше) = {betboom_data.get('predicted_total', 60) + 4}
-ТБ (тотал больше) = {betboom_data.get('predicted_total', 60) - 4}
-
-📊 СТАТИСТИКА КОМАНД:
-Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')}
-Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
-
-🧮 ЛОГИКА ТЕМПА:
-Текущий темп: {betboom_data.get('total_goals')} голов за {betboom_data.get('minutes_played')} минут
+    }
+}"""
+        },
+        "handball_total": {
+            "intro": "АНАЛИЗ ТОТАЛА В LIVE ГАНДБОЛЬНОМ МАТЧЕ",
+            "task": """🧮 ЛОГИКА ТЕМПА:
 - Если голов < минут → МЕДЛЕННЫЙ темп → ТМ
 - Если голов > минут → БЫСТРЫЙ темп → ТБ
 
@@ -183,35 +171,20 @@ class AdvancedClaudeAnalyzer:
 1. Оцени будет ли текущий темп сохраняться
 2. Учти усталость игроков и тактику команд
 3. Проанализируй результативность команд
-4. Дай точную рекомендацию по тоталу
-
-Ответь в JSON:
-{{
+4. Дай точную рекомендацию по тоталу (ТБ или ТМ из расчета по формуле)""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "pace": "БЫСТРЫЙ"/"МЕДЛЕННЫЙ"/"НЕЙТРАЛЬНЫЙ",
-    "recommendation": "ТБ_{betboom_data.get('predicted_total', 60) - 4}"/"ТМ_{betboom_data.get('predicted_total', 60) + 4}",
+    "recommendation": "ТБ_число"/"ТМ_число",
     "reasoning": "обоснование_до_80_символов",
     "bet_type": "total",
-    "predicted_total": {betboom_data.get('predicted_total', 60)},
+    "predicted_total": прогнозный_тотал,
     "analysis_details": "детальный_анализ_темпа_и_тенденций"
-}}
-"""
-        else:
-            # Промпт для анализа прямых побед
-            user_prompt = f"""
-АНАЛИЗ ПОБЕДЫ В LIVE ГАНДБОЛЬНОМ МАТЧЕ
-
-🤾 ДАННЫЕ МАТЧА:
-{betboom_data.get('team1')} vs {betboom_data.get('team2')}
-Счет: {betboom_data.get('score')} ({betboom_data.get('minute')}' - 2й тайм)
-Разрыв в счете: {abs(int(betboom_data.get('score', '0:0').split(':')[0]) - int(betboom_data.get('score', '0:0').split(':')[1]))} голов
-
-📊 СТАТИСТИКА:
-Позиции в таблице: {scores24_data.get('league_position1')} vs {scores24_data.get('league_position2')}
-Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
-Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')}
-
-🎯 ОСОБЕННОСТИ ГАНДБОЛА:
+}"""
+        },
+        "handball_victory": {
+            "intro": "АНАЛИЗ ПОБЕДЫ В LIVE ГАНДБОЛЬНОМ МАТЧЕ",
+            "task": """🎯 ОСОБЕННОСТИ ГАНДБОЛА:
 - Разрыв 5+ голов обычно критичен
 - Во втором тайме сложнее отыгрываться
 - Усталость влияет на точность бросков
@@ -221,10 +194,8 @@ class AdvancedClaudeAnalyzer:
 1. Оцени вероятность удержания преимущества
 2. Учти время матча и психологический фактор
 3. Проанализируй способность отстающей команды к comeback'у
-4. Дай точную оценку уверенности
-
-Ответь в JSON:
-{{
+4. Дай точную оценку уверенности""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "favorite_team": "название_фаворита",
@@ -232,15 +203,207 @@ class AdvancedClaudeAnalyzer:
     "recommendation": "bet"/"skip",
     "comeback_probability": число_от_0_до_100,
     "analysis_details": "детальный_анализ_шансов_на_comeback"
-}}
-"""
+}"""
+        }
+    }
+    
+    async def analyze_football_match(self, betboom_data: Dict[str, Any], 
+                                   scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Глубокий анализ футбольного матча"""
+        return await self._analyze_single("football", betboom_data, scores24_data)
+    
+    async def analyze_tennis_match(self, betboom_data: Dict[str, Any], 
+                                 scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Глубокий анализ теннисного матча"""
+        return await self._analyze_single("tennis", betboom_data, scores24_data)
+    
+    async def analyze_handball_with_context(self, betboom_data: Dict[str, Any], 
+                                          scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Контекстный анализ гандбольного матча"""
+        return await self._analyze_single(self.get_analysis_kind("handball", betboom_data),
+                                          betboom_data, scores24_data)
+    
+    @staticmethod
+    def get_analysis_kind(sport: str, betboom_data: Dict[str, Any]) -> str:
+        """Тип анализа (набор инструкций) для матча"""
+        if sport == 'handball':
+            return 'handball_total' if betboom_data.get('analysis_type') == 'total' else 'handball_victory'
+        return sport
+    
+    @staticmethod
+    def _sport_of(kind: str) -> str:
+        """Вид спорта по типу анализа"""
+        return 'handball' if kind.startswith('handball') else kind
+    
+    def _format_match_data(self, kind: str, betboom_data: Dict[str, Any],
+                           scores24_data: Dict[str, Any]) -> str:
+        """Данные конкретного матча для промпта"""
+        odds = betboom_data.get('odds', {})
+        
+        if kind == "football":
+            return f"""🏟️ ОСНОВНЫЕ ДАННЫЕ:
+Матч: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
+Счет: {betboom_data.get('score')} ({betboom_data.get('minute')}')
+Лига: {betboom_data.get('league')}
+Коэффициенты: 1={odds.get('1')} X={odds.get('X')} 2={odds.get('2')}
+
+📊 СТАТИСТИКА КОМАНД:
+{betboom_data.get('team1')}:
+- Позиция в таблице: {scores24_data.get('league_position1')}
+- Форма (последние 5): {scores24_data.get('form1')}
+- Голы за 5 матчей: {scores24_data.get('recent_goals1')}
+
+{betboom_data.get('team2')}:
+- Позиция в таблице: {scores24_data.get('league_position2')}  
+- Форма (последние 5): {scores24_data.get('form2')}
+- Голы за 5 матчей: {scores24_data.get('recent_goals2')}
+
+Уровень лиги: {scores24_data.get('league_level')}"""
+        
+        if kind == "tennis":
+            return f"""🎾 ОСНОВНЫЕ ДАННЫЕ:
+Матч: {betboom_data.get('player1')} vs {betboom_data.get('player2')}
+Счет по сетам: {betboom_data.get('sets_score')}
+Счет в геймах: {betboom_data.get('games_score')}
+Турнир: {betboom_data.get('tournament')}
+Коэффициенты: 1={odds.get('1')} 2={odds.get('2')}
+
+📊 СТАТИСТИКА ИГРОКОВ:
+{betboom_data.get('player1')}:
+- Рейтинг: {scores24_data.get('ranking1')}
+- Форма: {scores24_data.get('form1')}
+- Предпочтение покрытия: {scores24_data.get('surface_preference1')}
+
+{betboom_data.get('player2')}:
+- Рейтинг: {scores24_data.get('ranking2')}
+- Форма: {scores24_data.get('form2')}
+- Предпочтение покрытия: {scores24_data.get('surface_preference2')}
+
+Очные встречи: {scores24_data.get('head_to_head')} (побед первого-второго)"""
+        
+        if kind == "handball_total":
+            predicted_total = betboom_data.get('predicted_total', 60)
+            return f"""🤾 ДАННЫЕ МАТЧА:
+{betboom_data.get('team1')} vs {betboom_data.get('team2')}
+Счет: {betboom_data.get('score')} ({betboom_data.get('minute')}' - 2й тайм)
+Всего голов: {betboom_data.get('total_goals')}
+Сыграно минут: {betboom_data.get('minutes_played')}
+Текущий темп: {betboom_data.get('total_goals')} голов за {betboom_data.get('minutes_played')} минут
+
+📈 РАСЧЕТ ПО ФОРМУЛЕ:
+Прогнозный тотал = ({betboom_data.get('total_goals')} / {betboom_data.get('minutes_played')}) × 60 = {betboom_data.get('predicted_total')}
+ТМ (тотал меньше) = {predicted_total + 4}
+ТБ (тотал больше) = {predicted_total - 4}
+
+📊 СТАТИСТИКА КОМАНД:
+Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')}
+Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')}"""
         
-        return await self._make_claude_request(system_prompt, user_prompt)
+        # handball_victory
+        goals = betboom_data.get('score', '0:0').split(':')
+        return f"""🤾 ДАННЫЕ МАТЧА:
+{betboom_data.get('team1')} vs {betboom_data.get('team2')}
+Счет: {betboom_data.get('score')} ({betboom_data.get('minute')}' - 2й тайм)
+Разрыв в счете: {abs(int(goals[0]) - int(goals[1]))} голов
+
+📊 СТАТИСТИКА:
+Позиции в таблице: {scores24_data.get('league_position1')} vs {scores24_data.get('league_position2')}
+Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
+Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')}"""
+    
+    def _build_system_prompt(self, kind: str) -> str:
+        """Системный промпт вида спорта и статические инструкции типа анализа"""
+        parts = self.PROMPT_PARTS[kind]
+        if self._structured_output():
+            # Формат ответа задает схема инструмента
+            return f"""{SYSTEM_PROMPTS[self._sport_of(kind)]}
+
+{parts['task']}"""
+        return f"""{SYSTEM_PROMPTS[self._sport_of(kind)]}
+
+{parts['task']}
+
+Ответь в JSON формате:
+{parts['format']}"""
+    
+    def _build_prompt(self, kind: str, betboom_data: Dict[str, Any],
+                      scores24_data: Dict[str, Any]) -> str:
+        """Пользовательский промпт с данными одного матча"""
+        return f"""
+{self.PROMPT_PARTS[kind]['intro']}
+
+{self._format_match_data(kind, betboom_data, scores24_data)}
+"""
+    
+    async def _analyze_single(self, kind: str, betboom_data: Dict[str, Any],
+                              scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ одного матча отдельным запросом"""
+        user_prompt = self._build_prompt(kind, betboom_data, scores24_data)
+        return await self._make_claude_request(self._build_system_prompt(kind), user_prompt, self._sport_of(kind),
+                                               self._schema(RESPONSE_SCHEMAS[kind]))
+    
+    async def _request_batch(self, kind: str, instructions: str, prompt: str,
+                             max_tokens: int) -> Optional[str]:
+        """Отправляет пакетный промпт: системный промпт вида спорта и общие инструкции - системным блоком"""
+        sport = self._sport_of(kind)
+        return await self._request_text(f"{SYSTEM_PROMPTS[sport]}\n\n{instructions}", prompt,
+                                        max_tokens=max_tokens, sport=sport)
+    
+    def _batch_item_schema(self, kind: str) -> Optional[ResponseSchema]:
+        """Схема проверки результата матча в пакетном ответе (проверяется всегда)"""
+        return RESPONSE_SCHEMAS.get(kind)
+    
+    def _single_cache_key(self, kind: str, betboom_data: Dict[str, Any],
+                          scores24_data: Dict[str, Any]) -> str:
+        """Ключ кэша, под которым хранился бы результат поштучного запроса"""
+        return self.gateway.cache_key(self._build_system_prompt(kind),
+                                      self._build_prompt(kind, betboom_data, scores24_data),
+                                      schema=self._schema(RESPONSE_SCHEMAS[kind]))
     
     async def get_match_context_analysis(self, sport: str, all_matches: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Получает контекстный анализ всех матчей для лучшего понимания"""
-        
-        context_prompt = f"""
+        return await self._make_claude_request("", self._build_context_prompt(sport, all_matches), sport,
+                                               self._schema(CONTEXT_SCHEMA))
+    
+    async def validate_recommendation(self, sport: str, recommendation: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополнительная валидация рекомендации через Claude"""
+        return await self._make_claude_request("", self._build_validation_prompt(sport, recommendation), sport,
+                                               self._schema(VALIDATION_SCHEMA))
+    
+    # Офлайн варианты (Message Batches): результат приходит позже, в отчете пакета
+    def queue_match_context_analysis(self, queue: OfflineBatchQueue, sport: str,
+                                     all_matches: List[Dict[str, Any]]) -> str:
+        """Ставит контекстный анализ в офлайн пакет, возвращает custom_id"""
+        return queue.add("context", sport, self._build_context_prompt(sport, all_matches), SYSTEM_PROMPTS.get(sport, ""),
+                         schema=self._schema(CONTEXT_SCHEMA))
+    
+    def queue_validation(self, queue: OfflineBatchQueue, sport: str, recommendation: Dict[str, Any]) -> str:
+        """Ставит валидацию рекомендации в офлайн пакет, возвращает custom_id"""
+        return queue.add("validation", sport, self._build_validation_prompt(sport, recommendation),
+                         SYSTEM_PROMPTS.get(sport, ""), meta={"recommendation": recommendation},
+                         schema=self._schema(VALIDATION_SCHEMA))
+    
+    def queue_daily_summary(self, queue: OfflineBatchQueue, slot: str,
+                            results: Dict[str, List[Dict[str, Any]]]) -> str:
+        """Ставит сводку рекомендаций за день (утренний/вечерний отчет) в офлайн пакет"""
+        summary_prompt = f"""
+СВОДКА РЕКОМЕНДАЦИЙ ({slot})
+
+Рекомендации по видам спорта:
+{json.dumps(results, ensure_ascii=False, indent=2, default=str)}
+
+Составь сводку для канала:
+1. Лучшие ставки дня и их обоснование
+2. Общие тенденции по видам спорта
+3. На какие матчи обратить внимание дальше
+
+Ответь кратким текстом (до 300 слов).
+"""
+        return queue.add("summary", "all", summary_prompt, meta={"slot": slot})
+    
+    @staticmethod
+    def _build_context_prompt(sport: str, all_matches: List[Dict[str, Any]]) -> str:
+        return f"""
 Ты анализируешь live {sport} матчи. Вот все доступные матчи:
 
 {json.dumps(all_matches, ensure_ascii=False, indent=2)}
@@ -253,13 +416,10 @@ class AdvancedClaudeAnalyzer:
 
 Ответь кратким анализом ситуации (до 200 слов).
 """
-        
-        return await self._make_claude_request("", context_prompt)
     
-    async def validate_recommendation(self, sport: str, recommendation: Dict[str, Any]) -> Dict[str, Any]:
-        """Дополнительная валидация рекомендации через Claude"""
-        
-        validation_prompt = f"""
+    @staticmethod
+    def _build_validation_prompt(sport: str, recommendation: Dict[str, Any]) -> str:
+        prompt = f"""
 ВАЛИДАЦИЯ РЕКОМЕНДАЦИИ ПО СТАВКЕ
 
 Вид спорта: {sport}
@@ -272,85 +432,70 @@ class AdvancedClaudeAnalyzer:
 4. Качество анализа
 
 Если находишь серьезные недочеты, скорректируй уверенность в меньшую сторону.
-
+"""
+        if AdvancedClaudeAnalyzer._structured_output():
+            return prompt
+        return prompt + """
 Ответь в JSON:
-{{
+{
     "is_valid": true/false,
     "corrected_confidence": число_от_0_до_100,
     "validation_notes": "замечания_по_анализу",
     "final_recommendation": "bet"/"skip"
-}}
+}
 """
-        
-        return await self._make_claude_request("", validation_prompt)
     
-    async def _make_claude_request(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+    def _is_mock_mode(self) -> bool:
+        """API ключ не настроен - вместо запросов используются заглушки"""
+        return self.api_key == "YOUR_CLAUDE_API_KEY"
+    
+    @staticmethod
+    def _structured_output() -> bool:
+        """Ответы через tool use по схеме (иначе формат описывается в промпте)"""
+        return CLAUDE_CONFIG.get("structured_output", True)
+    
+    @classmethod
+    def _schema(cls, schema: ResponseSchema) -> Optional[ResponseSchema]:
+        return schema if cls._structured_output() else None
+    
+    @staticmethod
+    def _early_stop(sport: str):
+        """Условие досрочной остановки потокового ответа (None - ответ читается полностью)"""
+        threshold = early_stop_threshold(sport)
+        return confidence_cutoff(threshold) if threshold is not None else None
+    
+    async def _make_claude_request(self, system_prompt: str, user_prompt: str, sport: str = "general",
+                                   schema: Optional[ResponseSchema] = None) -> Dict[str, Any]:
         """Выполняет запрос к Claude API с системным промптом"""
         
         # В тестовом режиме возвращаем умную заглушку
-        if self.api_key == "YOUR_CLAUDE_API_KEY":
+        if self._is_mock_mode():
             logger.info("ТЕСТОВЫЙ РЕЖИМ Claude - генерируем умную заглушку")
             return await self._generate_smart_mock(user_prompt)
         
         try:
-            messages = []
-            
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-            
-            messages.append({
-                "role": "user", 
-                "content": user_prompt
-            })
-            
-            payload = {
-                "model": self.model,
-                "max_tokens": CLAUDE_CONFIG.get("max_tokens", 1000),
-                "temperature": CLAUDE_CONFIG.get("temperature", 0.1),
-                "messages": messages
-            }
-            
-            # Асинхронный запрос
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: requests.post(self.base_url, headers=self.headers, json=payload, timeout=30)
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result['content'][0]['text']
-                
-                # Извлекаем JSON из ответа
-                try:
-                    # Ищем JSON в ответе
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
-                    
-                    if json_start != -1 and json_end > json_start:
-                        json_content = content[json_start:json_end]
-                        analysis_result = json.loads(json_content)
-                        
-                        logger.info(f"Claude анализ выполнен, уверенность: {analysis_result.get('confidence', 0)}%")
-                        return analysis_result
-                    else:
-                        logger.error("JSON не найден в ответе Claude")
-                        return self._get_error_response()
-                        
-                except json.JSONDecodeError as e:
-                    logger.error(f"Ошибка парсинга JSON: {e}")
-                    logger.debug(f"Содержимое ответа: {content}")
-                    return self._get_error_response()
-            else:
-                logger.error(f"Ошибка Claude API: {response.status_code}")
-                return self._get_error_response()
-                
+            analysis_result = await self.gateway.complete_json(user_prompt, system_prompt, sport,
+                                                               early_stop=self._early_stop(sport), schema=schema)
         except Exception as e:
             logger.error(f"Исключение при запросе к Claude: {e}")
             return self._get_error_response()
+        if not isinstance(analysis_result, dict):
+            return self._get_error_response()
+        if analysis_result.get('stopped_early'):
+            analysis_result.setdefault('reasoning', 'Уверенность ниже порога, анализ остановлен досрочно')
+        
+        logger.info(f"Claude анализ выполнен, уверенность: {analysis_result.get('confidence', 0)}%")
+        return analysis_result
+    
+    async def _request_text(self, system_prompt: str, user_prompt: str,
+                            max_tokens: int = None, sport: str = "general") -> Optional[str]:
+        """Отправляет запрос и возвращает текст ответа (None при ошибке)"""
+        try:
+            response = await self.gateway.complete(user_prompt, system_prompt, sport, max_tokens=max_tokens)
+            return response.text
+        except Exception as e:
+            logger.error(f"Исключение при запросе к Claude: {e}")
+            return None
     
     async def _generate_smart_mock(self, prompt: str) -> Dict[str, Any]:
         """Генерирует умную заглушку на основе промпта"""
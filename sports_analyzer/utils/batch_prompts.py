@@ -0,0 +1,202 @@
+"""
+Пакетные промпты: несколько матчей одного вида спорта в одном запросе к Claude
+Общие инструкции отправляются один раз, ответ - JSON массив с match_id
+"""
+
+import asyncio
+import json
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from config.claude_config import CLAUDE_CONFIG
+from utils.llm_metrics import get_llm_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (кириллица ~3 символа на токен)"""
+    return len(text) // 3 + 1
+
+
+def plan_batches(items: List[Tuple[str, str]], instructions: str,
+                 input_token_budget: int, output_tokens_per_item: int,
+                 max_output_tokens: int) -> List[List[Tuple[str, str]]]:
+    """
+    Разбивает (match_id, данные матча) на пакеты так, чтобы входной промпт
+    укладывался в бюджет токенов, а ожидаемый ответ - в max_output_tokens
+    """
+    batches: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    base_tokens = estimate_tokens(instructions)
+    current_tokens = base_tokens
+    max_items = max(1, max_output_tokens // output_tokens_per_item)
+    
+    for item in items:
+        item_tokens = estimate_tokens(item[1])
+        if current and (current_tokens + item_tokens > input_token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], base_tokens
+        current.append(item)
+        current_tokens += item_tokens
+    
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_instructions(intro: str, task: str, response_format: str) -> str:
+    """Общие инструкции пакета (не зависят от матчей, передаются системным блоком)"""
+    item_format = response_format.strip()
+    if item_format.startswith('{'):
+        item_format = '{\n    "match_id": "идентификатор_матча",' + item_format[1:]
+    
+    return f"""{intro.strip()}
+
+Матчи передаются блоками "=== МАТЧ идентификатор ===". Проанализируй каждый матч независимо по одним и тем же правилам.
+
+{task.strip()}
+
+Ответь СТРОГО JSON массивом, по одному объекту на каждый матч, в формате:
+[
+{item_format}
+]"""
+
+
+def build_batch_prompt(items: List[Tuple[str, str]]) -> str:
+    """Данные пакета матчей"""
+    blocks = "\n".join(f"=== МАТЧ {match_id} ===\n{data.strip()}\n" for match_id, data in items)
+    return f"""
+Матчей в пакете: {len(items)}
+
+{blocks}"""
+
+
+def parse_batch_response(content: str, match_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Извлекает результаты из JSON массива ответа. Возвращает только корректные
+    объекты с известным match_id - остальные матчи анализируются по одному.
+    """
+    start = content.find('[')
+    end = content.rfind(']') + 1
+    if start == -1 or end <= start:
+        logger.error("JSON массив не найден в пакетном ответе Claude")
+        return {}
+    
+    try:
+        items = json.loads(content[start:end])
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка парсинга пакетного ответа Claude: {e}")
+        return {}
+    
+    expected = set(match_ids)
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and str(item.get('match_id')) in expected and 'confidence' in item:
+            match_id = str(item.pop('match_id'))
+            results[match_id] = item
+    
+    if len(results) < len(expected):
+        logger.warning(f"Пакетный ответ неполный: {len(results)} из {len(expected)} матчей")
+    return results
+
+
+class BatchAnalysisMixin:
+    """
+    Пакетный анализ для анализаторов Claude. Класс-наследник предоставляет
+    PROMPT_PARTS (intro/task/format по типу анализа), get_analysis_kind,
+    _format_match_data, _analyze_single, _request_batch, _single_cache_key,
+    _batch_item_schema и _is_mock_mode.
+    """
+    
+    async def analyze_batch(self, sport: str, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                            max_concurrency: int = 1) -> List[Dict[str, Any]]:
+        """
+        Пакетный анализ матчей одного вида спорта: N матчей в одном запросе.
+        Размер пакета подбирается по бюджету токенов, матчи без корректного
+        результата в ответе анализируются отдельными запросами.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(pairs)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def run_single(i: int, kind: str):
+            async with semaphore:
+                results[i] = await self._analyze_single(kind, *pairs[i])
+        
+        # Заглушки тестового режима не поддерживают пакетный формат
+        if self._is_mock_mode():
+            await asyncio.gather(*[
+                run_single(i, self.get_analysis_kind(sport, betboom_data))
+                for i, (betboom_data, _) in enumerate(pairs)
+            ])
+            return results
+        
+        # Группируем по набору инструкций (у гандбола победа и тотал различаются)
+        groups: Dict[str, List[int]] = {}
+        for i, (betboom_data, _) in enumerate(pairs):
+            groups.setdefault(self.get_analysis_kind(sport, betboom_data), []).append(i)
+        
+        # Уже проанализированные матчи берем из кэша ответов
+        if self.response_cache:
+            for kind, indices in groups.items():
+                pending = []
+                for i in indices:
+                    cached = self.response_cache.get(self._single_cache_key(kind, *pairs[i]), sport)
+                    get_llm_metrics().record_cache(sport, cached is not None)
+                    if cached is not None:
+                        results[i] = cached
+                    else:
+                        pending.append(i)
+                groups[kind] = pending
+        
+        output_tokens_per_item = CLAUDE_CONFIG.get("batch_output_tokens_per_match", 250)
+        
+        async def run_batch(kind: str, items: List[Tuple[str, str]]):
+            parts = self.PROMPT_PARTS[kind]
+            instructions = build_batch_instructions(parts['intro'], parts['task'], parts['format'])
+            
+            async with semaphore:
+                content = await self._request_batch(kind, instructions, build_batch_prompt(items),
+                                                    output_tokens_per_item * len(items) + 100)
+            
+            parsed = parse_batch_response(content, [match_id for match_id, _ in items]) if content else {}
+            schema = self._batch_item_schema(kind)
+            missing = []
+            for match_id, _ in items:
+                i = int(match_id[1:])
+                errors = schema.validate(parsed[match_id]) if schema and match_id in parsed else []
+                if errors:
+                    logger.warning(f"Ответ для {match_id} в пакете {kind} не соответствует схеме: {'; '.join(errors[:5])}")
+                if match_id in parsed and not errors:
+                    results[i] = parsed[match_id]
+                    if self.response_cache:
+                        self.response_cache.set(self._single_cache_key(kind, *pairs[i]), parsed[match_id])
+                else:
+                    missing.append(i)
+            
+            if content:
+                metrics = get_llm_metrics()
+                metrics.record_parse(sport, self.model, True, len(items) - len(missing))
+                metrics.record_parse(sport, self.model, False, len(missing))
+            
+            # Откат на поштучный анализ для неразобранных матчей
+            await asyncio.gather(*[run_single(i, kind) for i in missing])
+        
+        tasks = []
+        for kind, indices in groups.items():
+            if not indices:
+                continue
+            parts = self.PROMPT_PARTS[kind]
+            items = [(f"m{i}", self._format_match_data(kind, *pairs[i])) for i in indices]
+            batches = plan_batches(
+                items,
+                parts['intro'] + parts['task'] + parts['format'],
+                CLAUDE_CONFIG.get("batch_input_token_budget", 6000),
+                output_tokens_per_item,
+                CLAUDE_CONFIG.get("batch_max_output_tokens", 4000)
+            )
+            logger.info(f"Пакетный анализ {kind}: {len(items)} матчей в {len(batches)} запросах")
+            tasks.extend(run_batch(kind, batch) for batch in batches)
+        
+        await asyncio.gather(*tasks)
+        return results
@@ -3,51 +3,60 @@
 """
 
 import asyncio
-import json
 import logging
 from typing import Dict, Any, List, Optional
-import requests
 from datetime import datetime
 
+from config.claude_config import CLAUDE_CONFIG, early_stop_threshold, get_gateway_settings
+from utils.llm_gateway import get_llm_gateway
+from utils.response_cache import get_response_cache
+from utils.batch_prompts import BatchAnalysisMixin
+from utils.prompt_cache import get_prompt_cache_stats
+from utils.stream_json import confidence_cutoff
+from utils.structured_output import ResponseSchema, object_schema, CONFIDENCE, REASONING, BET_DECISION
+
 logger = logging.getLogger(__name__)
 
+# Схемы ответов анализа: confidence и recommendation идут первыми,
+# по ним работает досрочная остановка потокового ответа
+VICTORY_SCHEMA = object_schema({
+    "confidence": CONFIDENCE,
+    "recommendation": BET_DECISION,
+    "is_favorite_leading": {"type": "boolean", "description": "Ведет ли объективный фаворит"},
+    "reasoning": REASONING,
+    "analysis_details": {"type": "string", "description": "Подробный анализ"}
+})
+
+HANDBALL_TOTAL_SCHEMA = object_schema({
+    "confidence": CONFIDENCE,
+    "recommendation": {"type": "string", "description": "ТБ_число, ТМ_число или обе_ставки"},
+    "pace": {"type": "string", "enum": ["БЫСТРЫЙ", "МЕДЛЕННЫЙ", "НЕЙТРАЛЬНЫЙ"]},
+    "reasoning": REASONING,
+    "bet_type": {"type": "string", "enum": ["total"]},
+    "analysis_details": {"type": "string", "description": "Подробный анализ темпа игры"}
+})
 
-class ClaudeAnalyzer:
+
+class ClaudeAnalyzer(BatchAnalysisMixin):
     """Анализатор спортивных событий на базе Claude AI"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, model: str = None):
         self.api_key = api_key or "YOUR_CLAUDE_API_KEY"
-        self.base_url = "https://api.anthropic.com/v1/messages"
-        self.model = "claude-3-5-sonnet-20241022"
+        self.model = model or "claude-3-5-sonnet-20241022"
         
-        # Заголовки для API запросов
-        self.headers = {
-            "Content-Type": "application/json",
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01"
-        }
+        # Запросы, повторы, кэш ответов и резервный провайдер - через общий шлюз LLM
+        self.gateway = None if self._is_mock_mode() else get_llm_gateway(
+            get_gateway_settings(api_key=self.api_key, model=self.model)
+        )
+        self.response_cache = get_response_cache(CLAUDE_CONFIG)
+        self.prompt_cache_stats = get_prompt_cache_stats()
     
-    async def analyze_football_match(self, betboom_data: Dict[str, Any], 
-                                   scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Анализ футбольного матча через Claude"""
-        
-        prompt = f"""
-Ты эксперт по анализу футбольных матчей. Проанализируй следующий live матч и определи вероятность победы команды, которая сейчас ведет в счете.
-
-ДАННЫЕ МАТЧА (BetBoom):
-- Команды: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
-- Текущий счет: {betboom_data.get('score')}
-- Минута: {betboom_data.get('minute')}'
-- Лига: {betboom_data.get('league')}
-- Коэффициенты: П1={betboom_data.get('odds', {}).get('1')}, Х={betboom_data.get('odds', {}).get('X')}, П2={betboom_data.get('odds', {}).get('2')}
-
-СТАТИСТИКА (Scores24):
-- Позиции в таблице: {scores24_data.get('league_position1')} vs {scores24_data.get('league_position2')}
-- Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')} (W=победа, D=ничья, L=поражение)
-- Голы за последние 5 матчей: {scores24_data.get('recent_goals1')} vs {scores24_data.get('recent_goals2')}
-- Уровень лиги: {scores24_data.get('league_level')}
-
-ЗАДАЧА:
+    # Части промптов: вводная часть, задача и формат ответа общие для всех матчей
+    # вида спорта, данные матча подставляются отдельно (см. _format_match_data)
+    PROMPT_PARTS = {
+        "football": {
+            "intro": "Ты эксперт по анализу футбольных матчей. Проанализируй следующий live матч и определи вероятность победы команды, которая сейчас ведет в счете.",
+            "task": """ЗАДАЧА:
 1. Определи, является ли команда, ведущая в счете, объективным фаворитом
 2. Оцени вероятность ее победы (в процентах)
 3. Дай краткое обоснование (максимум 80 символов)
@@ -56,41 +65,18 @@ class ClaudeAnalyzer:
 - Рекомендуй ставку только если вероятность >80%
 - Учитывай время матча (поздние голы важнее)
 - Анализируй форму, позицию в таблице, уровень лиги
-- Будь консервативен в оценках
-
-Ответь СТРОГО в JSON формате:
-{{
+- Будь консервативен в оценках""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "reasoning": "краткое_обоснование_до_80_символов",
     "recommendation": "bet"/"skip",
     "analysis_details": "подробный_анализ"
-}}
-"""
-        
-        return await self._make_claude_request(prompt)
-    
-    async def analyze_tennis_match(self, betboom_data: Dict[str, Any], 
-                                 scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Анализ теннисного матча через Claude"""
-        
-        prompt = f"""
-Ты эксперт по анализу теннисных матчей. Проанализируй следующий live матч и определи вероятность победы игрока, который сейчас ведет.
-
-ДАННЫЕ МАТЧА (BetBoom):
-- Игроки: {betboom_data.get('player1')} vs {betboom_data.get('player2')}
-- Счет по сетам: {betboom_data.get('sets_score')}
-- Счет в геймах: {betboom_data.get('games_score')}
-- Турнир: {betboom_data.get('tournament')}
-- Коэффициенты: П1={betboom_data.get('odds', {}).get('1')}, П2={betboom_data.get('odds', {}).get('2')}
-
-СТАТИСТИКА (Scores24):
-- Рейтинг ATP/WTA: {scores24_data.get('ranking1')} vs {scores24_data.get('ranking2')}
-- Форма игроков: {scores24_data.get('form1')} vs {scores24_data.get('form2')} (W=победа, L=поражение)
-- Очные встречи: {scores24_data.get('head_to_head')} (победы первого-второго)
-- Предпочтение покрытия: {scores24_data.get('surface_preference1')} vs {scores24_data.get('surface_preference2')}
-
-ЗАДАЧА:
+}"""
+        },
+        "tennis": {
+            "intro": "Ты эксперт по анализу теннисных матчей. Проанализируй следующий live матч и определи вероятность победы игрока, который сейчас ведет.",
+            "task": """ЗАДАЧА:
 1. Определи, является ли игрок, ведущий в матче, объективным фаворитом
 2. Оцени вероятность его победы (в процентах)
 3. Дай краткое обоснование
@@ -99,40 +85,18 @@ class ClaudeAnalyzer:
 - Выигрыш первого сета дает психологическое преимущество
 - Разрыв в 4+ гейма в сете критичен
 - Рейтинг и форма - ключевые факторы
-- Очные встречи показывают стиль игры
-
-Ответь СТРОГО в JSON формате:
-{{
+- Очные встречи показывают стиль игры""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "reasoning": "краткое_обоснование_до_80_символов",
     "recommendation": "bet"/"skip",
     "analysis_details": "подробный_анализ"
-}}
-"""
-        
-        return await self._make_claude_request(prompt)
-    
-    async def analyze_table_tennis_match(self, betboom_data: Dict[str, Any], 
-                                       scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Анализ матча настольного тенниса через Claude"""
-        
-        prompt = f"""
-Ты эксперт по анализу настольного тенниса. Проанализируй следующий live матч и определи вероятность победы игрока, который ведет по сетам.
-
-ДАННЫЕ МАТЧА (BetBoom):
-- Игроки: {betboom_data.get('player1')} vs {betboom_data.get('player2')}
-- Счет по сетам: {betboom_data.get('sets_score')}
-- Текущий сет: {betboom_data.get('current_set_score')}
-- Турнир: {betboom_data.get('tournament')}
-- Коэффициенты: П1={betboom_data.get('odds', {}).get('1')}, П2={betboom_data.get('odds', {}).get('2')}
-
-СТАТИСТИКА (Scores24):
-- Рейтинг ITTF: {scores24_data.get('ranking1')} vs {scores24_data.get('ranking2')}
-- Форма игроков: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
-- Процент побед: {scores24_data.get('recent_performance1')}% vs {scores24_data.get('recent_performance2')}%
-
-ЗАДАЧА:
+}"""
+        },
+        "table_tennis": {
+            "intro": "Ты эксперт по анализу настольного тенниса. Проанализируй следующий live матч и определи вероятность победы игрока, который ведет по сетам.",
+            "task": """ЗАДАЧА:
 1. Определи, является ли игрок, ведущий по сетам, объективным фаворитом
 2. Оцени вероятность его победы
 3. Дай краткое обоснование
@@ -141,40 +105,18 @@ class ClaudeAnalyzer:
 - Преимущество в сетах критично (до 3-4 сетов)
 - Быстрая смена инициативы возможна
 - Рейтинг ITTF очень важен
-- Форма и стабильность ключевые
-
-Ответь СТРОГО в JSON формате:
-{{
+- Форма и стабильность ключевые""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "reasoning": "краткое_обоснование_до_80_символов",
     "recommendation": "bet"/"skip",
     "analysis_details": "подробный_анализ"
-}}
-"""
-        
-        return await self._make_claude_request(prompt)
-    
-    async def analyze_handball_victory(self, betboom_data: Dict[str, Any], 
-                                     scores24_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Анализ гандбольного матча (прямая победа) через Claude"""
-        
-        prompt = f"""
-Ты эксперт по анализу гандбольных матчей. Проанализируй следующий live матч где одна команда ведет с большим разрывом.
-
-ДАННЫЕ МАТЧА (BetBoom):
-- Команды: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
-- Текущий счет: {betboom_data.get('score')}
-- Минута: {betboom_data.get('minute')}' ({betboom_data.get('half')}-й тайм)
-- Лига: {betboom_data.get('league')}
-- Коэффициенты: П1={betboom_data.get('odds', {}).get('1')}, П2={betboom_data.get('odds', {}).get('2')}
-
-СТАТИСТИКА (Scores24):
-- Позиции в таблице: {scores24_data.get('league_position1')} vs {scores24_data.get('league_position2')}
-- Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
-- Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')} голов за матч
-
-ЗАДАЧА:
+}"""
+        },
+        "handball_victory": {
+            "intro": "Ты эксперт по анализу гандбольных матчей. Проанализируй следующий live матч где одна команда ведет с большим разрывом.",
+            "task": """ЗАДАЧА:
 1. Определи, сможет ли ведущая команда удержать преимущество
 2. Оцени вероятность ее победы
 3. Учти особенности гандбола
@@ -183,32 +125,149 @@ class ClaudeAnalyzer:
 - Разрыв в 5+ голов обычно критичен
 - Время матча важно (поздние голы сложнее отыграть)
 - Форма команд и позиция в таблице показательны
-- Результативность команд влияет на стиль игры
-
-Ответь СТРОГО в JSON формате:
-{{
+- Результативность команд влияет на стиль игры""",
+            "format": """{
     "confidence": число_от_0_до_100,
     "is_favorite_leading": true/false,
     "reasoning": "краткое_обоснование_до_80_символов",
     "recommendation": "bet"/"skip",
     "analysis_details": "подробный_анализ"
-}}
-"""
-        
-        return await self._make_claude_request(prompt)
+}"""
+        },
+        "handball_total": {
+            "intro": "Ты эксперт по анализу тоталов в гандболе. Проанализируй темп игры и дай рекомендацию по тоталу.",
+            "task": """ЛОГИКА АНАЛИЗА:
+- Если голов < минут → МЕДЛЕННЫЙ темп → рекомендуй ТМ
+- Если голов > минут → БЫСТРЫЙ темп → рекомендуй ТБ
+- Если голов ≈ минут → можно рассмотреть обе ставки
+
+ЗАДАЧА:
+1. Оцени текущий темп игры
+2. Спрогнозируй будет ли он сохраняться
+3. Дай рекомендацию по тоталу
+4. Оцени уверенность в прогнозе""",
+            "format": """{
+    "confidence": число_от_0_до_100,
+    "pace": "БЫСТРЫЙ"/"МЕДЛЕННЫЙ"/"НЕЙТРАЛЬНЫЙ",
+    "recommendation": "ТБ_число"/"ТМ_число"/"обе_ставки",
+    "reasoning": "краткое_обоснование_до_80_символов",
+    "bet_type": "total",
+    "analysis_details": "подробный_анализ_темпа_игры"
+}"""
+        }
+    }
+    
+    # Структурированный ответ (tool use) по виду анализа вместо описания формата в промпте
+    RESPONSE_SCHEMAS = {
+        kind: ResponseSchema(f"{kind}_analysis", f"Результат анализа live матча ({kind})", VICTORY_SCHEMA)
+        for kind in ("football", "tennis", "table_tennis", "handball_victory")
+    }
+    RESPONSE_SCHEMAS["handball_total"] = ResponseSchema(
+        "handball_total_analysis", "Рекомендация по тоталу в live матче гандбола", HANDBALL_TOTAL_SCHEMA
+    )
+    
+    async def analyze_match(self, sport: str, betboom_data: Dict[str, Any],
+                            scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ матча любого вида спорта (тип анализа определяется по данным BetBoom)"""
+        return await self._analyze_single(self.get_analysis_kind(sport, betboom_data), betboom_data, scores24_data)
+    
+    async def analyze_football_match(self, betboom_data: Dict[str, Any], 
+                                   scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ футбольного матча через Claude"""
+        return await self._analyze_single("football", betboom_data, scores24_data)
+    
+    async def analyze_tennis_match(self, betboom_data: Dict[str, Any], 
+                                 scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ теннисного матча через Claude"""
+        return await self._analyze_single("tennis", betboom_data, scores24_data)
+    
+    async def analyze_table_tennis_match(self, betboom_data: Dict[str, Any], 
+                                       scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ матча настольного тенниса через Claude"""
+        return await self._analyze_single("table_tennis", betboom_data, scores24_data)
+    
+    async def analyze_handball_victory(self, betboom_data: Dict[str, Any], 
+                                     scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ гандбольного матча (прямая победа) через Claude"""
+        return await self._analyze_single("handball_victory", betboom_data, scores24_data)
     
     async def analyze_handball_total(self, betboom_data: Dict[str, Any], 
                                    scores24_data: Dict[str, Any]) -> Dict[str, Any]:
         """Анализ тотала в гандбольном матче через Claude"""
+        return await self._analyze_single("handball_total", betboom_data, scores24_data)
+    
+    @staticmethod
+    def get_analysis_kind(sport: str, betboom_data: Dict[str, Any]) -> str:
+        """Тип анализа (набор инструкций) для матча"""
+        if sport == 'handball':
+            return 'handball_total' if betboom_data.get('analysis_type') == 'total' else 'handball_victory'
+        return sport
+    
+    def _format_match_data(self, kind: str, betboom_data: Dict[str, Any],
+                           scores24_data: Dict[str, Any]) -> str:
+        """Данные конкретного матча для промпта"""
+        odds = betboom_data.get('odds', {})
+        
+        if kind == "football":
+            return f"""ДАННЫЕ МАТЧА (BetBoom):
+- Команды: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
+- Текущий счет: {betboom_data.get('score')}
+- Минута: {betboom_data.get('minute')}'
+- Лига: {betboom_data.get('league')}
+- Коэффициенты: П1={odds.get('1')}, Х={odds.get('X')}, П2={odds.get('2')}
+
+СТАТИСТИКА (Scores24):
+- Позиции в таблице: {scores24_data.get('league_position1')} vs {scores24_data.get('league_position2')}
+- Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')} (W=победа, D=ничья, L=поражение)
+- Голы за последние 5 матчей: {scores24_data.get('recent_goals1')} vs {scores24_data.get('recent_goals2')}
+- Уровень лиги: {scores24_data.get('league_level')}"""
+        
+        if kind == "tennis":
+            return f"""ДАННЫЕ МАТЧА (BetBoom):
+- Игроки: {betboom_data.get('player1')} vs {betboom_data.get('player2')}
+- Счет по сетам: {betboom_data.get('sets_score')}
+- Счет в геймах: {betboom_data.get('games_score')}
+- Турнир: {betboom_data.get('tournament')}
+- Коэффициенты: П1={odds.get('1')}, П2={odds.get('2')}
+
+СТАТИСТИКА (Scores24):
+- Рейтинг ATP/WTA: {scores24_data.get('ranking1')} vs {scores24_data.get('ranking2')}
+- Форма игроков: {scores24_data.get('form1')} vs {scores24_data.get('form2')} (W=победа, L=поражение)
+- Очные встречи: {scores24_data.get('head_to_head')} (победы первого-второго)
+- Предпочтение покрытия: {scores24_data.get('surface_preference1')} vs {scores24_data.get('surface_preference2')}"""
+        
+        if kind == "table_tennis":
+            return f"""ДАННЫЕ МАТЧА (BetBoom):
+- Игроки: {betboom_data.get('player1')} vs {betboom_data.get('player2')}
+- Счет по сетам: {betboom_data.get('sets_score')}
+- Текущий сет: {betboom_data.get('current_set_score')}
+- Турнир: {betboom_data.get('tournament')}
+- Коэффициенты: П1={odds.get('1')}, П2={odds.get('2')}
+
+СТАТИСТИКА (Scores24):
+- Рейтинг ITTF: {scores24_data.get('ranking1')} vs {scores24_data.get('ranking2')}
+- Форма игроков: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
+- Процент побед: {scores24_data.get('recent_performance1')}% vs {scores24_data.get('recent_performance2')}%"""
+        
+        if kind == "handball_victory":
+            return f"""ДАННЫЕ МАТЧА (BetBoom):
+- Команды: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
+- Текущий счет: {betboom_data.get('score')}
+- Минута: {betboom_data.get('minute')}' ({betboom_data.get('half')}-й тайм)
+- Лига: {betboom_data.get('league')}
+- Коэффициенты: П1={odds.get('1')}, П2={odds.get('2')}
+
+СТАТИСТИКА (Scores24):
+- Позиции в таблице: {scores24_data.get('league_position1')} vs {scores24_data.get('league_position2')}
+- Форма команд: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
+- Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')} голов за матч"""
         
+        # handball_total
         total_goals = betboom_data.get('total_goals', 0)
         minutes_played = betboom_data.get('minutes_played', 60)
         predicted_total = betboom_data.get('predicted_total', 60)
         
-        prompt = f"""
-Ты эксперт по анализу тоталов в гандболе. Проанализируй темп игры и дай рекомендацию по тоталу.
-
-ДАННЫЕ МАТЧА:
+        return f"""ДАННЫЕ МАТЧА:
 - Команды: {betboom_data.get('team1')} vs {betboom_data.get('team2')}
 - Текущий счет: {betboom_data.get('score')}
 - Минута: {betboom_data.get('minute')}' (2-й тайм)
@@ -222,84 +281,112 @@ class ClaudeAnalyzer:
 
 СТАТИСТИКА КОМАНД:
 - Средняя результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')}
-- Форма: {scores24_data.get('form1')} vs {scores24_data.get('form2')}
+- Форма: {scores24_data.get('form1')} vs {scores24_data.get('form2')}"""
+    
+    def _build_system_prompt(self, kind: str) -> str:
+        """Статические инструкции типа анализа (системный блок, общий для всех матчей)"""
+        parts = self.PROMPT_PARTS[kind]
+        if self._response_schema(kind):
+            # Формат ответа задает схема инструмента
+            return f"""{parts['intro']}
 
-ЛОГИКА АНАЛИЗА:
-- Если голов < минут → МЕДЛЕННЫЙ темп → рекомендуй ТМ
-- Если голов > минут → БЫСТРЫЙ темп → рекомендуй ТБ
-- Если голов ≈ минут → можно рассмотреть обе ставки
+{parts['task']}"""
+        return f"""{parts['intro']}
 
-ЗАДАЧА:
-1. Оцени текущий темп игры
-2. Спрогнозируй будет ли он сохраняться
-3. Дай рекомендацию по тоталу
-4. Оцени уверенность в прогнозе
+{parts['task']}
 
 Ответь СТРОГО в JSON формате:
-{{
-    "confidence": число_от_0_до_100,
-    "pace": "БЫСТРЫЙ"/"МЕДЛЕННЫЙ"/"НЕЙТРАЛЬНЫЙ",
-    "recommendation": "ТБ_число"/"ТМ_число"/"обе_ставки",
-    "reasoning": "краткое_обоснование_до_80_символов",
-    "bet_type": "total",
-    "analysis_details": "подробный_анализ_темпа_игры"
-}}
+{parts['format']}"""
+    
+    def _build_prompt(self, kind: str, betboom_data: Dict[str, Any],
+                      scores24_data: Dict[str, Any]) -> str:
+        """Промпт с данными одного матча"""
+        return f"""
+{self._format_match_data(kind, betboom_data, scores24_data)}
 """
-        
-        return await self._make_claude_request(prompt)
     
-    async def _make_claude_request(self, prompt: str) -> Dict[str, Any]:
+    def _response_schema(self, kind: str) -> Optional[ResponseSchema]:
+        """Схема структурированного ответа (None - формат описывается в промпте)"""
+        if not CLAUDE_CONFIG.get("structured_output", True):
+            return None
+        return self.RESPONSE_SCHEMAS.get(kind)
+    
+    def _batch_item_schema(self, kind: str) -> Optional[ResponseSchema]:
+        """Схема проверки результата матча в пакетном ответе (проверяется всегда)"""
+        return self.RESPONSE_SCHEMAS.get(kind)
+    
+    @staticmethod
+    def _sport_of(kind: str) -> str:
+        """Вид спорта по типу анализа"""
+        return 'handball' if kind.startswith('handball') else kind
+    
+    async def _analyze_single(self, kind: str, betboom_data: Dict[str, Any],
+                              scores24_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ одного матча отдельным запросом"""
+        prompt = self._build_prompt(kind, betboom_data, scores24_data)
+        return await self._make_claude_request(prompt, self._sport_of(kind), self._build_system_prompt(kind),
+                                               self._response_schema(kind))
+    
+    async def _request_batch(self, kind: str, instructions: str, prompt: str,
+                             max_tokens: int) -> Optional[str]:
+        """Отправляет пакетный промпт, общие инструкции - системным блоком"""
+        return await self._request_text(prompt, max_tokens=max_tokens, system_prompt=instructions,
+                                        sport=self._sport_of(kind))
+    
+    def _single_cache_key(self, kind: str, betboom_data: Dict[str, Any],
+                          scores24_data: Dict[str, Any]) -> str:
+        """Ключ кэша, под которым хранился бы результат поштучного запроса"""
+        return self.gateway.cache_key(self._build_system_prompt(kind),
+                                      self._build_prompt(kind, betboom_data, scores24_data),
+                                      schema=self._response_schema(kind))
+    
+    def _is_mock_mode(self) -> bool:
+        """API ключ не настроен - вместо запросов используются заглушки"""
+        return not self.api_key or "YOUR_CLAUDE_API_KEY" in self.api_key
+    
+    @staticmethod
+    def _early_stop(sport: str):
+        """Условие досрочной остановки потокового ответа (None - ответ читается полностью)"""
+        threshold = early_stop_threshold(sport)
+        return confidence_cutoff(threshold) if threshold is not None else None
+    
+    async def _make_claude_request(self, prompt: str, sport: str = "general", system_prompt: str = "",
+                                   schema: Optional[ResponseSchema] = None) -> Dict[str, Any]:
         """Выполняет запрос к Claude API"""
         
         # В тестовом режиме возвращаем заглушку
         if self.api_key == "YOUR_CLAUDE_API_KEY":
             logger.info("ТЕСТОВЫЙ РЕЖИМ Claude - возвращаем заглушку")
-            return await self._get_mock_response(prompt)
+            return await self._get_mock_response(system_prompt + prompt)
         
         # Проверяем что API ключ настроен
-        if not self.api_key or "YOUR_CLAUDE_API_KEY" in self.api_key:
+        if self._is_mock_mode():
             logger.warning("Claude API ключ не настроен, используем заглушки")
-            return await self._get_mock_response(prompt)
+            return await self._get_mock_response(system_prompt + prompt)
         
         try:
-            payload = {
-                "model": self.model,
-                "max_tokens": 1000,
-                "temperature": 0.1,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            }
-            
-            # Асинхронный запрос
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: requests.post(self.base_url, headers=self.headers, json=payload, timeout=30)
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result['content'][0]['text']
-                
-                # Парсим JSON ответ от Claude
-                try:
-                    analysis_result = json.loads(content)
-                    logger.info("Успешный анализ через Claude API")
-                    return analysis_result
-                except json.JSONDecodeError:
-                    logger.error(f"Ошибка парсинга JSON ответа Claude: {content}")
-                    return self._get_error_response()
-            else:
-                logger.error(f"Ошибка Claude API: {response.status_code} - {response.text}")
-                return self._get_error_response()
-                
+            result = await self.gateway.complete_json(prompt, system_prompt, sport,
+                                                      early_stop=self._early_stop(sport), schema=schema)
         except Exception as e:
             logger.error(f"Исключение при запросе к Claude: {e}")
             return self._get_error_response()
+        if not isinstance(result, dict):
+            return self._get_error_response()
+        if result.get('stopped_early'):
+            result.setdefault('reasoning', 'Уверенность ниже порога, анализ остановлен досрочно')
+        
+        logger.info("Успешный анализ через Claude API")
+        return result
+    
+    async def _request_text(self, prompt: str, max_tokens: int = 1000, system_prompt: str = "",
+                            sport: str = "general") -> Optional[str]:
+        """Отправляет промпт и возвращает текст ответа (None при ошибке)"""
+        try:
+            response = await self.gateway.complete(prompt, system_prompt, sport, max_tokens=max_tokens)
+            return response.text
+        except Exception as e:
+            logger.error(f"Исключение при запросе к Claude: {e}")
+            return None
     
     async def _get_mock_response(self, prompt: str) -> Dict[str, Any]:
         """Генерирует заглушку ответа для тестирования"""
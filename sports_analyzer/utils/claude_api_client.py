@@ -1,14 +1,16 @@
 """
-Клиент для работы с Claude API через официальную библиотеку Anthropic
+Клиент для работы с Claude API через общий шлюз LLM
 """
 
 import asyncio
-import json
 import logging
-from typing import Dict, Any
-from anthropic import Anthropic
+from typing import Dict, Any, Optional
 
-from config.claude_config import CLAUDE_CONFIG, SYSTEM_PROMPTS
+from config.claude_config import CLAUDE_CONFIG, SYSTEM_PROMPTS, early_stop_threshold, get_gateway_settings
+from utils.claude_analyzer import ClaudeAnalyzer
+from utils.llm_gateway import get_llm_gateway, LLMGateway
+from utils.stream_json import confidence_cutoff
+from utils.structured_output import ResponseSchema
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +23,13 @@ class ClaudeAPIClient:
         self.model = CLAUDE_CONFIG.get("model")
         self.max_tokens = CLAUDE_CONFIG.get("max_tokens", 1000)
         self.temperature = CLAUDE_CONFIG.get("temperature", 0.1)
+        self.gateway: Optional[LLMGateway] = None
         
-        # Инициализация клиента Anthropic
         if self.api_key and "YOUR_CLAUDE_API_KEY" not in self.api_key:
-            self.client = Anthropic(api_key=self.api_key)
             self.is_real_api = True
+            self.gateway = get_llm_gateway(get_gateway_settings(api_key=self.api_key, model=self.model))
             logger.info("Claude API клиент инициализирован с реальным ключом")
         else:
-            self.client = None
             self.is_real_api = False
             logger.info("Claude API работает в тестовом режиме")
     
@@ -62,17 +63,9 @@ class ClaudeAPIClient:
 - Голы за 5 матчей: {scores24_data.get('recent_goals2')}
 
 🎯 ЗАДАЧА: Определи вероятность победы ведущей команды. Рекомендуй ставку только при уверенности >80%.
-
-Ответь СТРОГО в JSON:
-{{
-    "confidence": число_от_0_до_100,
-    "is_favorite_leading": true/false,
-    "reasoning": "обоснование_до_80_символов",
-    "recommendation": "bet"/"skip"
-}}
 """
         
-        return await self._make_api_request(system_prompt, user_prompt)
+        return await self._make_api_request(system_prompt, user_prompt, "football", "football")
     
     async def analyze_tennis_match(self, betboom_data: Dict[str, Any], 
                                  scores24_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -97,17 +90,9 @@ class ClaudeAPIClient:
 Очные встречи: {scores24_data.get('head_to_head')}
 
 🎯 ЗАДАЧА: Оцени шансы ведущего игрока на победу.
-
-Ответь в JSON:
-{{
-    "confidence": число_от_0_до_100,
-    "is_favorite_leading": true/false,
-    "reasoning": "обоснование_до_80_символов",
-    "recommendation": "bet"/"skip"
-}}
 """
         
-        return await self._make_api_request(system_prompt, user_prompt)
+        return await self._make_api_request(system_prompt, user_prompt, "tennis", "tennis")
     
     async def analyze_handball_total(self, betboom_data: Dict[str, Any], 
                                    scores24_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -136,69 +121,40 @@ class ClaudeAPIClient:
 Результативность: {scores24_data.get('avg_goals_per_match1')} vs {scores24_data.get('avg_goals_per_match2')}
 
 🎯 ЗАДАЧА: Определи темп и рекомендуй тотал.
-
-Ответь в JSON:
-{{
-    "confidence": число_от_0_до_100,
-    "pace": "БЫСТРЫЙ"/"МЕДЛЕННЫЙ",
-    "recommendation": "ТБ_{predicted_total - 4}"/"ТМ_{predicted_total + 4}",
-    "reasoning": "обоснование",
-    "bet_type": "total"
-}}
 """
         
-        return await self._make_api_request(system_prompt, user_prompt)
+        return await self._make_api_request(system_prompt, user_prompt, "handball", "handball_total")
     
-    async def _make_api_request(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
-        """Выполняет запрос к Claude API"""
-        
-        try:
-            # Используем официальную библиотеку Anthropic
-            loop = asyncio.get_event_loop()
-            
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.messages.create(
-                    model=self.model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    system=system_prompt,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ]
-                )
-            )
-            
-            # Извлекаем текст ответа
-            content = response.content[0].text
-            
-            # Парсим JSON
-            try:
-                # Ищем JSON в ответе
-                json_start = content.find('{')
-                json_end = content.rfind('}') + 1
-                
-                if json_start != -1 and json_end > json_start:
-                    json_content = content[json_start:json_end]
-                    result = json.loads(json_content)
-                    
-                    logger.info(f"✅ Claude анализ выполнен, уверенность: {result.get('confidence', 0)}%")
-                    return result
-                else:
-                    logger.error("JSON не найден в ответе Claude")
-                    return self._get_error_response()
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"Ошибка парсинга JSON: {e}")
-                logger.debug(f"Ответ Claude: {content}")
-                return self._get_error_response()
-                
-        except Exception as e:
-            logger.error(f"Ошибка запроса к Claude API: {e}")
+    async def _make_api_request(self, system_prompt: str, user_prompt: str,
+                                sport: str = "general", kind: Optional[str] = None) -> Dict[str, Any]:
+        """Выполняет запрос к Claude API: ответ по схеме вида анализа, досрочная остановка по уверенности"""
+        
+        schema = self._response_schema(kind)
+        if schema is None and kind in ClaudeAnalyzer.PROMPT_PARTS:
+            # Без структурированного ответа формат описывается в промпте
+            user_prompt += f"\nОтветь СТРОГО в JSON формате:\n{ClaudeAnalyzer.PROMPT_PARTS[kind]['format']}\n"
+        
+        threshold = early_stop_threshold(sport)
+        result = await self.gateway.complete_json(
+            user_prompt, system_prompt, sport,
+            max_tokens=self.max_tokens, temperature=self.temperature,
+            early_stop=confidence_cutoff(threshold) if threshold is not None else None,
+            schema=schema
+        )
+        if not isinstance(result, dict):
             return self._get_error_response()
+        if result.get('stopped_early'):
+            result.setdefault('reasoning', 'Уверенность ниже порога, анализ остановлен досрочно')
+        
+        logger.info(f"✅ Claude анализ выполнен, уверенность: {result.get('confidence', 0)}%")
+        return result
+    
+    @staticmethod
+    def _response_schema(kind: Optional[str]) -> Optional[ResponseSchema]:
+        """Схема ответа вида анализа (None - structured_output выключен или вид неизвестен)"""
+        if not kind or not CLAUDE_CONFIG.get("structured_output", True):
+            return None
+        return ClaudeAnalyzer.RESPONSE_SCHEMAS.get(kind)
     
     # Заглушки для тестового режима
     async def _mock_football_analysis(self, betboom_data: Dict[str, Any], 
@@ -4,29 +4,244 @@
 """
 
 import re
-from typing import List, Tuple, Optional, Dict, Any
+import json
+import math
+import logging
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from typing import List, Tuple, Optional, Dict, Any, Iterable, Set
 from difflib import SequenceMatcher
 import unicodedata
 
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy опционален: без него используется жадное назначение
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
+
+
+# Предкомпилированные выражения и стоп-слова для нормализации
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+_STOP_WORDS = frozenset(['fc', 'fk', 'sk', 'ac', 'sc', 'club', 'team',  # префиксы
+                         'united', 'city', 'town', 'rovers'])            # суффиксы
+
+
+class CandidateIndex:
+    """
+    Инвертированный индекс символьных n-грамм по списку матчей Scores24.
+    Строится один раз на список и позволяет отобрать top-k правдоподобных
+    кандидатов без полного прохода с SequenceMatcher.
+    """
+    
+    def __init__(self, matcher: 'FuzzyMatcher', matches: List[Dict[str, Any]],
+                 name_fields: Tuple[str, ...], ngram_size: int = 3):
+        self.source = matches
+        self.size = len(matches)
+        self.name_fields = name_fields
+        self.ngram_size = ngram_size
+        self.signature: Tuple[str, ...] = ()
+        self._matcher = matcher
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._norms: List[float] = []
+        
+        for idx, match in enumerate(matches):
+            keys: Set[str] = set()
+            for field in name_fields:
+                keys |= self.index_keys(match.get(field, ''))
+            for key in keys:
+                self._postings[key].append(idx)
+            self._norms.append(math.sqrt(len(keys)) or 1.0)
+    
+    def index_keys(self, text: str) -> Set[str]:
+        """Ключи индекса: n-граммы слов, инициалы и короткие аббревиатуры"""
+        norm = self._matcher.normalize_text(text)
+        if not norm:
+            return set()
+        
+        keys = self._text_keys(norm)
+        
+        # Точный алиас дополнительно индексируется каноническим именем (без замены самого названия)
+        canonical = self._matcher.alias_canonical(text)
+        if canonical:
+            keys |= self._text_keys(self._matcher.normalize_text(canonical))
+        
+        return keys
+    
+    def _text_keys(self, norm: str) -> Set[str]:
+        keys = set()
+        n = self.ngram_size
+        for word in norm.split():
+            padded = f" {word} "
+            if len(padded) <= n:
+                keys.add(padded)
+                continue
+            for i in range(len(padded) - n + 1):
+                keys.add(padded[i:i + n])
+        
+        # Ключи для проверки сокращений (см. _check_abbreviations)
+        keys.add('^' + ''.join(word[0] for word in norm.split()))
+        compact = norm.replace(' ', '')
+        if len(compact) <= 5:
+            keys.add('^' + compact)
+        
+        return keys
+    
+    def candidates(self, names: Iterable[str], top_k: int) -> List[int]:
+        """Возвращает индексы top-k кандидатов по доле общих ключей"""
+        scores: Dict[int, int] = defaultdict(int)
+        query_keys: Set[str] = set()
+        for name in names:
+            query_keys |= self.index_keys(name)
+        
+        for key in query_keys:
+            for idx in self._postings.get(key, ()):
+                scores[idx] += 1
+        
+        ranked = sorted(scores, key=lambda idx: (-scores[idx] / self._norms[idx], idx))
+        return ranked[:top_k]
+
+
+class ReferenceSimilarityBackend:
+    """
+    Эталонный backend: SequenceMatcher с бонусами за общие слова и сокращения
+    (семантика FuzzyMatcher.get_similarity). Используется для сравнения точности.
+    """
+    
+    name = "reference"
+    
+    def __init__(self, matcher: 'FuzzyMatcher'):
+        self._matcher = matcher
+    
+    def score_one_to_many(self, target: str, candidates: List[str]) -> np.ndarray:
+        """Оценки схожести одного названия со всеми кандидатами"""
+        return np.array([self._matcher.get_similarity(target, c) for c in candidates], dtype=float)
+    
+    def score_matrix(self, names_a: List[str], names_b: List[str]) -> np.ndarray:
+        """Матрица оценок схожести для всех пар названий"""
+        # Повторяющиеся названия сравниваются один раз
+        pos_a = {name: i for i, name in enumerate(dict.fromkeys(names_a))}
+        pos_b = {name: j for j, name in enumerate(dict.fromkeys(names_b))}
+        
+        unique_scores = np.zeros((len(pos_a), len(pos_b)))
+        for a, i in pos_a.items():
+            for b, j in pos_b.items():
+                unique_scores[i, j] = self._matcher.get_similarity(a, b)
+        
+        rows = [pos_a[name] for name in names_a]
+        cols = [pos_b[name] for name in names_b]
+        return unique_scores[np.ix_(rows, cols)]
+
+
+class NgramSimilarityBackend:
+    """
+    Векторизованный backend: названия кодируются битовыми векторами хэшированных
+    символьных n-грамм и слов, пересечения считаются одним матричным умножением.
+    Оценка = max(коэффициент по n-граммам, доля общих слов * 0.9).
+    """
+    
+    name = "ngram"
+    
+    def __init__(self, matcher: 'FuzzyMatcher', ngram_size: int = 2,
+                 n_bits: int = 512, metric: str = "dice", cache_size: int = 10000):
+        self._matcher = matcher
+        self.ngram_size = ngram_size
+        self.n_bits = n_bits
+        self.metric = metric  # dice | jaccard
+        self._vectorize = lru_cache(maxsize=cache_size)(self._vectorize_uncached)
+    
+    def _vectorize_uncached(self, norm: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Битовые векторы n-грамм и слов для нормализованного названия"""
+        grams = np.zeros(self.n_bits, dtype=np.float32)
+        words = np.zeros(self.n_bits, dtype=np.float32)
+        n = self.ngram_size
+        
+        for word in norm.split():
+            words[zlib.crc32(word.encode('utf-8')) % self.n_bits] = 1.0
+            padded = f" {word} "
+            for i in range(max(1, len(padded) - n + 1)):
+                grams[zlib.crc32(padded[i:i + n].encode('utf-8')) % self.n_bits] = 1.0
+        
+        return grams, words
+    
+    def _encode(self, names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Матрицы векторов (len(names) x n_bits) для списка названий"""
+        if not names:
+            empty = np.zeros((0, self.n_bits), dtype=np.float32)
+            return empty, empty
+        grams, words = zip(*(self._vectorize(self._matcher.normalize_text(name)) for name in names))
+        return np.vstack(grams), np.vstack(words)
+    
+    def score_matrix(self, names_a: List[str], names_b: List[str]) -> np.ndarray:
+        """Матрица оценок схожести для всех пар названий за один проход"""
+        grams_a, words_a = self._encode(names_a)
+        grams_b, words_b = self._encode(names_b)
+        
+        size_a = grams_a.sum(axis=1)[:, None]
+        size_b = grams_b.sum(axis=1)[None, :]
+        inter = grams_a @ grams_b.T
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.metric == "jaccard":
+                gram_score = inter / (size_a + size_b - inter)
+            else:
+                gram_score = 2 * inter / (size_a + size_b)
+            
+            # Бонус за общие слова, как в get_similarity
+            word_inter = words_a @ words_b.T
+            word_max = np.maximum(words_a.sum(axis=1)[:, None], words_b.sum(axis=1)[None, :])
+            word_score = np.where(word_inter > 0, word_inter / word_max * 0.9, 0.0)
+        
+        return np.nan_to_num(np.maximum(gram_score, word_score)).astype(float)
+    
+    def score_one_to_many(self, target: str, candidates: List[str]) -> np.ndarray:
+        """Оценки схожести одного названия со всеми кандидатами"""
+        return self.score_matrix([target], candidates)[0]
+
+
+SIMILARITY_BACKENDS = {
+    ReferenceSimilarityBackend.name: ReferenceSimilarityBackend,
+    NgramSimilarityBackend.name: NgramSimilarityBackend,
+}
+
 
 class FuzzyMatcher:
     """Класс для нечеткого сопоставления названий команд и игроков"""
     
-    def __init__(self, threshold: float = 0.7):
+    def __init__(self, threshold: float = 0.7, index_top_k: int = 20,
+                 use_index: bool = True, normalize_cache_size: int = 10000,
+                 aliases_file: Optional[str] = None,
+                 backend: str = "reference"):
         self.threshold = threshold
         
+        # Backend пакетной оценки схожести (reference - эталон на SequenceMatcher)
+        self.backend = SIMILARITY_BACKENDS[backend](self)
+        
+        # LRU-кэш нормализации живет вместе с экземпляром и переживает циклы анализа
+        self._normalize_cached = lru_cache(maxsize=normalize_cache_size)(self._normalize_uncached)
+        self._alias_key_cached = lru_cache(maxsize=normalize_cache_size)(self._clean_text)
+        
+        # Индекс кандидатов: точное сравнение выполняется только для top-k
+        self.index_top_k = index_top_k
+        self.use_index = use_index
+        self._indexes: Dict[Tuple[str, ...], CandidateIndex] = {}
+        
         # Словари для нормализации названий
         self.team_aliases = {
             # Футбол
             "манчестер сити": ["ман сити", "manchester city", "man city"],
             "манчестер юнайтед": ["ман юнайтед", "manchester united", "man utd"],
-            "барселона": ["барса", "barcelona", "fc barcelona"],
+            "барселона": ["барса", "barcelona", "fc barcelona",
+                          # Гандбол
+                          "барселона эспаньол", "fc barcelona handball"],
             "реал мадрид": ["реал", "real madrid", "real"],
-            "пари сен жермен": ["псж", "psg", "paris sg"],
-            
-            # Гандбол  
-            "барселона": ["барселона эспаньол", "fc barcelona handball"],
-            "пари сен жермен": ["psg handball", "paris saint-germain"],
+            "пари сен жермен": ["псж", "psg", "paris sg",
+                                # Гандбол
+                                "psg handball", "paris saint-germain"],
         }
         
         self.player_aliases = {
@@ -39,12 +254,97 @@ class FuzzyMatcher:
             "тимо болль": ["болль т.", "t.boll", "boll"],
             "ма лонг": ["лонг м.", "ma long", "long"],
         }
+        
+        if aliases_file:
+            self.load_aliases(aliases_file)
+        else:
+            self._alias_map = self._build_alias_map()
+    
+    def load_aliases(self, path: str):
+        """
+        Загружает дополнительные алиасы из JSON файла формата
+        {"teams": {"каноническое имя": ["алиас", ...]}, "players": {...}}
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        for target, source in ((self.team_aliases, data.get('teams', {})),
+                               (self.player_aliases, data.get('players', {}))):
+            for canonical, aliases in source.items():
+                target.setdefault(canonical, [])
+                target[canonical].extend(a for a in aliases if a not in target[canonical])
+        
+        self._alias_map = self._build_alias_map()
+    
+    def _build_alias_map(self) -> Dict[str, str]:
+        """
+        Компилирует таблицы алиасов в словарь полное название -> каноническое имя.
+        Ключи нормализуются без удаления стоп-слов ("manchester city" и "manchester united"
+        различаются); алиас, указывающий на разные канонические имена, отбрасывается.
+        """
+        # Нормализуем без LRU-кэша, чтобы большие таблицы не вытесняли рабочие названия
+        alias_map: Dict[str, str] = {}
+        tables = (self.team_aliases, self.player_aliases)
+        
+        for table in tables:
+            for canonical in table:
+                canonical_key = self._clean_text(canonical)
+                if canonical_key:
+                    alias_map[canonical_key] = canonical_key
+        
+        conflicts: Set[str] = set()
+        for table in tables:
+            for canonical, aliases in table.items():
+                canonical_key = self._clean_text(canonical)
+                for alias in aliases:
+                    alias_key = self._clean_text(alias)
+                    if not alias_key or alias_map.get(alias_key, canonical_key) == canonical_key:
+                        if alias_key:
+                            alias_map[alias_key] = canonical_key
+                        continue
+                    logger.warning(f"Алиас '{alias}' указывает на '{alias_map[alias_key]}' и '{canonical_key}', "
+                                   f"пропускается")
+                    conflicts.add(alias_key)
+        
+        # Канонические имена остаются, неоднозначные алиасы удаляются
+        for alias_key in conflicts:
+            if alias_map.get(alias_key) != alias_key:
+                alias_map.pop(alias_key, None)
+        
+        return alias_map
+    
+    def alias_canonical(self, text: str) -> Optional[str]:
+        """Каноническое имя, если название целиком совпадает с известным алиасом"""
+        if not text:
+            return None
+        return self._alias_map.get(self._alias_key_cached(text))
+    
+    def _alias_matches(self, scores: np.ndarray, names_a: List[str], names_b: List[str]) -> np.ndarray:
+        """Оценка 1.0 для пар, у которых точные алиасы ведут к одному каноническому имени"""
+        canonical_a = [self.alias_canonical(name) for name in names_a]
+        canonical_b = [self.alias_canonical(name) for name in names_b]
+        for i, a in enumerate(canonical_a):
+            if a is None:
+                continue
+            for j, b in enumerate(canonical_b):
+                if a == b:
+                    scores[i, j] = 1.0
+        return scores
     
     def normalize_text(self, text: str) -> str:
-        """Нормализует текст для сравнения"""
+        """Нормализует текст для сравнения (с кэшированием)"""
         if not text:
             return ""
-            
+        return self._normalize_cached(text)
+    
+    def _normalize_uncached(self, text: str) -> str:
+        """Нормализует текст для сравнения"""
+        # Удаление общих префиксов/суффиксов
+        return ' '.join(w for w in self._clean_text(text).split() if w not in _STOP_WORDS)
+    
+    @staticmethod
+    def _clean_text(text: str) -> str:
+        """Регистр, диакритика, пунктуация и пробелы (стоп-слова сохраняются - ключ алиасов)"""
         # Приведение к нижнему регистру
         text = text.lower().strip()
         
@@ -53,20 +353,33 @@ class FuzzyMatcher:
         text = ''.join(c for c in text if not unicodedata.combining(c))
         
         # Удаление лишних символов и нормализация пробелов
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        # Удаление общих префиксов/суффиксов
-        prefixes_to_remove = ['fc', 'fk', 'sk', 'ac', 'sc', 'club', 'team']
-        suffixes_to_remove = ['fc', 'united', 'city', 'town', 'rovers']
-        
-        words = text.split()
-        words = [w for w in words if w not in prefixes_to_remove + suffixes_to_remove]
-        
-        return ' '.join(words)
+        text = _PUNCTUATION_RE.sub(' ', text)
+        return _WHITESPACE_RE.sub(' ', text).strip()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша нормализации: попадания, промахи, размер"""
+        info = self._normalize_cached.cache_info()
+        total = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+            'hit_rate': info.hits / total if total else 0.0
+        }
+    
+    def clear_cache(self):
+        """Сбрасывает кэш нормализации и счетчики"""
+        self._normalize_cached.cache_clear()
+        self._alias_key_cached.cache_clear()
     
     def get_similarity(self, text1: str, text2: str) -> float:
         """Вычисляет степень схожести двух текстов"""
+        # Точные алиасы одного канонического имени
+        canonical1 = self.alias_canonical(text1)
+        if canonical1 is not None and canonical1 == self.alias_canonical(text2):
+            return 1.0
+        
         norm1 = self.normalize_text(text1)
         norm2 = self.normalize_text(text2)
         
@@ -114,21 +427,19 @@ class FuzzyMatcher:
         best_match = None
         best_score = 0.0
         
-        # Проверка прямых алиасов
-        target_norm = self.normalize_text(target)
-        for alias_key, aliases in {**self.team_aliases, **self.player_aliases}.items():
-            if target_norm == self.normalize_text(alias_key):
-                for candidate in candidates:
-                    candidate_norm = self.normalize_text(candidate)
-                    if any(self.normalize_text(alias) == candidate_norm for alias in aliases):
-                        return candidate, 1.0
+        # Проверка прямых алиасов: O(1) поиск канонического имени на кандидата
+        target_canonical = self.alias_canonical(target)
+        if target_canonical:
+            for candidate in candidates:
+                if self.alias_canonical(candidate) == target_canonical:
+                    return candidate, 1.0
         
         # Fuzzy matching
-        for candidate in candidates:
-            score = self.get_similarity(target, candidate)
-            if score > best_score:
-                best_score = score
-                best_match = candidate
+        scores = self.score_candidates(target, candidates)
+        best_idx = int(np.argmax(scores))
+        if scores[best_idx] > best_score:
+            best_score = float(scores[best_idx])
+            best_match = candidates[best_idx]
         
         # Возвращаем результат только если превышен порог
         if best_score >= self.threshold:
@@ -136,74 +447,219 @@ class FuzzyMatcher:
         
         return None
     
+    def build_index(self, scores24_matches: List[Dict[str, Any]],
+                    name_fields: Tuple[str, ...]) -> CandidateIndex:
+        """
+        Строит (или переиспользует) индекс кандидатов для списка матчей.
+        Индекс переиспользуется только для тех же названий: список, измененный
+        на месте, индексируется заново.
+        """
+        signature = tuple(match.get(field, '') for match in scores24_matches for field in name_fields)
+        index = self._indexes.get(name_fields)
+        if index is None or index.signature != signature:
+            index = CandidateIndex(self, scores24_matches, name_fields)
+            index.signature = signature
+            self._indexes[name_fields] = index
+        return index
+    
+    def _use_index(self, scores24_matches: List[Dict[str, Any]]) -> bool:
+        """Индекс нужен, только если матчей больше, чем отбирается кандидатов"""
+        return self.use_index and len(scores24_matches) > self.index_top_k
+    
+    def _select_candidates(self, name1: str, name2: str,
+                           scores24_matches: List[Dict[str, Any]],
+                           name_fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        """Отбирает кандидатов для точного сравнения"""
+        if not self._use_index(scores24_matches):
+            return scores24_matches
+        
+        index = self.build_index(scores24_matches, name_fields)
+        return [scores24_matches[idx] for idx in index.candidates((name1, name2), self.index_top_k)]
+    
+    def _pair_row_scores(self, name1: str, name2: str,
+                         candidate_matches: List[Dict[str, Any]],
+                         name_fields: Tuple[str, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Оценки пары участников против каждого кандидата с учетом обоих порядков:
+        (оценка, признак обратного порядка). 0 - ни один порядок не прошел порог.
+        """
+        # Все четыре комбинации участников одной матрицей 2 x 2k
+        k = len(candidate_matches)
+        full = self.similarity_matrix(
+            [name1, name2],
+            [m.get(name_fields[0], '') for m in candidate_matches] +
+            [m.get(name_fields[1], '') for m in candidate_matches]
+        )
+        s11, s22 = full[0, :k], full[1, k:]
+        s12, s21 = full[0, k:], full[1, :k]
+        
+        # Прямой порядок: team1-team1, team2-team2; обратный: team1-team2, team2-team1
+        direct = np.where(np.minimum(s11, s22) >= self.threshold, (s11 + s22) / 2, 0.0)
+        reverse = np.where(np.minimum(s12, s21) >= self.threshold, (s12 + s21) / 2, 0.0)
+        
+        return np.maximum(direct, reverse), reverse > direct
+    
+    def _match_pair(self, name1: str, name2: str,
+                    scores24_matches: List[Dict[str, Any]],
+                    name_fields: Tuple[str, str],
+                    mapped_fields: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        Сопоставление пары участников с учетом обоих порядков. Возвращается лучший
+        по оценке кандидат (при равенстве - первый в порядке отбора), а не первый
+        прошедший порог: кандидаты из индекса идут по убыванию доли общих n-грамм,
+        а не в порядке ленты.
+        """
+        candidate_matches = self._select_candidates(name1, name2, scores24_matches, name_fields)
+        if not candidate_matches:
+            return None
+        
+        scores, swapped = self._pair_row_scores(name1, name2, candidate_matches, name_fields)
+        best = int(np.argmax(scores))
+        if scores[best] <= 0:
+            return None
+        
+        match = candidate_matches[best]
+        mapped1, mapped2 = match.get(name_fields[0], ''), match.get(name_fields[1], '')
+        if swapped[best]:
+            mapped1, mapped2 = mapped2, mapped1
+        return {
+            'match': match,
+            'confidence': float(scores[best]),
+            mapped_fields[0]: mapped1,
+            mapped_fields[1]: mapped2
+        }
+    
     def match_teams(self, team1_betboom: str, team2_betboom: str, 
                    scores24_matches: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
         """Сопоставляет команды между BetBoom и Scores24"""
-        for match in scores24_matches:
-            team1_scores = match.get('team1', '')
-            team2_scores = match.get('team2', '')
-            
-            # Проверяем оба варианта порядка команд
-            score1_1 = self.get_similarity(team1_betboom, team1_scores)
-            score1_2 = self.get_similarity(team2_betboom, team2_scores)
-            
-            score2_1 = self.get_similarity(team1_betboom, team2_scores)
-            score2_2 = self.get_similarity(team2_betboom, team1_scores)
-            
-            # Прямой порядок
-            if score1_1 >= self.threshold and score1_2 >= self.threshold:
-                avg_score = (score1_1 + score1_2) / 2
-                return {
-                    'match': match,
-                    'confidence': avg_score,
-                    'team1_mapped': team1_scores,
-                    'team2_mapped': team2_scores
-                }
-            
-            # Обратный порядок
-            if score2_1 >= self.threshold and score2_2 >= self.threshold:
-                avg_score = (score2_1 + score2_2) / 2
-                return {
-                    'match': match,
-                    'confidence': avg_score,
-                    'team1_mapped': team2_scores,
-                    'team2_mapped': team1_scores
-                }
-        
-        return None
+        return self._match_pair(
+            team1_betboom, team2_betboom, scores24_matches,
+            ('team1', 'team2'), ('team1_mapped', 'team2_mapped')
+        )
     
     def match_players(self, player1_betboom: str, player2_betboom: str,
                      scores24_matches: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
         """Сопоставляет игроков между BetBoom и Scores24"""
-        for match in scores24_matches:
-            player1_scores = match.get('player1', '')
-            player2_scores = match.get('player2', '')
-            
-            # Проверяем оба варианта порядка игроков
-            score1_1 = self.get_similarity(player1_betboom, player1_scores)
-            score1_2 = self.get_similarity(player2_betboom, player2_scores)
-            
-            score2_1 = self.get_similarity(player1_betboom, player2_scores)
-            score2_2 = self.get_similarity(player2_betboom, player1_scores)
-            
-            # Прямой порядок
-            if score1_1 >= self.threshold and score1_2 >= self.threshold:
-                avg_score = (score1_1 + score1_2) / 2
-                return {
-                    'match': match,
-                    'confidence': avg_score,
-                    'player1_mapped': player1_scores,
-                    'player2_mapped': player2_scores
-                }
-            
-            # Обратный порядок
-            if score2_1 >= self.threshold and score2_2 >= self.threshold:
-                avg_score = (score2_1 + score2_2) / 2
-                return {
-                    'match': match,
-                    'confidence': avg_score,
-                    'player1_mapped': player2_scores,
-                    'player2_mapped': player1_scores
-                }
-        
-        return None
\ No newline at end of file
+        return self._match_pair(
+            player1_betboom, player2_betboom, scores24_matches,
+            ('player1', 'player2'), ('player1_mapped', 'player2_mapped')
+        )
+    
+    def pair_matches(self, betboom_matches: List[Dict[str, Any]],
+                     scores24_matches: List[Dict[str, Any]],
+                     method: str = "hungarian") -> List[Optional[Dict[str, Any]]]:
+        """
+        Пакетное взаимно-однозначное сопоставление матчей BetBoom и Scores24.
+        Матрица схожести строится один раз для всего вида спорта (для большого табло -
+        только по top-k кандидатам индекса каждой строки), затем решается
+        задача назначения (венгерский алгоритм или жадный выбор по убыванию score).
+        Возвращает список той же длины, что betboom_matches: результат в формате
+        match_teams/match_players или None.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(betboom_matches)
+        if not betboom_matches or not scores24_matches:
+            return results
+        
+        if 'team1' in betboom_matches[0]:
+            name_fields, mapped_fields = ('team1', 'team2'), ('team1_mapped', 'team2_mapped')
+        else:
+            name_fields, mapped_fields = ('player1', 'player2'), ('player1_mapped', 'player2_mapped')
+        
+        if self._use_index(scores24_matches):
+            scores, swapped = self._indexed_pair_score_matrix(betboom_matches, scores24_matches, name_fields)
+        else:
+            scores, swapped = self._pair_score_matrix(betboom_matches, scores24_matches, name_fields)
+        
+        for i, j in self._solve_assignment(scores, method):
+            match = scores24_matches[j]
+            other1 = match.get(name_fields[0], '')
+            other2 = match.get(name_fields[1], '')
+            if swapped[i, j]:
+                other1, other2 = other2, other1
+            results[i] = {
+                'match': match,
+                'confidence': float(scores[i, j]),
+                mapped_fields[0]: other1,
+                mapped_fields[1]: other2
+            }
+        
+        return results
+    
+    def similarity_matrix(self, names_a: List[str], names_b: List[str]) -> np.ndarray:
+        """Матрица схожести для всех пар названий (через выбранный backend)"""
+        return self._alias_matches(self.backend.score_matrix(names_a, names_b), names_a, names_b)
+    
+    def score_candidates(self, target: str, candidates: List[str]) -> np.ndarray:
+        """Оценки схожести одного названия со всеми кандидатами (через выбранный backend)"""
+        return self._alias_matches(self.backend.score_one_to_many(target, candidates)[None, :],
+                                   [target], candidates)[0]
+    
+    def _pair_score_matrix(self, betboom_matches: List[Dict[str, Any]],
+                           scores24_matches: List[Dict[str, Any]],
+                           name_fields: Tuple[str, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Итоговые оценки пар матчей с учетом обоих порядков участников"""
+        n = len(betboom_matches)
+        bb_names = [m.get(field, '') for field in name_fields for m in betboom_matches]
+        s24_names = [m.get(field, '') for field in name_fields for m in scores24_matches]
+        
+        # Одна матрица (2N x 2M) на все комбинации участников
+        full = self.similarity_matrix(bb_names, s24_names)
+        m = len(scores24_matches)
+        s11, s12 = full[:n, :m], full[:n, m:]
+        s21, s22 = full[n:, :m], full[n:, m:]
+        
+        # Прямой порядок: team1-team1, team2-team2; обратный: team1-team2, team2-team1
+        direct = np.where(np.minimum(s11, s22) >= self.threshold, (s11 + s22) / 2, 0.0)
+        reverse = np.where(np.minimum(s12, s21) >= self.threshold, (s12 + s21) / 2, 0.0)
+        
+        return np.maximum(direct, reverse), reverse > direct
+    
+    def _indexed_pair_score_matrix(self, betboom_matches: List[Dict[str, Any]],
+                                   scores24_matches: List[Dict[str, Any]],
+                                   name_fields: Tuple[str, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Оценки пар только для top-k кандидатов индекса каждой строки; остальные
+        ячейки - 0 (пара невозможна). Для большого табло вместо полной матрицы 2N x 2M
+        выполняется N x 4k сравнений.
+        """
+        index = self.build_index(scores24_matches, name_fields)
+        scores = np.zeros((len(betboom_matches), len(scores24_matches)))
+        swapped = np.zeros(scores.shape, dtype=bool)
+        
+        for i, match in enumerate(betboom_matches):
+            name1, name2 = match.get(name_fields[0], ''), match.get(name_fields[1], '')
+            cols = index.candidates((name1, name2), self.index_top_k)
+            if not cols:
+                continue
+            row_scores, row_swapped = self._pair_row_scores(
+                name1, name2, [scores24_matches[j] for j in cols], name_fields
+            )
+            scores[i, cols] = row_scores
+            swapped[i, cols] = row_swapped
+        
+        return scores, swapped
+    
+    def _solve_assignment(self, scores: np.ndarray, method: str) -> List[Tuple[int, int]]:
+        """Решает задачу назначения, возвращает пары (индекс BetBoom, индекс Scores24)"""
+        if method == "hungarian" and linear_sum_assignment is None:
+            logger.warning("scipy не установлен, используется жадное назначение")
+            method = "greedy"
+        
+        if method == "hungarian":
+            rows, cols = linear_sum_assignment(scores, maximize=True)
+            return [(i, j) for i, j in zip(rows, cols) if scores[i, j] > 0]
+        
+        # Жадный выбор: пары по убыванию score, каждый матч занимается один раз
+        flat_order = np.argsort(-scores, axis=None, kind='stable')
+        rows, cols = np.unravel_index(flat_order, scores.shape)
+        used_rows, used_cols = set(), set()
+        pairs = []
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            if scores[i, j] <= 0:
+                break
+            if i in used_rows or j in used_cols:
+                continue
+            used_rows.add(i)
+            used_cols.add(j)
+            pairs.append((i, j))
+        return pairs
@@ -0,0 +1,62 @@
+"""
+Общий асинхронный HTTP клиент для запросов к LLM API
+Один пул keep-alive соединений (HTTP/2 при наличии h2) на весь процесс
+"""
+
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Any, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_shared_client: Optional[httpx.AsyncClient] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _build_client(settings: Dict[str, Any]) -> httpx.AsyncClient:
+    """Создает клиент с пулом соединений по настройкам"""
+    http2 = settings.get("http2", True) and importlib.util.find_spec("h2") is not None
+    
+    limits = httpx.Limits(
+        max_connections=settings.get("http_pool_size", 20),
+        max_keepalive_connections=settings.get("http_keepalive_connections", 10),
+        keepalive_expiry=settings.get("http_keepalive_expiry", 60)
+    )
+    timeout = httpx.Timeout(
+        settings.get("timeout", 30),
+        connect=settings.get("connect_timeout", 5)
+    )
+    
+    logger.info(
+        f"Общий HTTP клиент: пул {limits.max_connections}, "
+        f"keep-alive {limits.max_keepalive_connections}, HTTP/2: {http2}"
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def get_http_client(settings: Optional[Dict[str, Any]] = None) -> httpx.AsyncClient:
+    """
+    Возвращает общий для процесса клиент. Соединения привязаны к event loop,
+    поэтому при запуске нового цикла (asyncio.run) клиент создается заново.
+    """
+    global _shared_client, _shared_loop
+    
+    loop = asyncio.get_running_loop()
+    if _shared_client is None or _shared_client.is_closed or _shared_loop is not loop:
+        _shared_client = _build_client(settings or {})
+        _shared_loop = loop
+    
+    return _shared_client
+
+
+async def close_http_client():
+    """Закрывает общий клиент (в конце работы процесса или цикла)"""
+    global _shared_client, _shared_loop
+    
+    if _shared_client is not None and not _shared_client.is_closed:
+        await _shared_client.aclose()
+    _shared_client = None
+    _shared_loop = None
@@ -0,0 +1,707 @@
+"""
+Единый асинхронный шлюз к LLM провайдерам
+Общий пул соединений, повторы, кэш ответов, метрики и переключение на резервного провайдера.
+Модуль не зависит от конфигурации конкретного приложения - настройки передаются словарем.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+
+from utils.http_client import get_http_client
+from utils.llm_metrics import get_llm_metrics
+from utils.prompt_cache import cacheable_system, get_prompt_cache_stats
+from utils.rate_limiter import RateLimitScheduler, parse_retry_after
+from utils.response_cache import get_response_cache, ResponseCache
+from utils.stream_json import JSONFieldScanner, parse_partial_json
+from utils.structured_output import ResponseSchema
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_URL = "https://api.anthropic.com/v1/messages"
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+
+# Коды ответа, после которых имеет смысл повторить запрос
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Крайний срок текущего цикла анализа (time.monotonic), None - без ограничения
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+# Сборщик usage запросов внутри collect_usage(): список (модель, usage)
+_usage_sink: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("llm_usage_sink", default=None)
+
+
+class LLMError(Exception):
+    """Ошибка запроса к провайдеру LLM"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.headers = headers or {}
+    
+    @property
+    def retryable(self) -> bool:
+        """Сетевые ошибки, перегрузка и лимиты провайдера"""
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS_CODES
+
+
+class LLMDeadlineError(LLMError):
+    """Запрос не укладывается в бюджет времени цикла"""
+    
+    @property
+    def retryable(self) -> bool:
+        return False
+
+
+@contextmanager
+def llm_deadline(seconds: Optional[float]):
+    """
+    Бюджет времени для всех запросов к LLM внутри блока (в том числе в задачах,
+    созданных в нем). Повторы, не успевающие до крайнего срока, не выполняются.
+    """
+    if not seconds:
+        yield
+        return
+    
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def collect_usage():
+    """
+    Собирает (модель, usage) всех успешных запросов к LLM внутри блока -
+    для учета токенов и стоимости по этапам анализа
+    """
+    records: List[Tuple[str, Dict[str, int]]] = []
+    token = _usage_sink.set(records)
+    try:
+        yield records
+    finally:
+        _usage_sink.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Секунды до крайнего срока текущего цикла (None, если срок не задан)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@dataclass
+class LLMResponse:
+    """Ответ провайдера"""
+    text: str
+    provider: str
+    model: str
+    usage: Dict[str, int] = field(default_factory=dict)
+    latency: float = 0.0
+    stopped_early: bool = False  # генерация прервана по условию early_stop
+
+
+class AnthropicProvider:
+    """Anthropic Messages API"""
+    
+    name = "anthropic"
+    
+    def __init__(self, api_key: str, model: str, base_url: str = ANTHROPIC_URL,
+                 http_settings: Optional[Dict[str, Any]] = None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.http_settings = http_settings or {}
+        self.headers = {
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01"
+        }
+    
+    def build_payload(self, system: str, prompt: str, max_tokens: int,
+                      temperature: float, tool: Optional[ResponseSchema] = None) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        # Схема ответа - единственный инструмент с обязательным вызовом
+        if tool:
+            payload["tools"] = [tool.anthropic_tool()]
+            payload["tool_choice"] = tool.anthropic_tool_choice()
+        # Системный промпт - отдельным блоком, кэшируемым вместе с инструментами,
+        # если префикс достигает минимальной длины кэша
+        if system:
+            tools_tokens = len(json.dumps(payload.get("tools", []), ensure_ascii=False)) // 3
+            payload["system"] = cacheable_system(system, self.model, tools_tokens)
+        return payload
+    
+    @staticmethod
+    def parse_response(result: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """Текст ответа; при вызове инструмента - его аргументы в JSON"""
+        blocks = result.get("content", [])
+        for block in blocks:
+            if block.get("type") == "tool_use":
+                return json.dumps(block.get("input") or {}, ensure_ascii=False), result.get("usage") or {}
+        text = "".join(block.get("text", "") for block in blocks if block.get("type", "text") == "text")
+        return text, result.get("usage") or {}
+    
+    async def send(self, system: str, prompt: str, max_tokens: int, temperature: float,
+                   tool: Optional[ResponseSchema] = None) -> Tuple[str, Dict[str, int], Dict[str, str]]:
+        payload = self.build_payload(system, prompt, max_tokens, temperature, tool)
+        response = await _post(self.base_url, self.headers, payload, self.http_settings)
+        text, usage = _decode_response(response, self.parse_response)
+        return text, usage, dict(response.headers)
+    
+    async def stream(self, system: str, prompt: str, max_tokens: int, temperature: float,
+                     should_stop: Callable[[str], bool],
+                     tool: Optional[ResponseSchema] = None) -> Tuple[str, Dict[str, int], Dict[str, str], bool]:
+        """
+        Потоковый ответ (SSE). should_stop получает очередной фрагмент текста
+        (или JSON аргументов инструмента); True закрывает соединение, и API прекращает генерацию.
+        """
+        payload = self.build_payload(system, prompt, max_tokens, temperature, tool)
+        payload["stream"] = True
+        parts, usage, stopped = [], {}, False
+        
+        async with _open_stream(self.base_url, self.headers, payload, self.http_settings) as (events, headers):
+            async for event in events:
+                kind = event.get("type")
+                if kind == "message_start":
+                    usage.update(event.get("message", {}).get("usage") or {})
+                elif kind == "message_delta":
+                    usage.update(event.get("usage") or {})
+                elif kind == "error":
+                    error = event.get("error") or {}
+                    status = 529 if error.get("type") == "overloaded_error" else None
+                    raise LLMError(f"Ошибка потока: {error.get('message', error)}", status_code=status)
+                elif kind == "content_block_delta" and event.get("delta", {}).get("type") in ("text_delta", "input_json_delta"):
+                    delta = event["delta"]
+                    chunk = delta.get("text", "") if delta["type"] == "text_delta" else delta.get("partial_json", "")
+                    parts.append(chunk)
+                    if should_stop(chunk):
+                        stopped = True
+                        break
+        
+        text = "".join(parts)
+        if stopped:
+            # Итоговый usage не приходит - выход оцениваем по длине текста
+            usage["output_tokens"] = max(usage.get("output_tokens", 0) or 0, len(text) // 3)
+        return text, usage, headers, stopped
+
+
+class OpenAIProvider:
+    """OpenAI Chat Completions API"""
+    
+    name = "openai"
+    
+    def __init__(self, api_key: str, model: str, base_url: str = OPENAI_URL,
+                 http_settings: Optional[Dict[str, Any]] = None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.http_settings = http_settings or {}
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+    
+    def build_payload(self, system: str, prompt: str, max_tokens: int,
+                      temperature: float, tool: Optional[ResponseSchema] = None) -> Dict[str, Any]:
+        # Системное сообщение идет первым: OpenAI кэширует общий префикс автоматически
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        payload = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": messages
+        }
+        if tool:
+            payload["tools"] = [tool.openai_tool()]
+            payload["tool_choice"] = tool.openai_tool_choice()
+        return payload
+    
+    @staticmethod
+    def parse_response(result: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """Текст ответа; при вызове функции - ее аргументы (JSON строка)"""
+        message = result["choices"][0]["message"]
+        tool_calls = message.get("tool_calls") or []
+        if tool_calls:
+            text = tool_calls[0].get("function", {}).get("arguments") or ""
+        else:
+            text = message.get("content") or ""
+        usage = result.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        return text, {
+            "input_tokens": usage.get("prompt_tokens", 0) - cached,
+            "output_tokens": usage.get("completion_tokens", 0),
+            "cache_read_input_tokens": cached,
+            "cache_creation_input_tokens": 0
+        }
+    
+    async def send(self, system: str, prompt: str, max_tokens: int, temperature: float,
+                   tool: Optional[ResponseSchema] = None) -> Tuple[str, Dict[str, int], Dict[str, str]]:
+        payload = self.build_payload(system, prompt, max_tokens, temperature, tool)
+        response = await _post(self.base_url, self.headers, payload, self.http_settings)
+        text, usage = _decode_response(response, self.parse_response)
+        return text, usage, dict(response.headers)
+    
+    async def stream(self, system: str, prompt: str, max_tokens: int, temperature: float,
+                     should_stop: Callable[[str], bool],
+                     tool: Optional[ResponseSchema] = None) -> Tuple[str, Dict[str, int], Dict[str, str], bool]:
+        """Потоковый ответ (SSE), прерывается по should_stop как у AnthropicProvider"""
+        payload = self.build_payload(system, prompt, max_tokens, temperature, tool)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        parts, usage, stopped = [], {}, False
+        
+        async with _open_stream(self.base_url, self.headers, payload, self.http_settings) as (events, headers):
+            async for event in events:
+                if event.get("usage"):
+                    usage = self.parse_response({"choices": [{"message": {}}], "usage": event["usage"]})[1]
+                for choice in event.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    chunk = delta.get("content") or "".join(
+                        (call.get("function") or {}).get("arguments") or "" for call in delta.get("tool_calls") or []
+                    )
+                    parts.append(chunk)
+                    if chunk and should_stop(chunk):
+                        stopped = True
+                        break
+                if stopped:
+                    break
+        
+        text = "".join(parts)
+        if stopped:
+            usage["output_tokens"] = max(usage.get("output_tokens", 0) or 0, len(text) // 3)
+        return text, usage, headers, stopped
+
+
+PROVIDERS = {
+    "anthropic": AnthropicProvider,
+    "openai": OpenAIProvider
+}
+
+
+async def _post(url: str, headers: Dict[str, str], payload: Dict[str, Any],
+                http_settings: Dict[str, Any]):
+    """POST через общий пул соединений, ошибки приводятся к LLMError"""
+    client = get_http_client(http_settings)
+    try:
+        response = await client.post(url, headers=headers, json=payload)
+    except Exception as e:
+        raise LLMError(f"{type(e).__name__}: {e}") from e
+    
+    if response.status_code != 200:
+        raise LLMError(
+            f"HTTP {response.status_code}: {response.text[:200]}",
+            status_code=response.status_code,
+            retry_after=parse_retry_after(response.headers.get("retry-after")),
+            headers=dict(response.headers)
+        )
+    return response
+
+
+def _decode_response(response, parse: Callable[[Dict[str, Any]], Tuple[str, Dict[str, int]]]) -> Tuple[str, Dict[str, int]]:
+    """Разбор тела успешного ответа; не JSON или неожиданная структура - LLMError"""
+    try:
+        return parse(response.json())
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        raise LLMError(f"Некорректный ответ API: {type(e).__name__}: {e}") from e
+
+
+@asynccontextmanager
+async def _open_stream(url: str, headers: Dict[str, str], payload: Dict[str, Any],
+                       http_settings: Dict[str, Any]):
+    """
+    Потоковый POST через общий пул: события SSE (разобранные data) и заголовки ответа.
+    Выход из блока закрывает соединение - генерация на стороне API прекращается.
+    """
+    client = get_http_client(http_settings)
+    try:
+        async with client.stream("POST", url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                raise LLMError(
+                    f"HTTP {response.status_code}: {body[:200]}",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("retry-after")),
+                    headers=dict(response.headers)
+                )
+            events = _sse_events(response)
+            try:
+                yield events, dict(response.headers)
+            finally:
+                await events.aclose()
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"{type(e).__name__}: {e}") from e
+
+
+async def _sse_events(response) -> AsyncIterator[Dict[str, Any]]:
+    """JSON из строк data: потока server-sent events"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            logger.debug(f"Пропущено событие потока: {data[:100]}")
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """Извлекает JSON объект или массив из текста ответа"""
+    candidates = []
+    for opening, closing in (('{', '}'), ('[', ']')):
+        start, end = text.find(opening), text.rfind(closing) + 1
+        if start != -1 and end > start:
+            candidates.append((start, text[start:end]))
+    
+    # Сначала пробуем то, что начинается раньше (массив объектов или объект)
+    for _, candidate in sorted(candidates):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class LLMGateway:
+    """Шлюз: провайдеры по приоритету, повторы, кэш, лимиты и метрики"""
+    
+    def __init__(self, providers: List[Any], settings: Optional[Dict[str, Any]] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimitScheduler] = None):
+        if not providers:
+            raise ValueError("Не задан ни один провайдер LLM")
+        
+        settings = settings or {}
+        self.providers = providers
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self.max_tokens = settings.get("max_tokens", 1000)
+        self.temperature = settings.get("temperature", 0.1)
+        self.max_retries = settings.get("max_retries", 3)
+        self.retry_delay = settings.get("retry_delay", 1)
+        self.max_retry_delay = settings.get("max_retry_delay", 30)
+        self.retry_jitter = settings.get("retry_jitter", True)
+        self.hedge_requests = settings.get("hedge_requests", False)
+        self.hedge_quantile = settings.get("hedge_quantile", 0.95)
+        self.hedge_min_samples = settings.get("hedge_min_samples", 20)
+        
+        self.prompt_cache_stats = get_prompt_cache_stats()
+        self.llm_metrics = get_llm_metrics(settings.get("model_prices"))
+        self.metrics: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {'requests': 0, 'errors': 0, 'retries': 0, 'failovers': 0, 'hedges': 0,
+                     'early_stops': 0, 'deadline_exceeded': 0, 'latency_total': 0.0}
+        )
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=200))
+    
+    @property
+    def model(self) -> str:
+        """Модель основного провайдера"""
+        return self.providers[0].model
+    
+    def cache_key(self, system: str, prompt: str, max_tokens: Optional[int] = None,
+                  temperature: Optional[float] = None, schema: Optional[ResponseSchema] = None) -> str:
+        """
+        Ключ кэша ответов для запроса. Кроме промптов учитывает цепочку моделей
+        (ответ мог дать резервный провайдер), max_tokens, temperature и схему
+        ответа: текстовый ответ и ответ через tool use под одним ключом не совпадут.
+        """
+        return ResponseCache.make_key(
+            "+".join(f"{p.name}:{p.model}" for p in self.providers), system, prompt,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature,
+            schema=[schema.name, schema.schema] if schema else None
+        )
+    
+    async def complete(self, prompt: str, system: str = "", sport: str = "general",
+                       max_tokens: Optional[int] = None,
+                       temperature: Optional[float] = None,
+                       early_stop: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                       tool: Optional[ResponseSchema] = None) -> LLMResponse:
+        """
+        Текстовый ответ модели. Провайдеры перебираются по приоритету, у каждого
+        до max_retries повторов на временных ошибках. LLMError, если все недоступны,
+        LLMDeadlineError, если исчерпан бюджет времени цикла (см. llm_deadline).
+        
+        early_stop включает потоковый режим: условие проверяется по уже полученным
+        полям JSON ответа, и при True генерация прерывается (stopped_early в ответе).
+        tool - схема ответа, передаваемая как инструмент с обязательным вызовом:
+        текст ответа - JSON аргументов вызова.
+        """
+        max_tokens = max_tokens or self.max_tokens
+        temperature = self.temperature if temperature is None else temperature
+        last_error: Optional[LLMError] = None
+        
+        for index, provider in enumerate(self.providers):
+            if index > 0:
+                self.metrics[provider.name]['failovers'] += 1
+                logger.warning(f"Переключение на резервного провайдера LLM: {provider.name} ({last_error})")
+            
+            try:
+                return await self._complete_with_retries(provider, system, prompt, sport, max_tokens,
+                                                         temperature, early_stop, tool)
+            except LLMDeadlineError:
+                # Резервный провайдер тоже не успеет до конца цикла
+                raise
+            except LLMError as e:
+                last_error = e
+        
+        raise last_error
+    
+    async def complete_json(self, prompt: str, system: str = "", sport: str = "general",
+                            max_tokens: Optional[int] = None,
+                            temperature: Optional[float] = None,
+                            use_cache: bool = True,
+                            early_stop: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                            schema: Optional[ResponseSchema] = None) -> Optional[Any]:
+        """
+        Разобранный JSON ответ (None при ошибке запроса или разбора), с кэшем ответов.
+        При досрочной остановке (early_stop) - полученные поля и stopped_early: True
+        (такой ответ не кэшируется).
+        schema - структурированный ответ через tool use с проверкой по схеме
+        (не прошедший проверку ответ считается ошибкой разбора).
+        """
+        cache_key = self.cache_key(system, prompt, max_tokens, temperature, schema)
+        if use_cache and self.response_cache:
+            cached = self.response_cache.get(cache_key, sport)
+            self.llm_metrics.record_cache(sport, cached is not None)
+            if cached is not None:
+                logger.info(f"Ответ LLM взят из кэша ({sport})")
+                return cached
+        
+        try:
+            response = await self.complete(prompt, system, sport, max_tokens, temperature, early_stop, schema)
+        except LLMError as e:
+            logger.error(f"Ошибка запроса к LLM ({sport}): {e}")
+            return None
+        
+        if response.stopped_early:
+            result = dict(parse_partial_json(response.text), stopped_early=True)
+            logger.info(f"Генерация остановлена досрочно ({sport}): уверенность {result.get('confidence')}")
+        else:
+            result = extract_json(response.text)
+            errors = schema.validate(result) if schema and result is not None else []
+            if errors:
+                logger.error(f"Ответ LLM не соответствует схеме {schema.name} ({response.provider}): {'; '.join(errors[:5])}")
+                result = None
+        self.llm_metrics.record_parse(sport, response.model, result is not None)
+        if result is None:
+            logger.error(f"JSON не найден в ответе LLM ({response.provider})")
+            logger.debug(f"Содержимое ответа: {response.text}")
+            return None
+        
+        # Досрочно остановленный ответ неполон (нет обоснования и деталей) - в кэш не идет
+        if use_cache and self.response_cache and not response.stopped_early:
+            self.response_cache.set(cache_key, result)
+        return result
+    
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Пауза перед повтором: экспоненциальный рост с полным джиттером
+        (равномерно от 0 до retry_delay * 2^attempt, не больше max_retry_delay),
+        но не меньше retry-after провайдера
+        """
+        ceiling = min(self.max_retry_delay, self.retry_delay * 2 ** attempt)
+        delay = random.uniform(0, ceiling) if self.retry_jitter else ceiling
+        return max(retry_after or 0.0, delay)
+    
+    def hedge_delay(self, provider_name: str) -> Optional[float]:
+        """Задержка дублирующего запроса - квантиль hedge_quantile латентности провайдера"""
+        samples = self._latencies[provider_name]
+        if not self.hedge_requests or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))]
+    
+    async def _complete_with_retries(self, provider, system: str, prompt: str, sport: str,
+                                     max_tokens: int, temperature: float,
+                                     early_stop: Optional[Callable] = None,
+                                     tool: Optional[ResponseSchema] = None) -> LLMResponse:
+        """Запрос к одному провайдеру с повторами на временных ошибках в пределах бюджета цикла"""
+        metrics = self.metrics[provider.name]
+        
+        for attempt in range(self.max_retries + 1):
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                metrics['deadline_exceeded'] += 1
+                raise LLMDeadlineError(f"{provider.name}: бюджет времени цикла исчерпан")
+            
+            try:
+                request = self._send_hedged(provider, system, prompt, sport, max_tokens, temperature, early_stop, tool)
+                if remaining is None:
+                    return await request
+                try:
+                    return await asyncio.wait_for(request, remaining)
+                except asyncio.TimeoutError:
+                    metrics['deadline_exceeded'] += 1
+                    raise LLMDeadlineError(f"{provider.name}: ответ не получен до конца цикла")
+            
+            except LLMError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    logger.error(f"Ошибка {provider.name}: {e}")
+                    raise
+                
+                delay = self.backoff_delay(attempt, e.retry_after)
+                remaining = remaining_time()
+                if remaining is not None and delay >= remaining:
+                    metrics['deadline_exceeded'] += 1
+                    logger.error(f"Ошибка {provider.name} ({e}), повтор не успевает до конца цикла")
+                    raise LLMDeadlineError(f"{provider.name}: повтор не успевает до конца цикла ({e})",
+                                           e.status_code, e.retry_after, e.headers) from e
+                
+                metrics['retries'] += 1
+                self.llm_metrics.record_retry(sport, provider.model)
+                logger.warning(f"Ошибка {provider.name} ({e}), повтор {attempt + 1}/{self.max_retries} через {delay:.1f} сек")
+                await asyncio.sleep(delay)
+    
+    async def _send_hedged(self, provider, system: str, prompt: str, sport: str,
+                           max_tokens: int, temperature: float,
+                           early_stop: Optional[Callable] = None,
+                           tool: Optional[ResponseSchema] = None) -> LLMResponse:
+        """
+        Запрос с хеджированием: если ответа нет дольше p95 латентности провайдера,
+        отправляется дубликат и берется первый успешный ответ
+        """
+        hedge_after = self.hedge_delay(provider.name)
+        if hedge_after is None:
+            return await self._send_once(provider, system, prompt, sport, max_tokens, temperature, early_stop, tool)
+        
+        primary = asyncio.ensure_future(self._send_once(provider, system, prompt, sport, max_tokens, temperature, early_stop, tool))
+        tasks = [primary]
+        # Отмена вызывающего (дедлайн цикла, wait_for) в любой момент не оставляет висящих запросов
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if done:
+                return primary.result()
+            
+            self.metrics[provider.name]['hedges'] += 1
+            logger.debug(f"Хеджирующий запрос к {provider.name} после {hedge_after:.2f} сек ожидания")
+            tasks.append(asyncio.ensure_future(self._send_once(provider, system, prompt, sport, max_tokens, temperature, early_stop, tool)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _send_once(self, provider, system: str, prompt: str, sport: str,
+                         max_tokens: int, temperature: float,
+                         early_stop: Optional[Callable] = None,
+                         tool: Optional[ResponseSchema] = None) -> LLMResponse:
+        """Одна попытка запроса: лимитер, заголовки лимитов, учет токенов и латентности"""
+        estimated_tokens = (len(system) + len(prompt)) // 3 + max_tokens
+        metrics = self.metrics[provider.name]
+        if self.rate_limiter:
+            await self.rate_limiter.acquire(estimated_tokens)
+        
+        actual_tokens = None
+        started = time.perf_counter()
+        metrics['requests'] += 1
+        try:
+            stopped = False
+            if early_stop:
+                scanner = JSONFieldScanner()
+                text, usage, headers, stopped = await provider.stream(
+                    system, prompt, max_tokens, temperature, lambda chunk: early_stop(scanner.feed(chunk)), tool
+                )
+                metrics['early_stops'] += int(stopped)
+            else:
+                text, usage, headers = await provider.send(system, prompt, max_tokens, temperature, tool)
+            latency = time.perf_counter() - started
+            metrics['latency_total'] += latency
+            if not stopped:
+                # Оборванные ответы короче полных и занизили бы порог хеджирования
+                self._latencies[provider.name].append(latency)
+            
+            if self.rate_limiter:
+                self.rate_limiter.apply_headers(headers)
+            self.prompt_cache_stats.record(sport, usage)
+            self.llm_metrics.observe_request(sport, provider.name, provider.model, latency, usage)
+            sink = _usage_sink.get()
+            if sink is not None:
+                sink.append((provider.model, usage))
+            actual_tokens = sum(usage.get(key, 0) or 0 for key in (
+                'input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'
+            ))
+            return LLMResponse(text, provider.name, provider.model, usage, latency, stopped)
+        
+        except LLMError as e:
+            metrics['errors'] += 1
+            self.llm_metrics.record_error(sport, provider.name, provider.model, e.status_code)
+            if self.rate_limiter and e.status_code == 429:
+                self.rate_limiter.apply_headers(e.headers, rate_limited=True)
+            raise
+        
+        finally:
+            if self.rate_limiter:
+                self.rate_limiter.release(estimated_tokens, actual_tokens)
+    
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Метрики по провайдерам"""
+        return {name: dict(values) for name, values in self.metrics.items()}
+
+
+_shared_gateways: Dict[tuple, LLMGateway] = {}
+
+
+def build_providers(settings: Dict[str, Any]) -> List[Any]:
+    """
+    Провайдеры по приоритету из настроек: основной Anthropic (api_key, model)
+    и резервный OpenAI (openai_api_key, openai_model), если заданы ключи
+    """
+    providers = []
+    order = settings.get("provider_order", ["anthropic", "openai"])
+    credentials = {
+        "anthropic": (settings.get("api_key"), settings.get("model"), settings.get("base_url") or ANTHROPIC_URL),
+        "openai": (settings.get("openai_api_key"), settings.get("openai_model"), settings.get("openai_base_url") or OPENAI_URL)
+    }
+    
+    for name in order:
+        api_key, model, base_url = credentials.get(name, (None, None, None))
+        if api_key and model:
+            providers.append(PROVIDERS[name](api_key, model, base_url, settings))
+    return providers
+
+
+def get_llm_gateway(settings: Dict[str, Any]) -> LLMGateway:
+    """Общий шлюз для набора провайдеров (один лимитер и метрики на процесс)"""
+    providers = build_providers(settings)
+    key = tuple((p.name, p.api_key, p.model, p.base_url) for p in providers)
+    
+    if key not in _shared_gateways:
+        rate_limiter = None
+        if settings.get("requests_per_minute"):
+            rate_limiter = RateLimitScheduler(
+                settings["requests_per_minute"],
+                settings.get("tokens_per_minute", 40000),
+                settings.get("max_concurrency", 10)
+            )
+        _shared_gateways[key] = LLMGateway(providers, settings, get_response_cache(settings), rate_limiter)
+    return _shared_gateways[key]
@@ -0,0 +1,213 @@
+"""
+Телеметрия запросов к LLM по видам спорта и моделям
+Гистограммы латентности, токены, оценка стоимости, кэш ответов, повторы и ошибки разбора.
+Экспорт в текстовом формате Prometheus (textfile collector) и сводка в лог за цикл.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Any, Optional, Tuple
+
+from utils.model_cascade import estimate_cost
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_TYPES = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+# Имя метрики: (тип, описание)
+METRICS = {
+    "llm_requests_total": ("counter", "Запросы к LLM по исходу (ok, ошибка с кодом HTTP)"),
+    "llm_request_duration_seconds": ("histogram", "Латентность успешных запросов к LLM"),
+    "llm_tokens_total": ("counter", "Токены запросов к LLM по типу"),
+    "llm_cost_usd_total": ("counter", "Оценка стоимости запросов к LLM, $"),
+    "llm_retries_total": ("counter", "Повторы запросов к LLM"),
+    "llm_parse_total": ("counter", "Разбор JSON ответов LLM по результату (ok, failed)"),
+    "llm_response_cache_total": ("counter", "Обращения к кэшу ответов по результату (hit, miss)"),
+    "llm_state_reuse_total": ("counter", "Матчи по результату сравнения с прошлым анализом (reused, reanalyzed)"),
+}
+
+
+def _escape(value: str) -> str:
+    """Экранирование значения метки Prometheus"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    """Значение сэмпла без потери точности (формат :g округляет до 6 значащих цифр)"""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами (накопительные счетчики как в Prometheus)"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+    
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return bound
+        return float('inf')
+
+
+class LLMMetrics:
+    """Счетчики и гистограммы с метками (sport, model, ...)"""
+    
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.prices = dict(prices or {})
+        self.counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = defaultdict(lambda: defaultdict(float))
+        self.histograms: Dict[Tuple[Tuple[str, str], ...], Histogram] = {}
+    
+    @staticmethod
+    def _labels(**labels: Any) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+    
+    def _inc(self, name: str, value: float = 1, **labels: Any):
+        self.counters[name][self._labels(**labels)] += value
+    
+    def observe_request(self, sport: str, provider: str, model: str, latency: float, usage: Dict[str, int]):
+        """Успешный запрос: латентность, токены и стоимость"""
+        self._inc("llm_requests_total", sport=sport, provider=provider, model=model, status="ok")
+        key = self._labels(sport=sport, model=model)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(latency)
+        
+        for token_type in TOKEN_TYPES:
+            tokens = usage.get(token_type) or 0
+            if tokens:
+                self._inc("llm_tokens_total", tokens, sport=sport, model=model, type=token_type)
+        cost = estimate_cost(model, usage, self.prices)
+        if cost:
+            self._inc("llm_cost_usd_total", cost, sport=sport, model=model)
+    
+    def record_error(self, sport: str, provider: str, model: str, status_code: Optional[int]):
+        """Неудачный запрос (status - код HTTP или network для сетевых ошибок)"""
+        self._inc("llm_requests_total", sport=sport, provider=provider, model=model,
+                  status=status_code if status_code is not None else "network")
+    
+    def record_retry(self, sport: str, model: str):
+        self._inc("llm_retries_total", sport=sport, model=model)
+    
+    def record_parse(self, sport: str, model: str, ok: bool, count: int = 1):
+        """Результат разбора JSON ответа (count - число разобранных элементов пакета)"""
+        if count:
+            self._inc("llm_parse_total", count, sport=sport, model=model, result="ok" if ok else "failed")
+    
+    def record_cache(self, sport: str, hit: bool):
+        self._inc("llm_response_cache_total", sport=sport, result="hit" if hit else "miss")
+    
+    def record_state(self, sport: str, reused: bool):
+        """Вердикт переиспользован (матч не изменился) или матч отправлен на повторный анализ"""
+        self._inc("llm_state_reuse_total", sport=sport, result="reused" if reused else "reanalyzed")
+    
+    def parse_failure_rate(self, sport: str, model: str) -> float:
+        """Доля ответов, которые не удалось разобрать"""
+        ok = self.counters["llm_parse_total"].get(self._labels(sport=sport, model=model, result="ok"), 0)
+        failed = self.counters["llm_parse_total"].get(self._labels(sport=sport, model=model, result="failed"), 0)
+        return failed / (ok + failed) if ok + failed else 0.0
+    
+    def to_prometheus(self) -> str:
+        """Все метрики в текстовом формате экспозиции Prometheus"""
+        def render(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+        
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for labels, histogram in sorted(self.histograms.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{render(labels, (('le', repr(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{render(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{render(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{render(labels)} {histogram.count}")
+            else:
+                for labels, value in sorted(self.counters.get(name, {}).items()):
+                    lines.append(f"{name}{render(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+    
+    def dump(self, path: str) -> str:
+        """Записывает метрики в файл (атомарно, для textfile collector node_exporter)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+        return path
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Сводка по (вид спорта, модель): запросы, латентность, токены, стоимость, повторы, ошибки разбора"""
+        summary: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for name, series in self.counters.items():
+            for labels, value in series.items():
+                label_map = dict(labels)
+                if "model" not in label_map:
+                    continue
+                entry = summary[(label_map["sport"], label_map["model"])]
+                if name == "llm_requests_total":
+                    entry["requests" if label_map["status"] == "ok" else "errors"] += value
+                elif name == "llm_tokens_total":
+                    entry[label_map["type"]] += value
+                elif name == "llm_cost_usd_total":
+                    entry["cost"] += value
+                elif name == "llm_retries_total":
+                    entry["retries"] += value
+                elif name == "llm_parse_total" and label_map["result"] == "failed":
+                    entry["parse_failures"] += value
+        
+        for labels, histogram in self.histograms.items():
+            label_map = dict(labels)
+            entry = summary[(label_map["sport"], label_map["model"])]
+            entry["p50"] = histogram.quantile(0.5)
+            entry["p95"] = histogram.quantile(0.95)
+        return {f"{sport}/{model}": dict(values) for (sport, model), values in summary.items()}
+    
+    def log_summary(self):
+        """Сводка в лог (накопительно с начала работы процесса)"""
+        for key, values in sorted(self.snapshot().items()):
+            sport, model = key.split("/", 1)
+            logger.info(
+                f"LLM {key}: {values.get('requests', 0):.0f} запросов, {values.get('errors', 0):.0f} ошибок, "
+                f"{values.get('retries', 0):.0f} повторов, p50 ≤{values.get('p50', 0):g} с, p95 ≤{values.get('p95', 0):g} с, "
+                f"токены {values.get('input_tokens', 0):.0f}/{values.get('output_tokens', 0):.0f}, "
+                f"стоимость ${values.get('cost', 0):.4f}, ошибки разбора {self.parse_failure_rate(sport, model):.0%}"
+            )
+
+
+_shared_metrics: Optional[LLMMetrics] = None
+
+
+def get_llm_metrics(prices: Optional[Dict[str, Tuple[float, float]]] = None) -> LLMMetrics:
+    """Общие для процесса метрики LLM (цены моделей дополняются при каждом вызове)"""
+    global _shared_metrics
+    
+    if _shared_metrics is None:
+        _shared_metrics = LLMMetrics()
+    if prices:
+        _shared_metrics.prices.update(prices)
+    return _shared_metrics
@@ -0,0 +1,148 @@
+"""
+Кэш сопоставлений матчей BetBoom ↔ Scores24 между циклами анализа
+Хранит найденные пары на диске, чтобы в установившемся режиме не запускать fuzzy matching
+"""
+
+import json
+import logging
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MatchPairCache:
+    """
+    Персистентный кэш пар матчей, ключ - нормализованные названия участников.
+    Матчи без пары тоже запоминаются, но ненадолго (negative_ttl секунд):
+    пара может появиться, когда Scores24 добавит событие.
+    """
+    
+    def __init__(self, path: Optional[str], fuzzy_matcher, negative_ttl: float = 300):
+        self.path = path
+        self.fuzzy_matcher = fuzzy_matcher
+        self.negative_ttl = negative_ttl
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'conflicts': 0, 'expired': 0}
+        
+        if self.path:
+            self.load()
+    
+    @staticmethod
+    def name_fields(match: Dict[str, Any]) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+        """Поля участников и поля сопоставленных имен для матча"""
+        if 'team1' in match:
+            return ('team1', 'team2'), ('team1_mapped', 'team2_mapped')
+        return ('player1', 'player2'), ('player1_mapped', 'player2_mapped')
+    
+    def key_for(self, match: Dict[str, Any]) -> str:
+        """Идентификатор события: нормализованные имена участников"""
+        fields, _ = self.name_fields(match)
+        return '|'.join(self.fuzzy_matcher.normalize_text(match.get(field, '')) for field in fields)
+    
+    def lookup(self, betboom_matches: List[Dict[str, Any]],
+               scores24_matches: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
+        """
+        Сохраненные сопоставления для матчей BetBoom: (пары, индексы матчей для
+        fuzzy matching). Пара из кэша действительна, только если матч Scores24 все
+        еще в ленте; если две пары ссылаются на один матч Scores24, остается пара
+        с большей уверенностью, остальные сопоставляются заново.
+        """
+        scores24_by_key = {self.key_for(m): m for m in scores24_matches}
+        pairs: List[Optional[Dict[str, Any]]] = [None] * len(betboom_matches)
+        pending: List[int] = []
+        owners: Dict[str, int] = {}
+        now = time.time()
+        
+        for i, betboom_match in enumerate(betboom_matches):
+            entry = self.entries.get(self.key_for(betboom_match))
+            if entry and entry['scores24_key'] is None and now - entry.get('checked_at', 0) < self.negative_ttl:
+                self.stats['negative_hits'] += 1
+                continue
+            
+            scores24_match = scores24_by_key.get(entry['scores24_key']) if entry and entry['scores24_key'] else None
+            if scores24_match is None:
+                self.stats['misses'] += 1
+                pending.append(i)
+                continue
+            
+            self.stats['hits'] += 1
+            pairs[i] = {'match': scores24_match, 'confidence': entry['confidence'], **entry['mapped']}
+            
+            owner = owners.get(entry['scores24_key'])
+            if owner is None:
+                owners[entry['scores24_key']] = i
+                continue
+            
+            self.stats['conflicts'] += 1
+            if pairs[i]['confidence'] > pairs[owner]['confidence']:
+                owners[entry['scores24_key']], i = i, owner
+            pairs[i] = None
+            pending.append(i)
+        
+        pending.sort()
+        return pairs, pending
+    
+    def put(self, betboom_match: Dict[str, Any], matched_data: Optional[Dict[str, Any]]):
+        """Запоминает найденное сопоставление (None - пара не найдена)"""
+        if matched_data is None:
+            self.entries[self.key_for(betboom_match)] = {'scores24_key': None, 'checked_at': time.time()}
+            return
+        
+        _, mapped_fields = self.name_fields(betboom_match)
+        self.entries[self.key_for(betboom_match)] = {
+            'scores24_key': self.key_for(matched_data['match']),
+            'confidence': matched_data['confidence'],
+            'mapped': {field: matched_data.get(field, '') for field in mapped_fields}
+        }
+    
+    def hit_rate(self) -> float:
+        """Доля матчей, не потребовавших fuzzy matching"""
+        hits = self.stats['hits'] + self.stats['negative_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+    
+    def expire(self, betboom_matches: List[Dict[str, Any]],
+               scores24_matches: List[Dict[str, Any]]):
+        """Удаляет пары, оба матча которых пропали из лент, и устаревшие записи без пары"""
+        betboom_keys = {self.key_for(m) for m in betboom_matches}
+        scores24_keys = {self.key_for(m) for m in scores24_matches}
+        
+        now = time.time()
+        stale = [
+            key for key, entry in self.entries.items()
+            if (key not in betboom_keys and entry['scores24_key'] not in scores24_keys)
+            or (entry['scores24_key'] is None and now - entry.get('checked_at', 0) >= self.negative_ttl)
+        ]
+        for key in stale:
+            del self.entries[key]
+        
+        self.stats['expired'] += len(stale)
+    
+    def load(self):
+        """Загружает кэш с диска"""
+        if not os.path.exists(self.path):
+            return
+        
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            logger.info(f"Загружено {len(self.entries)} сопоставлений из {self.path}")
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось загрузить кэш сопоставлений {self.path}: {e}")
+            self.entries = {}
+    
+    def save(self):
+        """Сохраняет кэш на диск (атомарная замена файла)"""
+        if not self.path:
+            return
+        
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш сопоставлений {self.path}: {e}")
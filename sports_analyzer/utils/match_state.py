@@ -0,0 +1,104 @@
+"""
+Отслеживание состояния матчей между циклами анализа
+Повторный запрос к Claude выполняется только при существенном изменении матча
+"""
+
+import logging
+import time
+from typing import Dict, Any, Optional, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class MatchStateTracker:
+    """Хранит последний проанализированный снимок матча и вердикт по нему"""
+    
+    def __init__(self, settings: Dict[str, Any]):
+        self.material_fields = settings.get("material_fields", [])
+        self.odds_threshold = settings.get("odds_threshold", 0.05)
+        self.minute_bucket = settings.get("minute_bucket", 10)
+        self.confidence_decay_per_minute = settings.get("confidence_decay_per_minute", 0.5)
+        self.max_age_minutes = settings.get("max_age_minutes", 30)
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'reused': 0, 'reanalyzed': 0}
+    
+    def snapshot(self, match: Dict[str, Any]) -> Dict[str, Any]:
+        """Существенные для анализа поля состояния матча"""
+        minute = match.get('minute')
+        return {
+            'fields': {field: match.get(field) for field in self.material_fields},
+            'minute_bucket': minute // self.minute_bucket if isinstance(minute, (int, float)) else None,
+            'odds': self._numeric_odds(match.get('odds'))
+        }
+    
+    @staticmethod
+    def _numeric_odds(odds: Any) -> Dict[str, float]:
+        """Коэффициенты числами (строки приводятся, нечисловые значения пропускаются)"""
+        numeric = {}
+        for outcome, odd in (odds or {}).items() if isinstance(odds, dict) else ():
+            try:
+                numeric[outcome] = float(odd)
+            except (TypeError, ValueError):
+                continue
+        return numeric
+    
+    def get_delta(self, key: str, match: Dict[str, Any]) -> Optional[str]:
+        """Причина повторного анализа или None, если матч существенно не изменился"""
+        delta = self._find_delta(key, match)
+        if delta is not None:
+            self.stats['reanalyzed'] += 1
+        return delta
+    
+    def _find_delta(self, key: str, match: Dict[str, Any]) -> Optional[str]:
+        state = self._states.get(key)
+        if state is None:
+            return "новый матч"
+        
+        if (time.time() - state['analyzed_at']) / 60 > self.max_age_minutes:
+            return "устаревший анализ"
+        
+        previous, current = state['snapshot'], self.snapshot(match)
+        
+        for field, value in current['fields'].items():
+            if previous['fields'].get(field) != value:
+                return f"изменилось поле {field}"
+        
+        if previous['minute_bucket'] != current['minute_bucket']:
+            return "новый временной интервал"
+        
+        # Исчезнувший или новый исход (рынок снят/открыт) - тоже изменение
+        if set(current['odds']) != set(previous['odds']):
+            return "изменился набор исходов"
+        
+        for outcome, odd in current['odds'].items():
+            old_odd = previous['odds'].get(outcome)
+            if not old_odd or abs(odd - old_odd) / old_odd > self.odds_threshold:
+                return f"движение коэффициента {outcome}"
+        
+        return None
+    
+    def reuse(self, key: str) -> Dict[str, Any]:
+        """Предыдущий вердикт с уверенностью, сниженной пропорционально возрасту"""
+        state = self._states[key]
+        age_minutes = (time.time() - state['analyzed_at']) / 60
+        result = dict(state['result'])
+        result['confidence'] = max(0, round(
+            state['result'].get('confidence', 0) - age_minutes * self.confidence_decay_per_minute
+        ))
+        result['reused_analysis'] = True
+        self.stats['reused'] += 1
+        return result
+    
+    def remember(self, key: str, match: Dict[str, Any], result: Dict[str, Any]):
+        """Сохраняет снимок проанализированного матча и вердикт"""
+        self._states[key] = {
+            'snapshot': self.snapshot(match),
+            'result': dict(result),
+            'analyzed_at': time.time()
+        }
+    
+    def expire(self, active_keys: Iterable[str]):
+        """Удаляет состояния матчей, которых нет в текущем цикле"""
+        active = set(active_keys)
+        for key in [k for k in self._states if k not in active]:
+            del self._states[key]
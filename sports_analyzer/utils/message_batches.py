@@ -0,0 +1,245 @@
+"""
+Офлайн пакеты Anthropic Message Batches для некритичных по времени запросов
+(контекстный анализ, валидация рекомендаций, ежедневные сводки).
+Пакетные задания дешевле обычных запросов и не расходуют квоту live анализа.
+Модуль не зависит от конфигурации конкретного приложения - настройки передаются словарем.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from utils.http_client import get_http_client
+from utils.llm_gateway import AnthropicProvider, LLMError, extract_json
+from utils.rate_limiter import parse_retry_after
+from utils.structured_output import ResponseSchema
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_BATCHES_URL = "https://api.anthropic.com/v1/messages/batches"
+
+
+class MessageBatchClient:
+    """Anthropic Message Batches API: создание, опрос состояния, загрузка результатов"""
+    
+    def __init__(self, api_key: str, base_url: str = ANTHROPIC_BATCHES_URL,
+                 http_settings: Optional[Dict[str, Any]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.http_settings = http_settings or {}
+        self.headers = {
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01"
+        }
+    
+    async def _request(self, method: str, url: str, payload: Optional[Dict[str, Any]] = None):
+        client = get_http_client(self.http_settings)
+        try:
+            response = await client.request(method, url, headers=self.headers, json=payload)
+        except Exception as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        
+        if response.status_code != 200:
+            raise LLMError(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                status_code=response.status_code,
+                retry_after=parse_retry_after(response.headers.get("retry-after")),
+                headers=dict(response.headers)
+            )
+        return response
+    
+    async def create(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Создает пакет из запросов {"custom_id", "params"}"""
+        response = await self._request("POST", self.base_url, {"requests": requests})
+        return response.json()
+    
+    async def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        """Текущее состояние пакета"""
+        response = await self._request("GET", f"{self.base_url}/{batch_id}")
+        return response.json()
+    
+    async def wait(self, batch_id: str, poll_interval: float = 60,
+                   max_wait: float = 24 * 3600) -> Dict[str, Any]:
+        """Опрашивает пакет до завершения обработки (processing_status == "ended")"""
+        started = time.monotonic()
+        while True:
+            try:
+                batch = await self.retrieve(batch_id)
+            except LLMError as e:
+                if not e.retryable:
+                    raise
+                logger.warning(f"Ошибка опроса пакета {batch_id}: {e}")
+                batch = {}
+            
+            if batch.get("processing_status") == "ended":
+                return batch
+            if time.monotonic() - started > max_wait:
+                raise LLMError(f"Пакет {batch_id} не завершен за {max_wait:.0f} сек")
+            
+            counts = batch.get("request_counts") or {}
+            logger.debug(f"Пакет {batch_id}: {batch.get('processing_status')}, {counts}")
+            await asyncio.sleep(poll_interval)
+    
+    async def results(self, batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Результаты завершенного пакета (JSONL по results_url)"""
+        url = batch.get("results_url") or f"{self.base_url}/{batch['id']}/results"
+        response = await self._request("GET", url)
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+class OfflineBatchQueue:
+    """
+    Очередь офлайн запросов: add() копит запросы, run() отправляет их одним пакетом,
+    дожидается обработки и сохраняет результаты в хранилище рекомендаций.
+    Без ожидания: submit() отправляет пакет, poll() по одному разу проверяет его состояние.
+    """
+    
+    def __init__(self, settings: Dict[str, Any], batch_settings: Dict[str, Any]):
+        self.provider = AnthropicProvider(settings["api_key"], settings["model"])
+        # Без отдельного адреса пакеты идут туда же, куда и live запросы (например, в локальную заглушку)
+        batches_url = batch_settings.get("base_url")
+        if not batches_url:
+            batches_url = f"{settings['base_url'].rstrip('/')}/batches" if settings.get("base_url") else ANTHROPIC_BATCHES_URL
+        self.client = MessageBatchClient(settings["api_key"], batches_url, settings)
+        self.max_tokens = batch_settings.get("max_tokens", settings.get("max_tokens", 1000))
+        self.temperature = settings.get("temperature", 0.1)
+        self.poll_interval = batch_settings.get("poll_interval", 60)
+        self.max_wait = batch_settings.get("max_wait", 24 * 3600)
+        self.results_dir = batch_settings.get("results_dir")
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.batch_id: Optional[str] = None
+        self.submitted_at: Optional[float] = None
+    
+    def add(self, kind: str, sport: str, prompt: str, system: str = "",
+            meta: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None,
+            schema: Optional[ResponseSchema] = None) -> str:
+        """Добавляет запрос в очередь, возвращает его custom_id (schema - структурированный ответ)"""
+        custom_id = f"{kind}-{sport}-{len(self.jobs)}"
+        self.jobs[custom_id] = {
+            "kind": kind,
+            "sport": sport,
+            "meta": meta or {},
+            "schema": schema,
+            "params": self.provider.build_payload(system, prompt, max_tokens or self.max_tokens,
+                                                  self.temperature, schema)
+        }
+        return custom_id
+    
+    async def submit(self) -> Optional[str]:
+        """Отправляет очередь одним пакетом, не дожидаясь обработки. Возвращает id пакета"""
+        if not self.jobs:
+            return None
+        
+        requests = [{"custom_id": custom_id, "params": job["params"]} for custom_id, job in self.jobs.items()]
+        try:
+            batch = await self.client.create(requests)
+            self.batch_id = batch["id"]
+        except (LLMError, KeyError) as e:
+            logger.error(f"Ошибка отправки офлайн пакета: {e}")
+            return None
+        
+        self.submitted_at = time.monotonic()
+        logger.info(f"Офлайн пакет {self.batch_id}: {len(requests)} запросов")
+        return self.batch_id
+    
+    async def poll(self) -> Optional[Dict[str, Any]]:
+        """
+        Однократная проверка отправленного пакета: отчет, если обработка завершена,
+        иначе None. LLMError - пакет не отправлен, не завершен за max_wait или не может быть получен.
+        """
+        if self.batch_id is None:
+            raise LLMError("Офлайн пакет не отправлен: сначала submit()")
+        
+        try:
+            batch = await self.client.retrieve(self.batch_id)
+        except LLMError as e:
+            if not e.retryable:
+                raise
+            logger.warning(f"Ошибка опроса пакета {self.batch_id}: {e}")
+            batch = {}
+        
+        if batch.get("processing_status") != "ended":
+            if time.monotonic() - self.submitted_at > self.max_wait:
+                raise LLMError(f"Пакет {self.batch_id} не завершен за {self.max_wait:.0f} сек")
+            logger.debug(f"Пакет {self.batch_id}: {batch.get('processing_status')}, {batch.get('request_counts') or {}}")
+            return None
+        return await self._collect(batch)
+    
+    async def run(self) -> Optional[Dict[str, Any]]:
+        """
+        Отправляет очередь одним пакетом и ждет результатов.
+        Возвращает сохраненный отчет пакета (None, если очередь пуста или пакет не выполнен).
+        """
+        if await self.submit() is None:
+            return None
+        
+        try:
+            batch = await self.client.wait(self.batch_id, self.poll_interval, self.max_wait)
+            return await self._collect(batch)
+        except LLMError as e:
+            logger.error(f"Ошибка офлайн пакета: {e}")
+            return None
+    
+    async def _collect(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Загружает результаты завершенного пакета и сохраняет отчет"""
+        results = await self.client.results(batch)
+        report = self._build_report(batch, results)
+        self.jobs = {}
+        if self.results_dir:
+            report["path"] = self._save(report)
+        return report
+    
+    def _build_report(self, batch: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Результаты пакета по заданиям: текст, разобранный JSON и usage"""
+        items = []
+        usage_total: Dict[str, int] = {}
+        for entry in results:
+            job = self.jobs.get(entry.get("custom_id"))
+            if job is None:
+                continue
+            
+            result = entry.get("result") or {}
+            item = {
+                "custom_id": entry["custom_id"],
+                "kind": job["kind"],
+                "sport": job["sport"],
+                "meta": job["meta"],
+                "status": result.get("type", "unknown")
+            }
+            if item["status"] == "succeeded":
+                text, usage = self.provider.parse_response(result.get("message") or {})
+                item["text"] = text
+                item["data"] = extract_json(text)
+                errors = job["schema"].validate(item["data"]) if job["schema"] and item["data"] is not None else []
+                if errors:
+                    item["data"] = None
+                    item["error"] = {"type": "schema_error", "message": "; ".join(errors[:5])}
+                for key, value in usage.items():
+                    if isinstance(value, int):
+                        usage_total[key] = usage_total.get(key, 0) + value
+            else:
+                item["error"] = result.get("error")
+            items.append(item)
+        
+        succeeded = sum(1 for item in items if item["status"] == "succeeded")
+        logger.info(f"Офлайн пакет {batch.get('id')}: выполнено {succeeded} из {len(self.jobs)}, токены {usage_total}")
+        return {
+            "batch_id": batch.get("id"),
+            "created_at": datetime.now().isoformat(),
+            "usage": usage_total,
+            "results": items
+        }
+    
+    def _save(self, report: Dict[str, Any]) -> str:
+        """Сохраняет отчет пакета в каталог рекомендаций"""
+        os.makedirs(self.results_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.results_dir, f"offline_batch_{timestamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты офлайн пакета сохранены: {path}")
+        return path
@@ -0,0 +1,102 @@
+"""
+Каскад моделей: первичная оценка дешевым этапом (эвристики или легкая модель),
+подтверждение основной моделью только для неопределенных матчей.
+Учет доли эскалаций, латентности, токенов и стоимости по этапам.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRIAGE = "triage"
+CONFIRM = "confirm"
+
+
+def estimate_cost(model: str, usage: Dict[str, int],
+                  prices: Dict[str, Tuple[float, float]]) -> float:
+    """Стоимость запроса в $ по usage и ценам модели (0, если цена неизвестна)"""
+    if model not in prices:
+        return 0.0
+    input_price, output_price = prices[model]
+    input_tokens = (
+        (usage.get('input_tokens') or 0)
+        + (usage.get('cache_read_input_tokens') or 0) * 0.1
+        + (usage.get('cache_creation_input_tokens') or 0) * 1.25
+    )
+    return (input_tokens * input_price + (usage.get('output_tokens') or 0) * output_price) / 1_000_000
+
+
+def needs_escalation(triage_result: Optional[Dict[str, Any]], band: Tuple[float, float]) -> bool:
+    """
+    Нужна ли основная модель: первичной оценки нет, она неудачна (уверенность 0)
+    или уверенность попала в неопределенную зону band
+    """
+    if not triage_result:
+        return True
+    confidence = triage_result.get('confidence', 0) or 0
+    low, high = band
+    return confidence == 0 or low <= confidence < high
+
+
+class CascadeStats:
+    """Доля эскалаций и стоимость/латентность этапов каскада по видам спорта"""
+    
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.prices = prices or {}
+        self.tiers: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(lambda: defaultdict(
+            lambda: {'calls': 0, 'latency_total': 0.0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0.0}
+        ))
+        self.decisions: Dict[str, Dict[str, int]] = defaultdict(lambda: {'triaged': 0, 'escalated': 0})
+    
+    def record(self, sport: str, tier: str, latency: float, calls: int = 1,
+               usage_records: Optional[List[Tuple[str, Dict[str, int]]]] = None):
+        """Учитывает вызовы этапа: латентность и (модель, usage) запросов к LLM"""
+        stats = self.tiers[sport][tier]
+        stats['calls'] += calls
+        stats['latency_total'] += latency
+        for model, usage in usage_records or []:
+            stats['input_tokens'] += (usage.get('input_tokens') or 0) + (usage.get('cache_read_input_tokens') or 0) \
+                + (usage.get('cache_creation_input_tokens') or 0)
+            stats['output_tokens'] += usage.get('output_tokens') or 0
+            stats['cost'] += estimate_cost(model, usage, self.prices)
+    
+    def record_decision(self, sport: str, escalated: bool):
+        """Учитывает решение каскада по матчу"""
+        self.decisions[sport]['triaged'] += 1
+        self.decisions[sport]['escalated'] += int(escalated)
+    
+    def escalation_rate(self, sport: str) -> float:
+        """Доля матчей, переданных основной модели"""
+        decisions = self.decisions[sport]
+        return decisions['escalated'] / decisions['triaged'] if decisions['triaged'] else 0.0
+    
+    def log_summary(self, sport: str):
+        """Сводка каскада по виду спорта"""
+        decisions = self.decisions[sport]
+        if not decisions['triaged']:
+            return
+        
+        logger.info(
+            f"Каскад ({sport}): эскалировано {decisions['escalated']} из {decisions['triaged']} "
+            f"({self.escalation_rate(sport):.0%})"
+        )
+        for tier, stats in self.tiers[sport].items():
+            average = stats['latency_total'] / stats['calls'] if stats['calls'] else 0.0
+            logger.info(
+                f"Этап {tier} ({sport}): {stats['calls']} вызовов, средняя латентность {average:.2f} сек, "
+                f"токены {stats['input_tokens']}/{stats['output_tokens']}, стоимость ${stats['cost']:.4f}"
+            )
+
+
+_shared_stats: Optional[CascadeStats] = None
+
+
+def get_cascade_stats(prices: Optional[Dict[str, Tuple[float, float]]] = None) -> CascadeStats:
+    """Общая для процесса статистика каскада"""
+    global _shared_stats
+    
+    if _shared_stats is None:
+        _shared_stats = CascadeStats(prices)
+    return _shared_stats
@@ -0,0 +1,81 @@
+"""
+Кэширование промптов на стороне провайдера (Anthropic prompt caching)
+Статические инструкции отправляются отдельным системным блоком; cache_control
+ставится только на префикс не короче минимума провайдера (1024/2048 токенов).
+Учет токенов чтения/записи кэша по видам спорта
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+# Минимальный кэшируемый префикс Anthropic (инструменты + системный промпт), токены.
+# Более короткий префикс с cache_control обрабатывается как обычный вход
+MIN_CACHEABLE_TOKENS = {"haiku": 2048}
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+
+
+def min_cacheable_tokens(model: str) -> int:
+    """Минимальная длина кэшируемого префикса для модели"""
+    for family, tokens in MIN_CACHEABLE_TOKENS.items():
+        if family in (model or ""):
+            return tokens
+    return DEFAULT_MIN_CACHEABLE_TOKENS
+
+
+def cacheable_system(system_prompt: str, model: str = "", prefix_tokens: int = 0) -> List[Dict[str, Any]]:
+    """
+    Системный промпт отдельным блоком (пустой список, если промпта нет).
+    cache_control ставится, только если префикс (prefix_tokens инструментов
+    и сам промпт, ~3 символа на токен) не короче минимума модели.
+    """
+    if not system_prompt:
+        return []
+    block = {"type": "text", "text": system_prompt}
+    if prefix_tokens + len(system_prompt) // 3 + 1 >= min_cacheable_tokens(model):
+        block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+
+class PromptCacheStats:
+    """Счетчики токенов с учетом чтения и записи кэша промптов"""
+    
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(('calls',) + USAGE_FIELDS, 0))
+    
+    def record(self, sport: str, usage: Any):
+        """Учитывает usage ответа (dict из JSON или объект SDK)"""
+        if not usage:
+            return
+        
+        stats = self.stats[sport]
+        stats['calls'] += 1
+        values = {}
+        for field in USAGE_FIELDS:
+            value = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+            values[field] = value or 0
+            stats[field] += values[field]
+        
+        logger.debug(
+            f"Токены Claude ({sport}): вход {values['input_tokens']}, "
+            f"чтение кэша {values['cache_read_input_tokens']}, "
+            f"запись кэша {values['cache_creation_input_tokens']}, выход {values['output_tokens']}"
+        )
+    
+    def cached_share(self, sport: str) -> float:
+        """Доля входных токенов, прочитанных из кэша промптов"""
+        stats = self.stats[sport]
+        total = stats['input_tokens'] + stats['cache_read_input_tokens'] + stats['cache_creation_input_tokens']
+        return stats['cache_read_input_tokens'] / total if total else 0.0
+
+
+_shared_stats = PromptCacheStats()
+
+
+def get_prompt_cache_stats() -> PromptCacheStats:
+    """Общие для процесса счетчики кэша промптов"""
+    return _shared_stats
@@ -0,0 +1,176 @@
+"""
+Планировщик запросов к LLM с учетом лимитов провайдера
+Token bucket по запросам и токенам в минуту + заголовки retry-after / ratelimit
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ведро токенов: емкость capacity, пополнение refill_per_second"""
+    
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+    
+    def time_until(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберется amount"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_per_second
+    
+    def consume(self, amount: float):
+        self._refill()
+        self.available -= min(amount, self.capacity)
+    
+    def adjust(self, amount: float):
+        """Возврат (amount > 0) или доплата (amount < 0) после фактического расхода"""
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+    
+    def limit_to(self, remaining: float):
+        """Синхронизация с остатком, который сообщил провайдер"""
+        self._refill()
+        self.available = min(self.available, float(remaining))
+
+
+class RateLimitScheduler:
+    """Конкурентные запросы в пределах RPM/TPM квоты провайдера"""
+    
+    def __init__(self, requests_per_minute: int = 50, tokens_per_minute: int = 40000,
+                 max_concurrency: int = 10, default_retry_after: float = 5.0):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.default_retry_after = default_retry_after
+        self.max_concurrency = max(1, max_concurrency)
+        # Примитивы синхронизации привязаны к event loop: создаются при первом запросе в цикле
+        # (каждый цикл анализа может выполняться в своем asyncio.run)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._blocked_until = 0.0
+        self.stats = {'requests': 0, 'rate_limited': 0, 'waited_seconds': 0.0}
+    
+    async def acquire(self, estimated_tokens: int):
+        """Ждет свободный слот и квоту; запросы обслуживаются по очереди"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._lock = asyncio.Lock()
+        
+        await self._semaphore.acquire()
+        try:
+            async with self._lock:
+                while True:
+                    wait = max(
+                        self._blocked_until - time.monotonic(),
+                        self.requests.time_until(1),
+                        self.tokens.time_until(estimated_tokens)
+                    )
+                    if wait <= 0:
+                        break
+                    self.stats['waited_seconds'] += wait
+                    await asyncio.sleep(wait)
+                
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+                self.stats['requests'] += 1
+        except BaseException:
+            self._semaphore.release()
+            raise
+    
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None):
+        """Освобождает слот и корректирует расход токенов по факту"""
+        if actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+        self._semaphore.release()
+    
+    def apply_headers(self, headers: Optional[Mapping[str, str]], rate_limited: bool = False):
+        """Учитывает retry-after и остатки квоты из заголовков Anthropic / OpenAI"""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        pause = parse_retry_after(headers.get('retry-after'))
+        
+        if rate_limited:
+            self.stats['rate_limited'] += 1
+            if pause is None:
+                pause = self.default_retry_after
+        
+        for kind, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+            remaining = headers.get(f'anthropic-ratelimit-{kind}-remaining') or headers.get(f'x-ratelimit-remaining-{kind}')
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            
+            bucket.limit_to(remaining)
+            if remaining <= 0:
+                reset = (_parse_reset_time(headers.get(f'anthropic-ratelimit-{kind}-reset'))
+                         or _parse_duration(headers.get(f'x-ratelimit-reset-{kind}')))
+                if reset is not None:
+                    pause = max(pause or 0.0, reset)
+        
+        if pause:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+            logger.warning(f"Лимит AI провайдера: пауза {pause:.1f} сек")
+    
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """retry-after: секунды или HTTP дата"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset_time(value: Optional[str]) -> Optional[float]:
+    """anthropic-ratelimit-*-reset: момент сброса в RFC 3339"""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+    except ValueError:
+        return None
+
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """x-ratelimit-reset-*: длительность вида 1s, 6m0s, 20ms"""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
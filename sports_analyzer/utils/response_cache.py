@@ -0,0 +1,95 @@
+"""
+Кэш ответов LLM с адресацией по содержимому запроса
+Ключ - хэш (модель, системный промпт, пользовательский промпт), хранение в SQLite с TTL
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Кэш разобранных ответов Claude в SQLite"""
+    
+    def __init__(self, path: str = ":memory:", ttl_seconds: int = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.purge_expired()
+    
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str, **options: Any) -> str:
+        """Хэш содержимого запроса и параметров, влияющих на ответ (max_tokens, схема и т.п.)"""
+        payload = json.dumps([model, system_prompt, user_prompt, options], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str, sport: str = "general") -> Optional[Dict[str, Any]]:
+        """Возвращает сохраненный ответ, если он не устарел"""
+        row = self._conn.execute(
+            "SELECT response FROM responses WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        
+        if row is None:
+            self.stats[sport]['misses'] += 1
+            return None
+        
+        self.stats[sport]['hits'] += 1
+        return json.loads(row[0])
+    
+    def set(self, key: str, response: Dict[str, Any]):
+        """Сохраняет ответ с TTL"""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(response, ensure_ascii=False), time.time() + self.ttl_seconds)
+        )
+        self._conn.commit()
+    
+    def purge_expired(self):
+        """Удаляет устаревшие записи"""
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+    
+    def hit_rate(self, sport: str) -> float:
+        """Доля попаданий в кэш для вида спорта"""
+        stats = self.stats[sport]
+        total = stats['hits'] + stats['misses']
+        return stats['hits'] / total if total else 0.0
+
+
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache(settings: Optional[Dict[str, Any]] = None) -> Optional[ResponseCache]:
+    """Общий для процесса кэш ответов (None, если кэш отключен в настройках)"""
+    global _shared_cache
+    
+    settings = settings or {}
+    if not settings.get("response_cache_enabled", True):
+        return None
+    
+    if _shared_cache is None:
+        _shared_cache = ResponseCache(
+            settings.get("response_cache_path", ":memory:"),
+            settings.get("response_cache_ttl", 3600)
+        )
+    return _shared_cache
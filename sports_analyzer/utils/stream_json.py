@@ -0,0 +1,108 @@
+"""
+Инкрементальный разбор JSON ответа LLM при потоковой генерации
+Поля верхнего уровня становятся доступны, как только их значение полностью получено,
+что позволяет прервать генерацию, не дожидаясь подробного анализа.
+"""
+
+import json
+from typing import Dict, Any, Callable, List, Optional
+
+
+class JSONFieldScanner:
+    """
+    Посимвольный разбор первого JSON объекта в потоке текста.
+    Собирает завершенные скалярные поля верхнего уровня (числа, строки, bool, null),
+    вложенные объекты и массивы пропускаются.
+    """
+    
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        self._key: Optional[str] = None
+        self._token: List[str] = []
+    
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Обрабатывает очередной фрагмент текста, возвращает собранные поля"""
+        for char in chunk:
+            if self._done:
+                break
+            self._consume(char)
+        return self.fields
+    
+    def _consume(self, char: str):
+        if self._in_string:
+            if self._depth == 1:
+                self._token.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return
+        
+        if self._depth == 0:
+            # Текст до начала объекта (пояснения модели) пропускается
+            if char == '{':
+                self._depth = 1
+            return
+        
+        if char == '"':
+            self._in_string = True
+            if self._depth == 1:
+                self._token.append(char)
+        elif char in '{[':
+            self._depth += 1
+        elif char in '}]':
+            if self._depth == 1:
+                self._finish_value()
+                self._done = True
+            self._depth -= 1
+        elif self._depth == 1:
+            if char == ':' and self._key is None:
+                self._key = self._decode(self._token)
+                self._token = []
+            elif char == ',':
+                self._finish_value()
+            else:
+                self._token.append(char)
+    
+    def _finish_value(self):
+        """Значение текущего поля завершено запятой или концом объекта"""
+        if isinstance(self._key, str) and ''.join(self._token).strip():
+            value = self._decode(self._token)
+            if value is not None or ''.join(self._token).strip() == 'null':
+                self.fields[self._key] = value
+        self._key = None
+        self._token = []
+    
+    @staticmethod
+    def _decode(token: List[str]) -> Any:
+        try:
+            return json.loads(''.join(token).strip())
+        except ValueError:
+            return None
+
+
+def parse_partial_json(text: str) -> Dict[str, Any]:
+    """Завершенные поля верхнего уровня из (возможно, оборванного) JSON ответа"""
+    return JSONFieldScanner().feed(text)
+
+
+def confidence_cutoff(min_confidence: float) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Условие досрочной остановки: известны confidence и recommendation,
+    и уверенность ниже порога вида спорта - матч все равно будет пропущен
+    """
+    def should_stop(fields: Dict[str, Any]) -> bool:
+        if 'confidence' not in fields or 'recommendation' not in fields:
+            return False
+        try:
+            return float(fields['confidence']) < min_confidence
+        except (TypeError, ValueError):
+            return False
+    
+    return should_stop
@@ -0,0 +1,143 @@
+"""
+Структурированные ответы LLM через tool use: схема ответа передается модели
+как единственный доступный инструмент, и ответ приходит готовым JSON в аргументах вызова.
+Формат не нужно описывать в промпте, а ответ проверяется по скомпилированной схеме.
+Модуль не зависит от конфигурации конкретного приложения.
+"""
+
+from typing import Dict, Any, Callable, List, Optional
+
+# Типы JSON схемы и соответствующие типы Python (bool - подкласс int, проверяется отдельно)
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None)
+}
+
+Checker = Callable[[Any, str, List[str]], None]
+
+
+def _compile(schema: Dict[str, Any]) -> Checker:
+    """Функция проверки узла схемы (type, enum, minimum/maximum, properties, required, items)"""
+    checks: List[Checker] = []
+    
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else list(types)
+        unknown = [name for name in types if name not in JSON_TYPES]
+        if unknown:
+            raise ValueError(f"Неизвестный тип в схеме: {unknown}")
+        python_types = tuple(JSON_TYPES[name] for name in types)
+        allows_bool = "boolean" in types
+        
+        def check_type(value, path, errors):
+            if (isinstance(value, bool) and not allows_bool) or not isinstance(value, python_types):
+                errors.append(f"{path}: ожидается {'/'.join(types)}, получено {type(value).__name__}")
+        checks.append(check_type)
+    
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+        
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: значение {value!r} не из {allowed}")
+        checks.append(check_enum)
+    
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    if minimum is not None or maximum is not None:
+        def check_range(value, path, errors):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                errors.append(f"{path}: {value} вне диапазона [{minimum}, {maximum}]")
+        checks.append(check_range)
+    
+    properties = {name: _compile(child) for name, child in (schema.get("properties") or {}).items()}
+    required = list(schema.get("required") or [])
+    if properties or required:
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}.{name}: обязательное поле отсутствует")
+            for name, check in properties.items():
+                if name in value:
+                    check(value[name], f"{path}.{name}", errors)
+        checks.append(check_object)
+    
+    if "items" in schema:
+        check_item = _compile(schema["items"])
+        
+        def check_items(value, path, errors):
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    check_item(item, f"{path}[{i}]", errors)
+        checks.append(check_items)
+    
+    def check(value, path, errors):
+        for step in checks:
+            step(value, path, errors)
+    return check
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], List[str]]:
+    """
+    Компилирует JSON схему в функцию проверки, возвращающую список ошибок (пустой - ответ корректен).
+    Поддерживается подмножество, нужное для ответов анализа; description и прочие ключи игнорируются.
+    """
+    check = _compile(schema)
+    
+    def validate(value: Any) -> List[str]:
+        errors: List[str] = []
+        check(value, "$", errors)
+        return errors
+    return validate
+
+
+def object_schema(properties: Dict[str, Any], required: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Схема объекта; по умолчанию все поля обязательны"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties) if required is None else required
+    }
+
+
+# Поля, общие для ответов анализа матчей
+CONFIDENCE = {"type": "number", "minimum": 0, "maximum": 100, "description": "Уверенность в прогнозе, %"}
+REASONING = {"type": "string", "description": "Краткое обоснование, до 80 символов"}
+BET_DECISION = {"type": "string", "enum": ["bet", "skip"], "description": "Ставить или пропустить"}
+
+
+class ResponseSchema:
+    """Схема ответа, которая передается модели как инструмент с принудительным вызовом"""
+    
+    def __init__(self, name: str, description: str, schema: Dict[str, Any]):
+        self.name = name
+        self.description = description
+        self.schema = schema
+        self._validate = compile_schema(schema)
+    
+    def validate(self, data: Any) -> List[str]:
+        """Ошибки соответствия ответа схеме"""
+        return self._validate(data)
+    
+    def anthropic_tool(self) -> Dict[str, Any]:
+        return {"name": self.name, "description": self.description, "input_schema": self.schema}
+    
+    def anthropic_tool_choice(self) -> Dict[str, Any]:
+        return {"type": "tool", "name": self.name}
+    
+    def openai_tool(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.schema}
+        }
+    
+    def openai_tool_choice(self) -> Dict[str, Any]:
+        return {"type": "function", "function": {"name": self.name}}